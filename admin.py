@@ -0,0 +1,95 @@
+# ============================================================
+# Admin Port - Local HTTP Endpoint for Operators
+# ============================================================
+# A small HTTP server next to the news protocol port, bound to
+# 127.0.0.1 only:
+#
+#   GET /metrics   metrics in the Prometheus text format
+#   GET /profile   profile the server for a few seconds (profiler.py):
+#                  ?seconds=10&mode=sample|cprofile&memory=1&interval=0.005
+#
+# Usage:
+#   python server_oop.py --admin-port 9100
+#   curl http://127.0.0.1:9100/metrics
+#   curl 'http://127.0.0.1:9100/profile?seconds=10' > stacks.txt
+#   flamegraph.pl stacks.txt > flame.svg
+#
+# With --workers N every worker has its own admin port:
+# ADMIN_PORT + 0, ADMIN_PORT + 1, ...
+
+import threading  # The admin server runs in the background
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+from profiler import profiler, ProfilerBusy, PROFILE_MODES
+
+MAX_PROFILE_SECONDS = 300
+
+
+class AdminRequestHandler(BaseHTTPRequestHandler):
+    """
+    Answers the admin requests of one NewsServer (self.server.news_server)
+    """
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        news_server = self.server.news_server
+
+        if url.path == '/metrics':
+            self.send_text(200, news_server.metrics.render(),
+                           'text/plain; version=0.0.4; charset=utf-8')
+        elif url.path == '/profile':
+            self.profile(parse_qs(url.query))
+        else:
+            self.send_text(404, "Not found\n")
+
+    def profile(self, query):
+        """Run a profile with the options of the query string; answers when it is done"""
+        try:
+            seconds = float(query.get('seconds', ['10'])[0])
+            interval = float(query.get('interval', ['0.005'])[0])
+        except ValueError:
+            self.send_text(400, "seconds and interval must be numbers\n")
+            return
+        mode = query.get('mode', ['sample'])[0]
+        if mode not in PROFILE_MODES or not 0 < seconds <= MAX_PROFILE_SECONDS or interval <= 0:
+            self.send_text(400, f"mode must be one of {', '.join(PROFILE_MODES)}, "
+                                f"0 < seconds <= {MAX_PROFILE_SECONDS}, interval > 0\n")
+            return
+        memory = query.get('memory', ['0'])[0] not in ('0', '', 'false')
+
+        try:
+            report = profiler.run(seconds, mode, memory, interval)
+        except ProfilerBusy as e:
+            self.send_text(409, f"{e}\n")
+            return
+        self.send_text(200, report)
+
+    def send_text(self, status, text, content_type='text/plain; charset=utf-8'):
+        body = text.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Scrapes every few seconds would flood the server log
+
+
+def start_admin_server(news_server, port, host='127.0.0.1'):
+    """
+    Start the admin HTTP server in a daemon thread
+
+    Parameters:
+        news_server: NewsServer whose metrics are served
+        port: admin port (0 = any free port)
+        host: keep 127.0.0.1 unless the port is protected otherwise
+
+    Returns:
+        the HTTP server object (server.server_address has the real port)
+    """
+    httpd = ThreadingHTTPServer((host, port), AdminRequestHandler)
+    httpd.daemon_threads = True
+    httpd.news_server = news_server
+    threading.Thread(target=httpd.serve_forever, name="admin", daemon=True).start()
+    return httpd
@@ -0,0 +1,113 @@
+# ============================================================
+# AdmissionController Class - Admission Control
+# ============================================================
+# Decides at connect time whether a new client gets a session.
+#
+# - At most `max_sessions` clients are served at the same time.
+#   When they are all taken, the policy decides: 'reject' refuses
+#   the client at once, 'queue' lets it wait up to `queue_timeout`
+#   seconds for a free session.
+# - Overload detector: when the upstream pool already has too many
+#   calls in flight, or calls wait too long in its queue, new clients
+#   are refused even if sessions are free. The clients that are
+#   already connected keep their share instead of all slowing down.
+
+import threading  # Shared by all client threads
+import time       # For the queue timeout
+from config import (MAX_SESSIONS, ADMISSION_POLICY, ADMISSION_QUEUE_SIZE,
+                    ADMISSION_QUEUE_TIMEOUT, OVERLOAD_IN_FLIGHT, OVERLOAD_QUEUE_DELAY)
+
+
+class AdmissionController:
+    """
+    Counts sessions and admits or refuses new clients
+    """
+
+    def __init__(self, max_sessions=MAX_SESSIONS, policy=ADMISSION_POLICY,
+                 queue_timeout=ADMISSION_QUEUE_TIMEOUT, pool=None):
+        """
+        Constructor
+
+        Parameters:
+            max_sessions: clients served at the same time
+            policy: 'reject' or 'queue' when all sessions are taken
+            queue_timeout: seconds a client may wait ('queue' policy)
+            pool: UpstreamPool watched by the overload detector (optional)
+        """
+        if policy not in ('reject', 'queue'):
+            raise ValueError(f"Unknown admission policy: {policy}")
+        self.max_sessions = max_sessions
+        self.policy = policy
+        self.queue_timeout = queue_timeout
+        self.pool = pool
+        self.sessions = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0  # sessions full
+        self.shed = 0      # refused by the overload detector
+        self.condition = threading.Condition()
+
+    def overloaded(self):
+        """
+        Overload detector
+
+        Returns:
+            reason (string) if the upstream pool is overloaded, None otherwise
+        """
+        if self.pool is None:
+            return None
+
+        in_flight = self.pool.in_flight()
+        if in_flight >= OVERLOAD_IN_FLIGHT:
+            return f"{in_flight} upstream calls in flight"
+
+        delay = self.pool.queue_delay()
+        if delay >= OVERLOAD_QUEUE_DELAY:
+            return f"upstream queue delay {delay:.1f}s"
+        return None
+
+    def admit(self):
+        """
+        Take a session for a new client (may wait with the 'queue' policy)
+
+        Returns:
+            None if the client was admitted (call release() when it leaves),
+            or the reason it was refused
+        """
+        reason = self.overloaded()
+        if reason is not None:
+            with self.condition:
+                self.shed += 1
+            return reason
+
+        with self.condition:
+            if self.sessions < self.max_sessions:
+                self.sessions += 1
+                self.admitted += 1
+                return None
+
+            if self.policy != 'queue' or self.waiting >= ADMISSION_QUEUE_SIZE:
+                self.rejected += 1
+                return f"all {self.max_sessions} sessions in use"
+
+            self.waiting += 1
+            deadline = time.monotonic() + self.queue_timeout
+            try:
+                while self.sessions >= self.max_sessions:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.rejected += 1
+                        return f"no session free after {self.queue_timeout}s"
+                    self.condition.wait(remaining)
+
+                self.sessions += 1
+                self.admitted += 1
+                return None
+            finally:
+                self.waiting -= 1
+
+    def release(self):
+        """A client left: free its session for a waiting one"""
+        with self.condition:
+            self.sessions -= 1
+            self.condition.notify()
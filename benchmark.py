@@ -0,0 +1,911 @@
+# ============================================================
+# Benchmark Script - Server Throughput vs Worker Processes
+# ============================================================
+# Starts the fake NewsAPI (fake_upstream.py), then runs the server
+# with 1, 2, 4... worker processes and measures how many headline
+# requests per second a group of client processes can complete.
+#
+# Usage:
+#   python benchmark.py --workers 1 2 4 --clients 8 --duration 5
+#
+# Fairness scenario: one aggressive client (several connections
+# sending big batches) and a few normal clients, with fair queuing
+# on and off (--fifo); prints the normal clients' latency:
+#   python benchmark.py --fairness --clients 4 --duration 10 --delay 0.2
+#
+# Load scenario: N simulated users walk the real menus (handshake,
+# main menu, submenu, parameter) with a realistic mix of options and
+# think times; prints throughput, latency percentiles and error rates
+# per option plus the server's CPU and memory, and saves them as JSON:
+#   python benchmark.py --load --clients 50 --duration 30 --think 0.5 --output run.json
+#
+# Replay: plays back sessions recorded with `server_oop.py --record`
+# with their real timing (--speed 1), N times faster, or as fast as
+# possible (--speed 0); against a local server or any --target:
+#   python benchmark.py --replay day.jsonl --speed 10 --output replay.json
+#   python benchmark.py --replay day.jsonl --speed 0 --target 10.0.0.5:5000
+
+import argparse         # For command line options
+import json             # For batch requests and result files
+import multiprocessing  # Load clients run in separate processes
+import os               # For environment and paths
+import random           # Load scenario: options, parameters, think times
+import re               # Replay: result IDs of list responses
+import select           # Replay: answer PING while waiting for the next frame
+import socket           # For network communication
+import subprocess       # For starting the server
+import sys              # For the Python executable path
+import tempfile         # Server saves its JSON files in a temporary folder
+import threading        # Fairness scenario clients
+import time             # For timing
+from contextlib import contextmanager
+from protocol import Protocol
+from fake_upstream import start_fake_upstream
+from projection import make_cursor, make_item_id, parse_cursor, parse_item_id
+from config import MAX_BATCH_SIZE, MAX_SESSIONS
+
+SERVER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'server_oop.py')
+COUNTRIES = ['au', 'ca', 'jp', 'ae', 'sa', 'kr', 'us', 'ma']
+
+
+def wait_for_port(host, port, timeout=10):
+    """Wait until the server accepts connections"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection((host, port), timeout=1).close()
+            return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+
+def client_loop(args):
+    """
+    One simulated client: handshake, open the headlines menu and
+    search by country until the time is up
+
+    Returns:
+        (completed requests, errors)
+    """
+    host, port, duration, client_id = args
+    completed = errors = 0
+
+    sock = socket.create_connection((host, port))
+    try:
+        Protocol.send_message(sock, f"bench{client_id}")
+        if not (Protocol.receive_message(sock) or "").startswith("CONNECTED"):
+            return 0, 1
+
+        Protocol.send_message(sock, '1')
+        Protocol.receive_message(sock)  # HEADLINES
+
+        deadline = time.monotonic() + duration
+        i = client_id
+        while time.monotonic() < deadline:
+            Protocol.send_message(sock, '3')
+            Protocol.receive_message(sock)  # READY
+            Protocol.send_message(sock, COUNTRIES[i % len(COUNTRIES)])
+            response = Protocol.receive_message(sock)
+            if response is None:
+                errors += 1
+                break
+            if '"status": "ok"' in response:
+                completed += 1
+            else:
+                errors += 1
+            i += 1
+
+        Protocol.send_message(sock, '5')
+        Protocol.send_message(sock, '3')
+        Protocol.receive_message(sock)  # BYE
+    finally:
+        sock.close()
+
+    return completed, errors
+
+
+def run_load(host, port, clients, duration):
+    """
+    Run the load clients in parallel processes
+
+    Returns:
+        (requests per second, total errors)
+    """
+    with multiprocessing.Pool(clients) as pool:
+        started = time.monotonic()
+        results = pool.map(client_loop, [(host, port, duration, i) for i in range(clients)])
+        elapsed = time.monotonic() - started
+
+    completed = sum(done for done, _ in results)
+    errors = sum(failed for _, failed in results)
+    return completed / elapsed, errors
+
+
+@contextmanager
+def running_server(host, port, upstream_url, *options):
+    """
+    Run server_oop.py against the fake upstream while the block runs
+
+    Parameters:
+        options: extra command line options (e.g. '--workers', '4')
+
+    Yields:
+        the server's Popen object
+    """
+    env = dict(os.environ, NEWS_API_BASE_URL=upstream_url)
+    command = [sys.executable, SERVER_SCRIPT, '--host', host, '--port', str(port), *options]
+
+    with tempfile.TemporaryDirectory() as workdir:
+        server = subprocess.Popen(command, cwd=workdir, env=env,
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            if not wait_for_port(host, port):
+                raise RuntimeError("Server did not start")
+            time.sleep(0.5)  # Let every worker bind the port
+            yield server
+        finally:
+            server.terminate()
+            server.wait(timeout=10)
+
+
+def benchmark_workers(workers, host, port, clients, duration, upstream_url):
+    """
+    Start the server with the given number of workers and measure it
+
+    Returns:
+        (requests per second, errors)
+    """
+    with running_server(host, port, upstream_url, '--workers', str(workers)):
+        run_load(host, port, clients, 1)  # Warm up the caches
+        return run_load(host, port, clients, duration)
+
+
+# ============================================================
+# Fairness Scenario
+# ============================================================
+
+def connect(host, port, name):
+    sock = socket.create_connection((host, port))
+    Protocol.send_message(sock, name)
+    if not (Protocol.receive_message(sock) or "").startswith("CONNECTED"):
+        sock.close()
+        return None
+    return sock
+
+
+def aggressive_client(host, port, connection, deadline, results):
+    """
+    One connection of the aggressive client: batches of MAX_BATCH_SIZE
+    keyword searches that all miss the cache, back to back
+    """
+    sock = connect(host, port, "aggressive")
+    if sock is None:
+        return
+    i = 0
+    while time.monotonic() < deadline:
+        queries = [{"endpoint": "headlines", "filter": {"q": f"bulk{connection}x{i}x{j}"}}
+                   for j in range(MAX_BATCH_SIZE)]
+        Protocol.send_message(sock, "BATCH")
+        Protocol.receive_message(sock)  # READY
+        Protocol.send_message(sock, json.dumps(queries))
+        response = Protocol.receive_message(sock)
+        if response is None:
+            break
+        results['ok'] += response.count('"status": "ok"')
+        i += 1
+    sock.close()
+
+
+def normal_client(host, port, client_id, deadline, results):
+    """
+    An interactive client: one keyword search (cache miss), then a
+    short pause, recording the latency of each search
+    """
+    sock = connect(host, port, f"user{client_id}")
+    if sock is None:
+        results['errors'] += 1
+        return
+    Protocol.send_message(sock, '1')
+    Protocol.receive_message(sock)  # HEADLINES
+    i = 0
+    while time.monotonic() < deadline:
+        started = time.monotonic()
+        Protocol.send_message(sock, '1')
+        Protocol.receive_message(sock)  # READY
+        Protocol.send_message(sock, f"user{client_id}x{i}")
+        response = Protocol.receive_message(sock)
+        if response is None:
+            break
+        if '"status": "ok"' in response:
+            results['latencies'].append(time.monotonic() - started)
+        else:
+            results['errors'] += 1
+        i += 1
+        time.sleep(0.2)  # Reading the headlines
+    sock.close()
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] if ordered else 0.0
+
+
+def fairness_run(host, port, upstream_url, clients, duration, fifo, connections=4):
+    """
+    One aggressive client (`connections` connections) and `clients`
+    normal clients against one server
+
+    Returns:
+        (normal latencies, normal errors, aggressive queries answered)
+    """
+    options = ['--fifo'] if fifo else []
+    normal = {'latencies': [], 'errors': 0}
+    aggressive = {'ok': 0}
+
+    with running_server(host, port, upstream_url, *options):
+        deadline = time.monotonic() + duration
+        threads = [threading.Thread(target=aggressive_client, args=(host, port, c, deadline, aggressive))
+                   for c in range(connections)]
+        threads += [threading.Thread(target=normal_client, args=(host, port, c, deadline, normal))
+                    for c in range(clients)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    return normal['latencies'], normal['errors'], aggressive['ok']
+
+
+def benchmark_fairness(host, port, clients, duration, upstream_url):
+    print(f"{'queuing':>8} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8} {'errors':>7} {'aggressive':>11}")
+    for fifo in (True, False):
+        latencies, errors, aggressive = fairness_run(host, port, upstream_url, clients, duration, fifo)
+        print(f"{'fifo' if fifo else 'fair':>8} {1000 * percentile(latencies, 0.5):>8.0f} "
+              f"{1000 * percentile(latencies, 0.95):>8.0f} {1000 * max(latencies, default=0):>8.0f} "
+              f"{errors:>7} {aggressive:>11}")
+
+# ============================================================
+# Load Scenario
+# ============================================================
+
+# (menu, option, label, weight): how often users pick each option
+LOAD_MIX = [
+    ('headlines', '1', 'headlines:keyword', 15),
+    ('headlines', '2', 'headlines:category', 25),
+    ('headlines', '3', 'headlines:country', 25),
+    ('headlines', '4', 'headlines:all', 10),
+    ('sources', '1', 'sources:category', 8),
+    ('sources', '2', 'sources:country', 7),
+    ('sources', '3', 'sources:language', 5),
+    ('sources', '4', 'sources:all', 5),
+]
+CATEGORIES = ['business', 'general', 'health', 'science', 'sports', 'technology']
+LANGUAGES = ['ar', 'en']
+KEYWORDS = ['climate', 'election', 'market', 'football', 'vaccine', 'space', 'energy', 'travel']
+
+
+def option_parameter(menu, option, rng):
+    """Parameter a user would type for a menu option (None = no parameter)"""
+    if option == '4':
+        return None
+    if menu == 'headlines' and option == '1':
+        # Mostly popular words (cache hits), sometimes a new search
+        return rng.choice(KEYWORDS) if rng.random() < 0.8 else f"topic{rng.randrange(100000)}"
+    if (menu, option) in (('headlines', '2'), ('sources', '1')):
+        return rng.choice(CATEGORIES)
+    if (menu, option) in (('headlines', '3'), ('sources', '2')):
+        return rng.choice(COUNTRIES)
+    return rng.choice(LANGUAGES)
+
+
+def response_status(response):
+    """'ok', 'busy', 'error' or 'disconnected' for one response"""
+    if response is None:
+        return 'disconnected'
+    if response.startswith('{'):
+        try:
+            status = json.loads(response).get('status')
+        except ValueError:
+            return 'error'
+        return status if status in ('ok', 'busy') else 'error'
+    return 'error' if response == "ERROR" else 'ok'
+
+
+def simulated_user(host, port, user_id, deadline, think, samples):
+    """
+    One user: handshake, then until the deadline open a submenu, make
+    1-3 requests in it (thinking between them) and go back
+
+    Parameters:
+        think: average think time in seconds (0 = no pauses)
+        samples: list to append (label, seconds, status) to
+    """
+    rng = random.Random(user_id)
+    weights = [weight for _, _, _, weight in LOAD_MIX]
+
+    started = time.monotonic()
+    try:
+        sock = socket.create_connection((host, port), timeout=30)
+    except OSError:
+        samples.append(('connect', time.monotonic() - started, 'disconnected'))
+        return
+    try:
+        Protocol.send_message(sock, f"load{user_id}")
+        reply = Protocol.receive_message(sock)
+        status = 'ok' if reply and reply.startswith("CONNECTED") else response_status(reply)
+        samples.append(('connect', time.monotonic() - started, status))
+        if status != 'ok':
+            return
+
+        while time.monotonic() < deadline:
+            menu = rng.choices(LOAD_MIX, weights)[0][0]
+            started = time.monotonic()
+            Protocol.send_message(sock, '1' if menu == 'headlines' else '2')
+            reply = Protocol.receive_message(sock)  # HEADLINES / SOURCES
+            samples.append(('menu', time.monotonic() - started,
+                            'ok' if reply in ('HEADLINES', 'SOURCES') else response_status(reply)))
+            if reply is None:
+                return
+
+            choices = [entry for entry in LOAD_MIX if entry[0] == menu]
+            for _ in range(rng.randint(1, 3)):
+                _, option, label, _ = rng.choices(choices, [entry[3] for entry in choices])[0]
+                parameter = option_parameter(menu, option, rng)
+
+                started = time.monotonic()
+                Protocol.send_message(sock, option)
+                if parameter is not None:
+                    Protocol.receive_message(sock)  # READY
+                    Protocol.send_message(sock, parameter)
+                response = Protocol.receive_message(sock)
+                samples.append((label, time.monotonic() - started, response_status(response)))
+                if response is None:
+                    return
+                if think:
+                    time.sleep(rng.expovariate(1 / think))  # Reading the list
+
+            Protocol.send_message(sock, '5')  # Back to the main menu
+
+        Protocol.send_message(sock, '3')
+        Protocol.receive_message(sock)  # BYE
+    except OSError:
+        samples.append(('socket', 0.0, 'disconnected'))
+    finally:
+        sock.close()
+
+
+def load_process(args):
+    """
+    A group of simulated users in one process (one thread per user)
+
+    Returns:
+        list of (label, seconds, status) samples
+    """
+    host, port, user_ids, deadline, think = args
+    samples = []
+    threads = [threading.Thread(target=simulated_user, args=(host, port, user_id, deadline, think, samples))
+               for user_id in user_ids]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples
+
+
+def process_tree(pid):
+    """The process and all its descendants (Linux /proc), as a list of pids"""
+    children = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                parent = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        children.setdefault(parent, []).append(int(entry))
+
+    tree, pending = [], [pid]
+    while pending:
+        current = pending.pop()
+        tree.append(current)
+        pending.extend(children.get(current, []))
+    return tree
+
+
+def process_usage(pid):
+    """
+    CPU seconds and resident memory of the server and its workers
+
+    Returns:
+        (cpu seconds, rss bytes), or None if /proc is not available
+    """
+    ticks = os.sysconf('SC_CLK_TCK')
+    page_size = os.sysconf('SC_PAGE_SIZE')
+    cpu = rss = 0
+    try:
+        for member in process_tree(pid):
+            try:
+                with open(f'/proc/{member}/stat') as f:
+                    fields = f.read().rsplit(')', 1)[1].split()
+                with open(f'/proc/{member}/statm') as f:
+                    rss += int(f.read().split()[1]) * page_size
+            except OSError:
+                continue  # Exited while we were reading
+            cpu += (int(fields[11]) + int(fields[12])) / ticks  # utime + stime
+    except OSError:
+        return None
+    return cpu, rss
+
+
+class UsageSampler(threading.Thread):
+    """Samples the server's CPU and memory every `interval` seconds"""
+
+    def __init__(self, pid, interval=0.5):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.samples = []  # (time, cpu seconds, rss bytes)
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.is_set():
+            usage = process_usage(self.pid)
+            if usage is None:
+                return
+            self.samples.append((time.monotonic(), *usage))
+            self.stopped.wait(self.interval)
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+    def summary(self):
+        """
+        Returns:
+            dictionary with the average CPU use (1.0 = one core busy) and
+            the average/max RSS in MB, or None without samples
+        """
+        if len(self.samples) < 2:
+            return None
+        (first, cpu_first, _), (last, cpu_last, _) = self.samples[0], self.samples[-1]
+        rss = [sample[2] for sample in self.samples]
+        return {
+            'cpu_cores': round((cpu_last - cpu_first) / (last - first), 3),
+            'rss_avg_mb': round(sum(rss) / len(rss) / 2 ** 20, 1),
+            'rss_max_mb': round(max(rss) / 2 ** 20, 1),
+        }
+
+
+def summarize_samples(samples, elapsed):
+    """
+    Per-option statistics of the samples
+
+    Returns:
+        dictionary: label -> count, rate, error rate and latency percentiles (ms)
+    """
+    by_label = {}
+    for label, seconds, status in samples:
+        by_label.setdefault(label, []).append((seconds, status))
+
+    options = {}
+    for label, entries in sorted(by_label.items()):
+        latencies = [seconds for seconds, status in entries if status == 'ok']
+        statuses = {}
+        for _, status in entries:
+            statuses[status] = statuses.get(status, 0) + 1
+        options[label] = {
+            'count': len(entries),
+            'per_second': round(len(entries) / elapsed, 2),
+            'error_rate': round(1 - statuses.get('ok', 0) / len(entries), 4),
+            'statuses': statuses,
+            'p50_ms': round(1000 * percentile(latencies, 0.50), 2),
+            'p95_ms': round(1000 * percentile(latencies, 0.95), 2),
+            'p99_ms': round(1000 * percentile(latencies, 0.99), 2),
+            'max_ms': round(1000 * max(latencies, default=0.0), 2),
+        }
+    return options
+
+
+def load_run(host, port, upstream_url, workers, clients, duration, think, processes):
+    """
+    Start the server and run `clients` simulated users for `duration` seconds
+
+    Returns:
+        dictionary with the run's settings, totals, per-option stats and server usage
+    """
+    max_sessions = str(max(clients, MAX_SESSIONS))
+    with running_server(host, port, upstream_url, '--workers', str(workers),
+                        '--max-sessions', max_sessions) as server:
+        sampler = UsageSampler(server.pid)
+        sampler.start()
+
+        groups = [list(range(clients))[i::processes] for i in range(processes)]
+        started = time.monotonic()
+        with multiprocessing.Pool(processes) as pool:
+            results = pool.map(load_process, [(host, port, group, started + duration, think)
+                                              for group in groups])
+        elapsed = time.monotonic() - started
+        sampler.stop()
+
+    samples = [sample for group in results for sample in group]
+    requests = [sample for sample in samples if sample[0] not in ('connect', 'menu', 'socket')]
+    ok = [seconds for _, seconds, status in requests if status == 'ok']
+    return {
+        'workers': workers,
+        'clients': clients,
+        'elapsed_s': round(elapsed, 2),
+        'requests': len(requests),
+        'requests_per_second': round(len(requests) / elapsed, 2),
+        'error_rate': round(1 - len(ok) / len(requests), 4) if requests else 0.0,
+        'p50_ms': round(1000 * percentile(ok, 0.50), 2),
+        'p95_ms': round(1000 * percentile(ok, 0.95), 2),
+        'p99_ms': round(1000 * percentile(ok, 0.99), 2),
+        'max_ms': round(1000 * max(ok, default=0.0), 2),
+        'options': summarize_samples(samples, elapsed),
+        'server': sampler.summary(),
+    }
+
+
+def print_load_run(run):
+    server = run['server'] or {}
+    title = f"{run['workers']} worker(s)" if run['workers'] else "Target"
+    print(f"\n{title}: {run['requests_per_second']:.1f} req/s, "
+          f"errors {100 * run['error_rate']:.2f}%, server CPU {server.get('cpu_cores', 'n/a')} cores, "
+          f"RSS avg {server.get('rss_avg_mb', 'n/a')} MB / max {server.get('rss_max_mb', 'n/a')} MB")
+    print(f"{'option':<20} {'count':>7} {'req/s':>8} {'err %':>6} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'p99 ms':>8} {'max ms':>8}")
+    for label, stats in run['options'].items():
+        print(f"{label:<20} {stats['count']:>7} {stats['per_second']:>8.1f} "
+              f"{100 * stats['error_rate']:>6.2f} {stats['p50_ms']:>8.1f} {stats['p95_ms']:>8.1f} "
+              f"{stats['p99_ms']:>8.1f} {stats['max_ms']:>8.1f}")
+
+
+def benchmark_load(args, upstream_url):
+    """Run the load scenario for each worker count and save the results"""
+    processes = args.processes or min(args.clients, os.cpu_count() or 1)
+    report = {
+        'started': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'settings': {
+            'clients': args.clients, 'duration_s': args.duration, 'think_s': args.think,
+            'upstream_delay_s': args.delay, 'client_processes': processes,
+            'mix': {label: weight for _, _, label, weight in LOAD_MIX},
+        },
+        'runs': [],
+    }
+    for workers in args.workers:
+        run = load_run('127.0.0.1', args.port, upstream_url, workers, args.clients,
+                       args.duration, args.think, processes)
+        report['runs'].append(run)
+        print_load_run(run)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults saved to {args.output}")
+
+
+# ============================================================
+# Replay Scenario
+# ============================================================
+
+RESULT_ID = re.compile(r'"result_id": "([^"]+)"')
+
+
+def load_recording(path):
+    """Sessions of a recording file, oldest first"""
+    with open(path, encoding='utf-8') as f:
+        sessions = [json.loads(line) for line in f if line.strip()]
+    return sorted(sessions, key=lambda session: session['t'])
+
+
+def translate_frame(frame, result_ids):
+    """
+    Item IDs and cursors of the recording point at result IDs of the
+    recorded server: rewrite them to the IDs this server gave the same lists
+    """
+    if not result_ids:
+        return frame
+    item = parse_item_id(frame)
+    if item and item[0] in result_ids:
+        return make_item_id(result_ids[item[0]], item[1])
+    cursor = parse_cursor(frame)
+    if cursor and cursor[0] in result_ids:
+        return make_cursor(result_ids[cursor[0]], cursor[1])
+    return frame
+
+
+def read_response(sock):
+    """
+    One response of the server: a frame, or a whole streamed list
+    (header to end frame). PING is answered; pushed updates and traces are skipped
+
+    Returns:
+        the frame (the header of a streamed list), or None if the connection closed
+    """
+    while True:
+        message = Protocol.receive_message(sock)
+        if message == "PING":
+            Protocol.send_message(sock, "PONG")
+            continue
+        kind = frame_type(message)
+        if kind in ('push', 'trace'):
+            continue
+        if kind != 'header':
+            return message
+
+        header = message
+        while True:  # Read the rest of the stream
+            message = Protocol.receive_message(sock)
+            if message is None:
+                return None
+            if frame_type(message) == 'end':
+                return header
+
+
+def frame_type(message):
+    """The "type" of a JSON frame (push, trace, header, end...), or None"""
+    if message is None or not message.startswith('{'):
+        return None
+    try:
+        frame = json.loads(message)
+    except ValueError:
+        return None
+    return frame.get('type') if isinstance(frame, dict) else None
+
+
+def wait_until(sock, deadline):
+    """
+    Idle until the next frame is due, answering PING meanwhile
+
+    Returns:
+        False if the connection closed
+    """
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return True
+        readable, _, _ = select.select([sock], [], [], remaining)
+        if readable:
+            message = Protocol.receive_message(sock)
+            if message is None:
+                return False
+            if message == "PING":
+                Protocol.send_message(sock, "PONG")
+
+
+def replay_session(host, port, session, speed, samples):
+    """
+    Play one recorded session: its frames at their recorded offsets
+    (divided by speed; no waiting when speed is 0), reading as many
+    responses as the recorded server sent
+
+    Samples are labelled by menu and option ('headlines:3'), the
+    timed frame being the one that brings the list (the parameter)
+    """
+    frames = session['f']
+    result_ids = {}  # recorded result ID -> this server's
+
+    started = time.monotonic()
+    try:
+        sock = socket.create_connection((host, port), timeout=60)
+    except OSError:
+        samples.append(('connect', time.monotonic() - started, 'disconnected'))
+        return
+    try:
+        Protocol.send_message(sock, frames[0][1])
+        reply = read_response(sock)
+        status = 'ok' if reply and reply.startswith("CONNECTED") else response_status(reply)
+        samples.append(('connect', time.monotonic() - started, status))
+        if status != 'ok':
+            return
+
+        menu = session.get('m', 'main')
+        if menu != 'main':
+            # A resumed session: go to the menu it was resumed in
+            Protocol.send_message(sock, '1' if menu == 'headlines' else '2')
+            read_response(sock)
+
+        option = None
+        for offset, frame, responses, *recorded_ids in frames[1:]:
+            if speed and not wait_until(sock, started + offset / 1000 / speed):
+                return
+
+            sent_at = time.monotonic()
+            Protocol.send_message(sock, translate_frame(frame, result_ids))
+            replies = [read_response(sock) for _ in range(responses)]
+            elapsed = time.monotonic() - sent_at
+            if None in replies:
+                samples.append((f"{menu}:{option or frame.split(' ')[0]}", elapsed, 'disconnected'))
+                return
+
+            # Same lists get the same place in the ID map
+            if recorded_ids and replies:
+                new_ids = RESULT_ID.findall(replies[-1])
+                result_ids.update(zip(recorded_ids[0].split(' '), new_ids))
+
+            if replies == ["READY"]:
+                option = option or frame.split(' ')[0]  # The parameter follows
+                continue
+            if replies:
+                samples.append((f"{menu}:{option or frame.split(' ')[0]}", elapsed,
+                                response_status(replies[-1])))
+            option = None
+            if replies == ["HEADLINES"] or replies == ["SOURCES"]:
+                menu = replies[0].lower()
+            elif frame == '5' and not responses:
+                menu = 'main'
+    except OSError:
+        samples.append(('socket', 0.0, 'disconnected'))
+    finally:
+        sock.close()
+
+
+def replay_run(host, port, sessions, speed, concurrency, server=None):
+    """
+    Play the sessions with their recorded start times (divided by
+    speed); with speed 0 they start as soon as fewer than
+    `concurrency` sessions run
+
+    Returns:
+        dictionary with the totals, per-option stats and server usage
+    """
+    sampler = UsageSampler(server.pid) if server is not None else None
+    if sampler is not None:
+        sampler.start()
+
+    samples = []
+    slots = threading.Semaphore(concurrency)
+
+    def run(session):
+        try:
+            replay_session(host, port, session, speed, samples)
+        finally:
+            slots.release()
+
+    threads = []
+    first = sessions[0]['t'] if sessions else 0.0
+    started = time.monotonic()
+    for session in sessions:
+        if speed:
+            delay = started + (session['t'] - first) / speed - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        slots.acquire()
+        thread = threading.Thread(target=run, args=(session,), daemon=True)
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    if sampler is not None:
+        sampler.stop()
+
+    requests = [sample for sample in samples if sample[0] not in ('connect', 'socket')]
+    ok = [seconds for _, seconds, status in requests if status == 'ok']
+    return {
+        'sessions': len(sessions),
+        'elapsed_s': round(elapsed, 2),
+        'requests': len(requests),
+        'requests_per_second': round(len(requests) / elapsed, 2) if elapsed else 0.0,
+        'error_rate': round(1 - len(ok) / len(requests), 4) if requests else 0.0,
+        'p50_ms': round(1000 * percentile(ok, 0.50), 2),
+        'p95_ms': round(1000 * percentile(ok, 0.95), 2),
+        'p99_ms': round(1000 * percentile(ok, 0.99), 2),
+        'max_ms': round(1000 * max(ok, default=0.0), 2),
+        'options': summarize_samples(samples, elapsed),
+        'server': sampler.summary() if sampler is not None else None,
+    }
+
+
+def benchmark_replay(args, upstream_url):
+    """Replay a recording against --target, or a local server for each worker count"""
+    sessions = load_recording(args.replay)
+    span = sessions[-1]['t'] - sessions[0]['t'] if sessions else 0.0
+    frames = sum(len(session['f']) for session in sessions)
+    print(f"{len(sessions)} sessions, {frames} frames, recorded over {span:.0f} s")
+
+    report = {
+        'started': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'settings': {
+            'recording': os.path.abspath(args.replay), 'sessions': len(sessions),
+            'frames': frames, 'recorded_span_s': round(span, 1), 'speed': args.speed,
+            'concurrency': args.concurrency, 'target': args.target,
+        },
+        'runs': [],
+    }
+
+    if args.target:
+        host, _, port = args.target.rpartition(':')
+        runs = [(None, replay_run(host or '127.0.0.1', int(port), sessions, args.speed, args.concurrency))]
+    else:
+        runs = []
+        for workers in args.workers:
+            with running_server('127.0.0.1', args.port, upstream_url, '--workers', str(workers),
+                                '--max-sessions', str(max(args.concurrency, MAX_SESSIONS))) as server:
+                runs.append((workers, replay_run('127.0.0.1', args.port, sessions, args.speed,
+                                                 args.concurrency, server)))
+
+    for workers, run in runs:
+        run['workers'] = workers
+        report['runs'].append(run)
+        print_load_run(run)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults saved to {args.output}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Server throughput vs worker processes")
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--clients', type=int, default=8, help="simultaneous client processes")
+    parser.add_argument('--duration', type=float, default=5, help="seconds per measurement")
+    parser.add_argument('--port', type=int, default=5050)
+    parser.add_argument('--delay', type=float, default=0.0, help="fake upstream latency (seconds)")
+    parser.add_argument('--fairness', action='store_true',
+                        help="aggressive client vs normal clients, fifo vs fair queuing")
+    parser.add_argument('--load', action='store_true',
+                        help="simulated users walking the menus, latency per option")
+    parser.add_argument('--think', type=float, default=0.0,
+                        help="load scenario: average think time between requests (seconds)")
+    parser.add_argument('--processes', type=int, default=0,
+                        help="load scenario: client processes (default: one per CPU)")
+    parser.add_argument('--replay', metavar='FILE',
+                        help="play back sessions recorded with server_oop.py --record")
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help="replay: 1 = recorded timing, N = N times faster, 0 = as fast as possible")
+    parser.add_argument('--concurrency', type=int, default=100,
+                        help="replay: sessions running at the same time (at most)")
+    parser.add_argument('--target', metavar='HOST:PORT',
+                        help="replay: against this server instead of a local one")
+    parser.add_argument('--output', help="load/replay: save the results as JSON")
+    args = parser.parse_args()
+
+    upstream = start_fake_upstream(port=0, delay=args.delay)
+    upstream_url = f"http://127.0.0.1:{upstream.server_address[1]}/v2"
+
+    if args.fairness:
+        print("=" * 60)
+        print(f"FAIRNESS - 1 aggressive + {args.clients} normal clients, {args.duration}s per run")
+        print("=" * 60)
+        benchmark_fairness('127.0.0.1', args.port, args.clients, args.duration, upstream_url)
+        upstream.shutdown()
+        return
+
+    if args.replay:
+        print("=" * 60)
+        print(f"REPLAY - {args.replay} at {'max' if not args.speed else f'{args.speed:g}x'} speed")
+        print("=" * 60)
+        benchmark_replay(args, upstream_url)
+        upstream.shutdown()
+        return
+
+    if args.load:
+        print("=" * 60)
+        print(f"LOAD - {args.clients} users, {args.duration}s per run, think {args.think}s")
+        print("=" * 60)
+        benchmark_load(args, upstream_url)
+        upstream.shutdown()
+        return
+
+    print("=" * 60)
+    print(f"BENCHMARK - {args.clients} clients, {args.duration}s per run")
+    print("=" * 60)
+    print(f"{'workers':>8} {'req/s':>10} {'errors':>8} {'speedup':>8}")
+
+    baseline = None
+    for workers in args.workers:
+        rate, errors = benchmark_workers(workers, '127.0.0.1', args.port,
+                                         args.clients, args.duration, upstream_url)
+        baseline = baseline or rate
+        print(f"{workers:>8} {rate:>10.1f} {errors:>8} {rate / baseline:>7.2f}x")
+
+    upstream.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+# ============================================================
+# ResultCache Class - Server-side Result Cache
+# ============================================================
+# Keeps the full API responses on the server so the client only
+# receives one page of a summary list and asks for one item's
+# details or the next page later
+# Every result set also gets an etag (hash of its content), so a client
+# holding a cached copy can ask "has it changed?" instead of
+# downloading the list again
+
+import hashlib    # For the etags
+import json       # For estimating the size of stored results
+import secrets    # For generating opaque result IDs
+import threading  # Cache is shared by all client threads
+import time       # For expiry times
+from collections import OrderedDict
+from config import RESULT_CACHE_SIZE, RESULT_CACHE_TTL, RESULT_CACHE_MAX_BYTES
+from config import QUERY_CACHE_SIZE, QUERY_CACHE_TTL
+
+
+class ResultCache:
+    """
+    Thread-safe store of full API responses keyed by result ID
+    Used for DETAIL requests and for paging cursors (NEXT requests)
+    Least recently used entries are dropped when the cache goes over
+    its entry count or memory budget, or when they expire
+    """
+
+    def __init__(self, max_entries=RESULT_CACHE_SIZE, ttl=RESULT_CACHE_TTL,
+                 max_bytes=RESULT_CACHE_MAX_BYTES):
+        """
+        Constructor
+
+        Parameters:
+            max_entries: maximum number of stored result sets
+            ttl: seconds before a result set expires
+            max_bytes: memory budget (estimated JSON size of all result sets)
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.entries = OrderedDict()  # result_id -> (expires_at, size, data, etag)
+        self.by_object = {}           # id(data) -> result_id
+        self.by_etag = {}             # etag -> result_id
+        self.lock = threading.Lock()
+
+    def put(self, data):
+        """
+        Store a full API response
+
+        The same response object (e.g. returned twice by the QueryCache)
+        or a new object with the same content is stored only once and
+        keeps its result ID
+
+        Parameters:
+            data: dictionary returned by NewsHandler
+
+        Returns:
+            result ID (string) used to look the data up again
+        """
+        with self.lock:
+            result_id = self.by_object.get(id(data))
+            if result_id is not None:
+                self.touch(result_id)
+                return result_id
+
+        text = json.dumps(data, sort_keys=True)
+        size = len(text)
+        etag = hashlib.md5(text.encode('utf-8')).hexdigest()[:16]
+
+        with self.lock:
+            result_id = self.by_etag.get(etag)
+            if result_id is not None:
+                # Same content as a stored result (e.g. fetched again after
+                # the QueryCache expired): keep the old ID, so the client's
+                # item IDs and cursors stay valid
+                self.touch(result_id)
+                return result_id
+
+            result_id = secrets.token_hex(6)
+            self.entries[result_id] = (time.monotonic() + self.ttl, size, data, etag)
+            self.by_object[id(data)] = result_id
+            self.by_etag[etag] = result_id
+            self.total_bytes += size
+
+            # Drop the least recently used entries (never the new one)
+            while len(self.entries) > 1 and (len(self.entries) > self.max_entries
+                                             or self.total_bytes > self.max_bytes):
+                self.remove(next(iter(self.entries)))
+        return result_id
+
+    def get(self, result_id):
+        """
+        Look up a stored response
+
+        Returns:
+            the stored dictionary, or None if unknown or expired
+        """
+        with self.lock:
+            entry = self.entries.get(result_id)
+            if entry is None:
+                return None
+
+            expires_at, _, data, _ = entry
+            if expires_at < time.monotonic():
+                self.remove(result_id)
+                return None
+
+            self.entries.move_to_end(result_id)  # Recently used
+            return data
+
+    def etag(self, result_id):
+        """
+        Content hash of a stored response
+
+        Returns:
+            etag string, or None if the result ID is unknown
+        """
+        with self.lock:
+            entry = self.entries.get(result_id)
+            return entry[3] if entry is not None else None
+
+    def touch(self, result_id):
+        """Restart the expiry time of an entry (the caller holds the lock)"""
+        _, size, data, etag = self.entries[result_id]
+        self.entries[result_id] = (time.monotonic() + self.ttl, size, data, etag)
+        self.entries.move_to_end(result_id)
+
+    def remove(self, result_id):
+        """Delete one entry (the caller holds the lock)"""
+        _, size, data, etag = self.entries.pop(result_id)
+        self.by_object.pop(id(data), None)
+        self.by_etag.pop(etag, None)
+        self.total_bytes -= size
+
+
+# ============================================================
+# QueryCache Class - Upstream Query Cache
+# ============================================================
+
+class QueryCache:
+    """
+    Thread-safe cache of NewsAPI responses keyed by the canonical query
+    Lets identical queries from different clients share one upstream call
+    """
+
+    def __init__(self, max_entries=QUERY_CACHE_SIZE, ttl=QUERY_CACHE_TTL):
+        """
+        Constructor
+
+        Parameters:
+            max_entries: maximum number of cached queries
+            ttl: seconds before a cached response expires
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()  # query key -> (expires_at, data)
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Look up a cached response
+
+        Returns:
+            the cached dictionary, or None if missing or expired
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+
+            expires_at, data = entry
+            if expires_at < time.monotonic():
+                del self.entries[key]
+                return None
+
+            self.entries.move_to_end(key)
+            return data
+
+    def put(self, key, data, ttl=None):
+        """
+        Store a response under its query key
+
+        Parameters:
+            ttl: seconds before it expires (None = the cache's ttl)
+        """
+        with self.lock:
+            self.entries[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), data)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+
+# ============================================================
+# TieredCache Class - Local Cache in Front of a Shared One
+# ============================================================
+
+class TieredCache:
+    """
+    Checks a fast per-process cache first, then a cache shared by
+    all worker processes (SharedQueryCache)
+    """
+
+    def __init__(self, local, shared):
+        """
+        Parameters:
+            local: QueryCache of this process
+            shared: SharedQueryCache of all processes on this host
+        """
+        self.local = local
+        self.shared = shared
+
+    def get(self, key):
+        data = self.local.get(key)
+        if data is None:
+            data, expires_at = self.shared.get_entry(key)
+            if data is not None:
+                # Fetched by another worker: the local copy expires with the shared one
+                remaining = expires_at - time.time()
+                if remaining > 0:
+                    self.local.put(key, data, remaining)
+        return data
+
+    def put(self, key, data):
+        self.local.put(key, data)
+        self.shared.put(key, data)
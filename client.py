@@ -1,6 +1,11 @@
 import socket
 import struct
 import json
+import queue
+import random
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime
 
 HOST = '127.0.0.1'
@@ -11,13 +16,36 @@ COUNTRIES = ['au', 'ca', 'jp', 'ae', 'sa', 'kr', 'us', 'ma']
 LANGUAGES = ['ar', 'en']
 CATEGORIES = ['business', 'general', 'health', 'science', 'sports', 'technology']
 
+# After the handshake a reader thread reads the socket: it answers the
+# server's PING with PONG and queues every other message here
+incoming = None
+send_lock = threading.Lock()
+
+# Lists already shown: (menu, option, parameter) -> (stored_at, header, items).
+# Fresh ones are shown again without asking the server; stale ones are
+# revalidated by sending "<option> <etag>", and the server answers
+# "not_modified" instead of the whole list if it did not change
+CACHE_TTL = 60
+CACHE_SIZE = 32
+response_cache = OrderedDict()
+cache_stats = {'hits': 0, 'revalidated': 0, 'misses': 0}
+use_etags = False
+
+# When the connection drops the client reconnects with exponential
+# backoff and sends "RESUME <token>" (token from "CONNECTED <token>"):
+# the server gives back the session's name, menu and options
+RECONNECT_ATTEMPTS = 6
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 30
+
 
 def send_message(sock, message):
     """Send a length-prefixed UTF-8 message through the socket."""
     try:
         data = message.encode('utf-8')
         length = struct.pack('!I', len(data))
-        sock.sendall(length + data)
+        with send_lock:
+            sock.sendall(length + data)
         return True
     except Exception as e:
         print(f"Send error: {e}")
@@ -25,6 +53,38 @@ def send_message(sock, message):
 
 
 def receive_message(sock):
+    """
+    Next message from the server: from the reader thread's queue once
+    it runs, straight from the socket before that (handshake).
+    """
+    if incoming is None:
+        return read_frame(sock)
+    message = incoming.get()
+    if message is None:
+        incoming.put(None)  # Connection closed, keep answering None
+    return message
+
+
+def reader_loop(sock, messages):
+    """Background thread: answer PING, queue everything else."""
+    while True:
+        message = read_frame(sock)
+        if message is None:
+            messages.put(None)
+            return
+        if message == "PING":
+            send_message(sock, "PONG")
+            continue
+        messages.put(message)
+
+
+def start_reader(sock):
+    global incoming
+    incoming = queue.Queue()  # A new queue per connection (after a reconnect)
+    threading.Thread(target=reader_loop, args=(sock, incoming), daemon=True).start()
+
+
+def read_frame(sock):
     """Receive a length-prefixed UTF-8 message from the socket."""
     try:
         raw_length = sock.recv(4)
@@ -45,6 +105,86 @@ def receive_message(sock):
         return None
 
 
+def receive_stream(sock):
+    """
+    Receive a streamed result: yields the header first, then each item,
+    until the end frame. Raises ConnectionError if the connection closes.
+    """
+    while True:
+        message = receive_message(sock)
+        if message is None:
+            raise ConnectionError("Connection closed during stream")
+
+        frame = json.loads(message)
+        frame_type = frame.pop('type', None)
+        if frame_type == 'header':
+            yield frame
+        elif frame_type == 'item':
+            yield frame['item']
+        elif frame_type == 'end':
+            return
+
+
+def enable_streaming(sock):
+    """Ask the server to stream results; older servers answer ERROR."""
+    if not send_message(sock, "STREAM"):
+        return False
+    return receive_message(sock) == "STREAMING"
+
+
+def enable_etags(sock):
+    """Ask the server to send an etag with every list (for revalidation)."""
+    global use_etags
+    if send_message(sock, "ETAGS"):
+        use_etags = receive_message(sock) == "ETAGS"
+
+
+def cache_lookup(key):
+    """Return (header, items, fresh) of a cached list, or None."""
+    entry = response_cache.get(key)
+    if entry is None:
+        return None
+    response_cache.move_to_end(key)
+    stored_at, header, items = entry
+    return header, items, time.monotonic() - stored_at < CACHE_TTL
+
+
+def cache_store(key, header, items):
+    """Cache the first page of a list, dropping the least recently used."""
+    response_cache[key] = (time.monotonic(), header, items)
+    response_cache.move_to_end(key)
+    while len(response_cache) > CACHE_SIZE:
+        response_cache.popitem(last=False)
+
+
+def cache_refresh(key, header):
+    """
+    The server answered not_modified: restart the entry's age and take the
+    new result ID and cursor. Returns the cached items.
+    """
+    _, old_header, items = response_cache[key]
+    if header.get('result_id') != old_header.get('result_id'):
+        # Item IDs are <result_id>.<index>; the first page starts at 0
+        items = [dict(item, item_id=f"{header['result_id']}.{index}")
+                 for index, item in enumerate(items)]
+    cache_store(key, dict(header, status='ok'), items)
+    return items
+
+
+def send_request(sock, choice, parameter, cached=None):
+    """
+    Send a menu option, then its parameter after READY.
+    A stale cached list is revalidated by sending "<option> <etag>".
+    """
+    etag = cached[0].get('etag') if cached is not None and use_etags else None
+    if not send_message(sock, f"{choice} {etag}" if etag else choice):
+        return False
+    if parameter is None:
+        return True
+    receive_message(sock)  # wait for READY
+    return send_message(sock, parameter)
+
+
 def print_header(title):
     print("\n" + "=" * 60)
     print(f"  {title}")
@@ -110,14 +250,19 @@ def display_headlines_list(articles):
         return []
     
     for i, article in enumerate(articles[:15], 1):
-        print(f"\n{i}. Title: {article.get('title', 'N/A')}")
-        print(f"   Source: {article.get('source', {}).get('name', 'N/A')}")
-        print(f"   Author: {article.get('author', 'N/A')}")
-        print("-" * 60)
+        display_headline_row(i, article)
     
     return articles[:15]
 
 
+def display_headline_row(number, article):
+    """Print one entry of the headlines list."""
+    print(f"\n{number}. Title: {article.get('title', 'N/A')}")
+    print(f"   Source: {article.get('source', {}).get('name', 'N/A')}")
+    print(f"   Author: {article.get('author', 'N/A')}")
+    print("-" * 60)
+
+
 def display_headline_details(article):
     """Print detailed information for a single article."""
     print_header("HEADLINE DETAILS")
@@ -147,12 +292,17 @@ def display_sources_list(sources):
         return []
     
     for i, source in enumerate(sources[:15], 1):
-        print(f"{i}. {source.get('name', 'N/A')}")
-        print("-" * 60)
+        display_source_row(i, source)
     
     return sources[:15]
 
 
+def display_source_row(number, source):
+    """Print one entry of the sources list."""
+    print(f"{number}. {source.get('name', 'N/A')}")
+    print("-" * 60)
+
+
 def display_source_details(source):
     """Print detailed information for a single source."""
     print_header("SOURCE DETAILS")
@@ -165,8 +315,129 @@ def display_source_details(source):
     print("=" * 60)
 
 
-def handle_headlines_menu(sock):
-    """Handle the headlines submenu loop."""
+def receive_list(sock, kind, stream=False, cache_key=None, cached=None):
+    """
+    Receive a list response ('articles' or 'sources') and display it.
+
+    In streaming mode each row is printed as soon as its frame arrives.
+    cache_key is the request's key in the response cache (None for next
+    pages) and cached its cache_lookup() result: a fresh list is shown
+    without reading from the server.
+    Returns (items, cursor): the displayed items (max 15) and the cursor
+    of the next page (or None). items is None if nothing was received.
+    """
+    display_list = display_headlines_list if kind == 'articles' else display_sources_list
+
+    if cached is not None and cached[2]:
+        cache_stats['hits'] += 1
+        print("(from cache)")
+        return display_list(cached[1]), cached[0].get('cursor')
+
+    if not stream:
+        response = receive_message(sock)
+        if not response:
+            print("Error: No response from server")
+            return None, None
+
+        data = json.loads(response)
+        if data.get('status') == 'not_modified':
+            cache_stats['revalidated'] += 1
+            print("(from cache, still up to date)")
+            return display_list(cache_refresh(cache_key, data)), data.get('cursor')
+
+        if data.get('status') != 'ok':
+            print(f"Error: {data.get('message', 'Unknown error')}")
+            return [], None
+
+        items = display_list(data.get(kind, []))
+        if cache_key is not None:
+            cache_stats['misses'] += 1
+            cache_store(cache_key, {k: v for k, v in data.items() if k != kind}, items)
+        return items, data.get('cursor')
+
+    try:
+        frames = receive_stream(sock)
+        header = next(frames)
+
+        if header.get('status') == 'not_modified':
+            for _ in frames:
+                pass  # read the end frame
+            cache_stats['revalidated'] += 1
+            print("(from cache, still up to date)")
+            return display_list(cache_refresh(cache_key, header)), header.get('cursor')
+
+        if header.get('status') != 'ok':
+            print(f"Error: {header.get('message', 'Unknown error')}")
+            for _ in frames:
+                pass  # read until the end frame
+            return [], None
+
+        print_header("HEADLINES" if kind == 'articles' else "SOURCES")
+        items = []
+        for item in frames:
+            if len(items) >= 15:
+                continue  # only the first 15 are shown
+            items.append(item)
+            if kind == 'articles':
+                display_headline_row(len(items), item)
+            else:
+                display_source_row(len(items), item)
+
+        if not items:
+            print("No articles found." if kind == 'articles' else "No sources found.")
+        if cache_key is not None:
+            cache_stats['misses'] += 1
+            cache_store(cache_key, header, items)
+        return items, header.get('cursor')
+
+    except (ConnectionError, StopIteration):
+        print("Error: No response from server")
+        return None, None
+
+
+def request_next_page(sock, cursor):
+    """Ask the server for the page a cursor points at (NEXT + cursor)."""
+    if not send_message(sock, "NEXT"):
+        return False
+    receive_message(sock)  # wait for READY
+    return send_message(sock, cursor)
+
+
+def fetch_details(sock, item, kind):
+    """
+    Ask the server for the full article/source behind a list item.
+
+    List responses only carry summary fields plus an item ID, so the
+    details screen requests the full item with a DETAIL request.
+    kind is 'article' or 'source'. Returns None on failure.
+    """
+    item_id = item.get('item_id')
+    if not item_id:
+        return item  # Server already sent the full item
+
+    if not send_message(sock, "DETAIL"):
+        return None
+    receive_message(sock)  # wait for READY
+    if not send_message(sock, item_id):
+        return None
+
+    response = receive_message(sock)
+    if not response:
+        print("Error: No response from server")
+        return None
+
+    data = json.loads(response)
+    if data.get('status') != 'ok':
+        print(f"Error: {data.get('message', 'Unknown error')}")
+        return None
+    return data.get(kind)
+
+
+def handle_headlines_menu(sock, stream=False):
+    """
+    Handle the headlines submenu loop.
+    Returns True after going back (option 5), False if the connection dropped.
+    """
     while True:
         display_headlines_menu()
         choice = input("Enter your choice: ").strip()
@@ -175,70 +446,62 @@ def handle_headlines_menu(sock):
             print("Invalid choice. Please try again.")
             continue
         
-        if not send_message(sock, choice):
-            print("Connection error")
-            return
-        
         if choice == '5':
-            break
+            # If this is lost, the next send fails and the reconnect goes back
+            send_message(sock, choice)
+            return True
 
-        if choice == '1':
-            receive_message(sock)  # wait for READY
-            keyword = input("Enter keyword: ").strip()
-            if not send_message(sock, keyword):
-                print("Connection error")
-                return
-        
-        elif choice == '2':
-            receive_message(sock)
-            display_categories()
-            cat_choice = input("Select category number: ").strip()
-            try:
-                category = CATEGORIES[int(cat_choice) - 1]
-                if not send_message(sock, category):
-                    print("Connection error")
-                    return
-            except:
-                print("Invalid choice.")
-                continue
-        
-        elif choice == '3':
-            receive_message(sock)
-            display_countries()
-            country_choice = input("Select country number: ").strip()
-            try:
-                country = COUNTRIES[int(country_choice) - 1]
-                if not send_message(sock, country):
-                    print("Connection error")
-                    return
-            except:
-                print("Invalid choice.")
-                continue
-        
-        print("\nFetching data from server...")
-        response = receive_message(sock)
-        
-        if not response:
-            print("Error: No response from server")
+        # The parameter is asked first: it is part of the cache key
+        parameter = None
+        try:
+            if choice == '1':
+                parameter = input("Enter keyword: ").strip()
+            elif choice == '2':
+                display_categories()
+                parameter = CATEGORIES[int(input("Select category number: ").strip()) - 1]
+            elif choice == '3':
+                display_countries()
+                parameter = COUNTRIES[int(input("Select country number: ").strip()) - 1]
+        except (ValueError, IndexError):
+            print("Invalid choice.")
             continue
         
+        # A fresh cached list is shown without asking the server
+        cache_key = ('headlines', choice, parameter)
+        cached = cache_lookup(cache_key)
+        if not (cached and cached[2]):
+            if not send_request(sock, choice, parameter, cached):
+                print("Connection error")
+                return False
+            print("\nFetching data from server...")
+        
         try:
-            data = json.loads(response)
-            
-            if data.get('status') == 'ok':
-                articles = data.get('articles', [])
-                article_list = display_headlines_list(articles)
+            while True:
+                article_list, cursor = receive_list(sock, 'articles', stream, cache_key, cached)
+                cache_key = cached = None  # next pages are not cached
+                if article_list is None:
+                    return False
+                if not article_list:
+                    break
                 
-                if article_list:
-                    detail_choice = input(
-                        "\nEnter article number for details (or press Enter to skip): "
-                    ).strip()
-                    if detail_choice.isdigit():
-                        idx = int(detail_choice) - 1
-                        if 0 <= idx < len(article_list):
-                            display_headline_details(article_list[idx])
-            else:
-                print(f"Error: {data.get('message', 'Unknown error')}")
+                next_hint = ", 'n' for next page" if cursor else ""
+                detail_choice = input(
+                    f"\nEnter article number for details{next_hint} (or press Enter to skip): "
+                ).strip().lower()
+                
+                if detail_choice == 'n' and cursor:
+                    if not request_next_page(sock, cursor):
+                        print("Connection error")
+                        return False
+                    continue
+                
+                if detail_choice.isdigit():
+                    idx = int(detail_choice) - 1
+                    if 0 <= idx < len(article_list):
+                        article = fetch_details(sock, article_list[idx], 'article')
+                        if article:
+                            display_headline_details(article)
+                break
         
         except json.JSONDecodeError as e:
             print(f"Error: Invalid JSON response - {e}")
@@ -246,8 +509,11 @@ def handle_headlines_menu(sock):
         input("\nPress Enter to continue...")
 
 
-def handle_sources_menu(sock):
-    """Handle the sources submenu loop."""
+def handle_sources_menu(sock, stream=False):
+    """
+    Handle the sources submenu loop.
+    Returns True after going back (option 5), False if the connection dropped.
+    """
     while True:
         display_sources_menu()
         choice = input("Enter your choice: ").strip()
@@ -256,76 +522,61 @@ def handle_sources_menu(sock):
             print("Invalid choice. Please try again.")
             continue
         
-        if not send_message(sock, choice):
-            print("Connection error")
-            return
-        
         if choice == '5':
-            break
-
-        if choice == '1':
-            receive_message(sock)
-            display_categories()
-            cat_choice = input("Select category number: ").strip()
-            try:
-                category = CATEGORIES[int(cat_choice) - 1]
-                if not send_message(sock, category):
-                    print("Connection error")
-                    return
-            except:
-                print("Invalid choice.")
-                continue
-        
-        elif choice == '2':
-            receive_message(sock)
-            display_countries()
-            country_choice = input("Select country number: ").strip()
-            try:
-                country = COUNTRIES[int(country_choice) - 1]
-                if not send_message(sock, country):
-                    print("Connection error")
-                    return
-            except:
-                print("Invalid choice.")
-                continue
-        
-        elif choice == '3':
-            receive_message(sock)
-            display_languages()
-            lang_choice = input("Select language number: ").strip()
-            try:
-                language = LANGUAGES[int(lang_choice) - 1]
-                if not send_message(sock, language):
-                    print("Connection error")
-                    return
-            except:
-                print("Invalid choice.")
-                continue
-        
-        print("\nFetching data from server...")
-        response = receive_message(sock)
-        
-        if not response:
-            print("Error: No response from server")
+            # If this is lost, the next send fails and the reconnect goes back
+            send_message(sock, choice)
+            return True
+
+        parameter = None
+        try:
+            if choice == '1':
+                display_categories()
+                parameter = CATEGORIES[int(input("Select category number: ").strip()) - 1]
+            elif choice == '2':
+                display_countries()
+                parameter = COUNTRIES[int(input("Select country number: ").strip()) - 1]
+            elif choice == '3':
+                display_languages()
+                parameter = LANGUAGES[int(input("Select language number: ").strip()) - 1]
+        except (ValueError, IndexError):
+            print("Invalid choice.")
             continue
         
+        cache_key = ('sources', choice, parameter)
+        cached = cache_lookup(cache_key)
+        if not (cached and cached[2]):
+            if not send_request(sock, choice, parameter, cached):
+                print("Connection error")
+                return False
+            print("\nFetching data from server...")
+        
         try:
-            data = json.loads(response)
-            
-            if data.get('status') == 'ok':
-                sources = data.get('sources', [])
-                source_list = display_sources_list(sources)
+            while True:
+                source_list, cursor = receive_list(sock, 'sources', stream, cache_key, cached)
+                cache_key = cached = None  # next pages are not cached
+                if source_list is None:
+                    return False
+                if not source_list:
+                    break
                 
-                if source_list:
-                    detail_choice = input(
-                        "\nEnter source number for details (or press Enter to skip): "
-                    ).strip()
-                    if detail_choice.isdigit():
-                        idx = int(detail_choice) - 1
-                        if 0 <= idx < len(source_list):
-                            display_source_details(source_list[idx])
-            else:
-                print(f"Error: {data.get('message', 'Unknown error')}")
+                next_hint = ", 'n' for next page" if cursor else ""
+                detail_choice = input(
+                    f"\nEnter source number for details{next_hint} (or press Enter to skip): "
+                ).strip().lower()
+                
+                if detail_choice == 'n' and cursor:
+                    if not request_next_page(sock, cursor):
+                        print("Connection error")
+                        return False
+                    continue
+                
+                if detail_choice.isdigit():
+                    idx = int(detail_choice) - 1
+                    if 0 <= idx < len(source_list):
+                        source = fetch_details(sock, source_list[idx], 'source')
+                        if source:
+                            display_source_details(source)
+                break
         
         except json.JSONDecodeError as e:
             print(f"Error: Invalid JSON response - {e}")
@@ -333,6 +584,99 @@ def handle_sources_menu(sock):
         input("\nPress Enter to continue...")
 
 
+def handshake(sock, client_name, token=None):
+    """
+    Send the client name and read "CONNECTED <token>".
+    With a token, "RESUME <token>" is sent first to continue the session
+    of a dropped connection.
+    Returns (token, server_menu, resumed), or None if refused or failed.
+    """
+    response = None
+    if token:
+        if not send_message(sock, f"RESUME {token}"):
+            return None
+        response = receive_message(sock)
+        if response and response.startswith("RESUMED "):
+            _, token, menu = response.split(' ', 2)
+            return token, menu, True
+
+    # New session (no token, or the server answered EXPIRED)
+    if response is None or response == "EXPIRED":
+        if not send_message(sock, client_name):
+            print("Failed to send name")
+            return None
+        response = receive_message(sock)
+
+    if response and response.startswith('{'):
+        # The server refused the session (too many clients or overloaded)
+        print(f"Connection refused: {json.loads(response).get('message', 'Server busy')}")
+        return None
+
+    if not response or not response.startswith("CONNECTED"):
+        print("Connection failed")
+        return None
+
+    # Servers without resumable sessions answer only "CONNECTED"
+    return response[len("CONNECTED"):].strip() or None, 'main', False
+
+
+def close_socket(sock):
+    try:
+        sock.shutdown(socket.SHUT_RDWR)  # Ends the reader thread
+    except OSError:
+        pass
+    sock.close()
+
+
+def reconnect(client_name, token, menu):
+    """
+    Reconnect after the connection dropped: exponential backoff with
+    jitter, then RESUME the session and go to the user's menu (the last
+    menu change may have been lost with the connection).
+    Returns (sock, token, stream), or None if the server cannot be reached.
+    """
+    global incoming
+    for attempt in range(RECONNECT_ATTEMPTS):
+        delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt) * random.uniform(0.5, 1.0)
+        print(f"\nConnection lost. Reconnecting in {delay:.1f} s "
+              f"(attempt {attempt + 1}/{RECONNECT_ATTEMPTS})...")
+        time.sleep(delay)
+
+        incoming = None  # The handshake reads the socket directly
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        try:
+            sock.connect((HOST, PORT))
+        except OSError as e:
+            print(f"Connection error: {e}")
+            sock.close()
+            continue
+
+        result = handshake(sock, client_name, token)
+        if result is None:
+            close_socket(sock)
+            continue
+
+        token, server_menu, resumed = result
+        start_reader(sock)
+        if resumed:
+            print("Session resumed.")
+            stream = None  # The server kept the session's options
+        else:
+            print("Reconnected with a new session.")
+            stream = enable_streaming(sock)
+            enable_etags(sock)
+
+        if server_menu != menu and server_menu != 'main':
+            send_message(sock, '5')
+        if server_menu != menu and menu != 'main':
+            send_message(sock, '1' if menu == 'headlines' else '2')
+            receive_message(sock)  # HEADLINES / SOURCES
+        return sock, token, stream
+
+    print("Could not reconnect to the server.")
+    return None
+
+
 def start_client():
     """Create the client socket and run the main interaction loop."""
     client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
@@ -343,49 +687,59 @@ def start_client():
         print("Connected!")
         
         client_name = input("Enter your name: ").strip()
-        if not send_message(client_socket, client_name):
-            print("Failed to send name")
-            return
-        
-        response = receive_message(client_socket)
-        if not response or response != "CONNECTED":
-            print("Connection failed")
+        result = handshake(client_socket, client_name)
+        if result is None:
             return
+        token = result[0]
         
         print(f"Welcome {client_name}!")
+        start_reader(client_socket)
+        stream = enable_streaming(client_socket)
+        enable_etags(client_socket)
 
+        menu = 'main'  # 'main', 'headlines' or 'sources'
         while True:
-            display_main_menu()
-            choice = input("Enter your choice: ").strip()
-            
-            if choice not in ['1', '2', '3']:
-                print("Invalid choice. Please try again.")
-                continue
-            
-            if not send_message(client_socket, choice):
-                print("Connection error")
-                break
-            
-            if choice == '1':
-                response = receive_message(client_socket)
-                if response == "HEADLINES":
-                    handle_headlines_menu(client_socket)
-            
-            elif choice == '2':
-                response = receive_message(client_socket)
-                if response == "SOURCES":
-                    handle_sources_menu(client_socket)
+            if menu != 'main':
+                handler = handle_headlines_menu if menu == 'headlines' else handle_sources_menu
+                if handler(client_socket, stream):
+                    menu = 'main'
+                    continue
+            else:
+                display_main_menu()
+                choice = input("Enter your choice: ").strip()
+                
+                if choice not in ['1', '2', '3']:
+                    print("Invalid choice. Please try again.")
+                    continue
+                
+                if choice == '3':
+                    if send_message(client_socket, choice):
+                        receive_message(client_socket)
+                    print("\nGoodbye!")
+                    break
+                
+                response = receive_message(client_socket) if send_message(client_socket, choice) else None
+                if choice == '1' and response == "HEADLINES":
+                    menu = 'headlines'
+                elif choice == '2' and response == "SOURCES":
+                    menu = 'sources'
+                if response is not None:
+                    continue
             
-            elif choice == '3':
-                receive_message(client_socket)
-                print("\nGoodbye!")
+            # The connection dropped: continue the session on a new one
+            close_socket(client_socket)
+            session = reconnect(client_name, token, menu)
+            if session is None:
                 break
+            client_socket, token, new_stream = session
+            if new_stream is not None:
+                stream = new_stream
     
     except Exception as e:
         print(f"Error: {e}")
     
     finally:
-        client_socket.close()
+        close_socket(client_socket)
 
 
 if __name__ == "__main__":
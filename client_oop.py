@@ -1,3 +1,26 @@
+# ============================================================
+# Client Script - Object Oriented Programming
+# ============================================================
+# This script runs the Client that connects to the News Server
+
+import argparse                # For command line options
+import contextlib              # For moving messages to stderr in batch mode
+import socket                  # For network communication
+import json                    # For parsing JSON responses
+import queue                   # Prefetch requests
+import random                  # Jitter of the reconnect delays
+import shlex                   # For parsing batch query lines
+import sys                     # stdin/stdout/stderr in batch mode
+import threading               # Lock shared with the background reader
+import time                    # For the client cache's expiry times
+from collections import OrderedDict
+from datetime import datetime  # For formatting publication dates
+from protocol import Protocol, FrameReader  # Protocol class + heartbeat reader
+
+# ============================================================
+# MenuDisplay Class - Showing menus
+# ============================================================
+
 class MenuDisplay:
     
     COUNTRIES = ['au', 'ca', 'jp', 'ae', 'sa', 'kr', 'us', 'ma']
@@ -28,6 +51,9 @@ class MenuDisplay:
         print("3. Search by country")
         print("4. List all headlines")
         print("5. Back to main menu")
+        print("6. Combined headlines (several countries/categories)")
+        print("7. Subscribe to new headlines")
+        print("8. Unsubscribe")
         print("-" * 60)
     
     @staticmethod
@@ -102,13 +128,59 @@ class NewsDisplay:
             return []
         
         for i, article in enumerate(articles[:15], 1):
-            print(f"\n{i}. Title: {article.get('title', 'N/A')}")
-            print(f"   Source: {article.get('source', {}).get('name', 'N/A')}")
-            print(f"   Author: {article.get('author', 'N/A')}")
-            print("-" * 60)
+            NewsDisplay.display_headline_row(i, article)
         
         return articles[:15]
     
+    @staticmethod
+    def display_headline_row(number, article):
+        """
+        Display one line of the headlines list
+        Used directly when results arrive one by one (streaming)
+        """
+        print(f"\n{number}. Title: {article.get('title', 'N/A')}")
+        print(f"   Source: {article.get('source', {}).get('name', 'N/A')}")
+        print(f"   Author: {article.get('author', 'N/A')}")
+        print("-" * 60)
+    
+    @staticmethod
+    def display_push(push):
+        """
+        Display articles pushed by a subscription
+        (called by the reader thread, so it can appear at any time)
+        """
+        articles = push.get('articles') or []
+        print(f"\n\n*** {len(articles)} new headline(s) for {push.get('subscription')} ***")
+        for number, article in enumerate(articles, 1):
+            NewsDisplay.display_headline_row(number, article)
+    
+    @staticmethod
+    def display_trace(trace, waited_ms=None):
+        """
+        Display the timing breakdown of one request (debug mode)
+        
+        Parameters:
+            trace: trace frame from the server (spans are [phase, start ms, ms])
+            waited_ms: time the client waited after its last frame, if known
+        """
+        phases = {}
+        request_arrived = 0.0  # when the last frame of the request reached the server
+        for phase, start, duration in trace.get('spans', []):
+            phases[phase] = phases.get(phase, 0.0) + duration
+            if phase == 'receive':
+                request_arrived = start + duration
+        
+        line = f"\n[trace {trace.get('trace_id')}] {trace.get('route')}: " \
+               f"{trace.get('total_ms', 0):.1f} ms on the server"
+        if waited_ms is not None:
+            line += f", {waited_ms:.1f} ms waited"
+        print(line)
+        for phase, duration in phases.items():
+            print(f"    {phase:<10} {duration:9.2f} ms")
+        if waited_ms is not None:
+            network = waited_ms - (trace.get('total_ms', 0) - request_arrived)
+            print(f"    {'network':<10} {max(network, 0.0):9.2f} ms")
+    
     @staticmethod
     def display_headline_details(article):
         """
@@ -152,11 +224,19 @@ class NewsDisplay:
             return []
         
         for i, source in enumerate(sources[:15], 1):
-            print(f"{i}. {source.get('name', 'N/A')}")
-            print("-" * 60)
+            NewsDisplay.display_source_row(i, source)
         
         return sources[:15]
     
+    @staticmethod
+    def display_source_row(number, source):
+        """
+        Display one line of the sources list
+        Used directly when results arrive one by one (streaming)
+        """
+        print(f"{number}. {source.get('name', 'N/A')}")
+        print("-" * 60)
+    
     @staticmethod
     def display_source_details(source):
         """
@@ -175,6 +255,338 @@ class NewsDisplay:
         print("=" * 60)
 
 
+# ============================================================
+# ResponseCache Class - Client-side List Cache
+# ============================================================
+
+class ResponseCache:
+    """
+    Client-side cache of list responses keyed by (menu, option, parameter)
+    
+    Entries younger than ttl are shown without asking the server. Older
+    ones are revalidated: the request carries the list's etag and the
+    server answers "not_modified" (one small frame) if it did not change.
+    Least recently used entries are dropped when the cache goes over its
+    entry count or size budget.
+    """
+    
+    def __init__(self, ttl=60, max_entries=32, max_bytes=1024 * 1024):
+        """
+        Constructor
+        
+        Parameters:
+            ttl: seconds an entry is used without asking the server
+            max_entries: maximum number of cached lists
+            max_bytes: size budget (estimated JSON size of all lists)
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.entries = OrderedDict()  # key -> (stored_at, size, header, items)
+        self.lock = threading.RLock()  # the prefetch thread stores lists too
+        self.hits = 0          # answered locally
+        self.revalidated = 0   # server said not_modified
+        self.misses = 0        # full list downloaded
+    
+    def lookup(self, key):
+        """
+        Returns:
+            (header, items, fresh) for a cached list, or None
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            stored_at, _, header, items = entry
+            self.entries.move_to_end(key)
+            return header, items, time.monotonic() - stored_at < self.ttl
+    
+    def store(self, key, header, items):
+        """Cache the first page of a list (header + summary items)"""
+        size = len(json.dumps(header)) + len(json.dumps(items))
+        with self.lock:
+            if key in self.entries:
+                self.total_bytes -= self.entries.pop(key)[1]
+            self.entries[key] = (time.monotonic(), size, header, items)
+            self.total_bytes += size
+            while len(self.entries) > 1 and (len(self.entries) > self.max_entries
+                                             or self.total_bytes > self.max_bytes):
+                self.total_bytes -= self.entries.popitem(last=False)[1][1]
+    
+    def refresh(self, key, header):
+        """
+        The server confirmed the cached list (not_modified): restart its
+        age and take the new result ID and cursor from the header
+        
+        Returns:
+            the cached items
+        """
+        with self.lock:
+            _, _, old_header, items = self.entries[key]
+            if header.get('result_id') != old_header.get('result_id'):
+                # Item IDs are <result_id>.<index>; the first page starts at 0
+                items = [dict(item, item_id=f"{header['result_id']}.{index}")
+                         for index, item in enumerate(items)]
+            self.store(key, dict(header, status='ok'), items)
+            return items
+    
+    def stats(self):
+        return {'entries': len(self.entries), 'bytes': self.total_bytes, 'hits': self.hits,
+                'revalidated': self.revalidated, 'misses': self.misses}
+
+
+# ============================================================
+# Prefetcher Class - Speculative Prefetch
+# ============================================================
+
+class Prefetcher:
+    """
+    Guesses which category/country/language the user will pick from
+    their past picks and fetches it over a second connection while the
+    user is still reading the list. The result goes into the client's
+    ResponseCache, so the pick is shown at once.
+    
+    Counts how many prefetched lists were picked (hit rate) and the
+    bytes of the ones that were not (wasted).
+    """
+    
+    def __init__(self, client, count=2, history_file=None, wait=1.0):
+        """
+        Constructor
+        
+        Parameters:
+            client: NewsClient whose cache is filled
+            count: guesses fetched each time a list is shown
+            history_file: JSON file with the user's past picks
+            wait: seconds to wait for a prefetch that is still running
+                  when the user picks it (after that the list is fetched
+                  on the main connection as usual)
+        """
+        self.client = client
+        self.count = count
+        self.history_file = history_file or f"{client.client_name}_prefetch_history.json"
+        self.wait = wait
+        self.history = self.load_history()  # "menu:option" -> {parameter: picks}
+        self.socket = None       # second connection, opened on first use
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.in_flight = {}      # cache key -> Event set when the prefetch is done
+        self.unused = {}         # cache key -> bytes, prefetched but not picked yet
+        self.prefetched = 0
+        self.hits = 0
+        self.bytes = 0
+        self.wasted_bytes = 0
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+    
+    # ============================================================
+    # History
+    # ============================================================
+    
+    def load_history(self):
+        try:
+            with open(self.history_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+    
+    def save_history(self):
+        try:
+            with open(self.history_file, 'w', encoding='utf-8') as f:
+                json.dump(self.history, f, indent=2)
+        except OSError as e:
+            print(f"[PREFETCH] Could not save history: {e}")
+    
+    def guess(self, menu, option, options):
+        """
+        The list of options is on screen: prefetch the user's most
+        picked ones that are not already cached
+        
+        Parameters:
+            menu, option: e.g. 'headlines', '2' (search by category)
+            options: the values shown in the list
+        """
+        picks = self.history.get(f"{menu}:{option}", {})
+        likely = sorted((value for value in options if picks.get(value)),
+                        key=lambda value: -picks[value])
+        
+        for value in likely[:self.count]:
+            key = (menu, option, value)
+            cached = self.client.cache.lookup(key)
+            if cached and cached[2]:
+                continue
+            with self.lock:
+                if key in self.in_flight:
+                    continue
+                self.in_flight[key] = threading.Event()
+            self.queue.put(key)
+    
+    def picked(self, key):
+        """
+        The user picked a parameter: remember it (the history is saved
+        on close), and wait a little for its prefetch if one is still running
+        
+        Parameters:
+            key: (menu, option, parameter) cache key of the request
+        """
+        menu, option, parameter = key
+        picks = self.history.setdefault(f"{menu}:{option}", {})
+        picks[parameter] = picks.get(parameter, 0) + 1
+        
+        with self.lock:
+            event = self.in_flight.get(key)
+        if event is not None:
+            event.wait(self.wait)
+        
+        with self.lock:
+            if self.unused.pop(key, None) is not None:
+                self.hits += 1
+    
+    # ============================================================
+    # Second Connection
+    # ============================================================
+    
+    def run(self):
+        """
+        Prefetch loop: one request at a time on the second connection
+        
+        The connection is only open while there is work. When the queue
+        is empty it ends with BYE, so an idle connection is never reaped
+        by the server (and its session is not parked) while the user reads
+        """
+        while True:
+            if self.queue.empty():
+                self.end_session()
+            key = self.queue.get()
+            if key is None:
+                self.end_session()
+                return
+            
+            size = None
+            for attempt in range(2):
+                try:
+                    size = self.fetch(key)
+                    break
+                except (OSError, ValueError, ConnectionError) as e:
+                    # The server may have closed the connection: try once more on a new one
+                    self.close_socket()
+                    if attempt:
+                        print(f"[PREFETCH] {key[2]} failed: {e}")
+            
+            with self.lock:
+                if size is not None:
+                    self.wasted_bytes += self.unused.pop(key, 0)  # Prefetched twice, never picked
+                    self.unused[key] = size
+                    self.prefetched += 1
+                    self.bytes += size
+                self.in_flight.pop(key).set()
+    
+    def receive(self):
+        """Next message on the second connection (PING is answered here)"""
+        while True:
+            message = Protocol.receive_message(self.socket)
+            if message is None:
+                raise ConnectionError("Connection closed")
+            if message != "PING":
+                return message
+            Protocol.send_message(self.socket, "PONG")
+    
+    def open_socket(self):
+        """Second session under the same name (shares the user's fair share)"""
+        self.socket = socket.create_connection((self.client.host, self.client.port))
+        Protocol.send_message(self.socket, self.client.client_name)
+        if not (self.receive() or "").startswith("CONNECTED"):
+            raise ConnectionError("Server refused the prefetch connection")
+        
+        # Same options as the main connection, so the lists are the same
+        Protocol.send_message(self.socket, "ETAGS")
+        self.receive()
+        if self.client.deep_fetch:
+            Protocol.send_message(self.socket, "DEEP")
+            self.receive()
+    
+    def fetch(self, key):
+        """
+        Fetch one list (single frame) and store it in the client cache
+        
+        Returns:
+            size of the response in bytes, or None if it was not stored
+        """
+        if self.socket is None:
+            self.open_socket()
+        
+        menu, option, parameter = key
+        Protocol.send_message(self.socket, '1' if menu == 'headlines' else '2')
+        self.receive()  # HEADLINES / SOURCES
+        Protocol.send_message(self.socket, option)
+        self.receive()  # READY
+        Protocol.send_message(self.socket, parameter)
+        response = self.receive()
+        Protocol.send_message(self.socket, '5')  # Back to the main menu
+        
+        data = json.loads(response)
+        if data.get('status') != 'ok':
+            return None
+        
+        kind = 'articles' if menu == 'headlines' else 'sources'
+        header = {name: value for name, value in data.items() if name != kind}
+        self.client.cache.store(key, header, (data.get(kind) or [])[:15])
+        return len(response.encode('utf-8'))
+    
+    def close_socket(self):
+        if self.socket is not None:
+            self.socket.close()
+            self.socket = None
+    
+    def end_session(self):
+        """Say BYE and close the connection (it is opened again when needed)"""
+        if self.socket is not None:
+            Protocol.send_message(self.socket, '3')  # BYE: the session is not parked
+        self.close_socket()
+    
+    def close(self):
+        """
+        Stop the prefetch loop (it says BYE on its own connection) and
+        save the history. Only the loop's thread uses the socket; if it
+        is stuck in a fetch, the socket is shut down to end it
+        """
+        self.queue.put(None)
+        self.thread.join(self.wait)
+        sock = self.socket
+        if self.thread.is_alive() and sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        self.save_history()
+    
+    # ============================================================
+    # Statistics
+    # ============================================================
+    
+    def stats(self):
+        """
+        Returns:
+            dictionary with the lists prefetched and picked, the hit
+            rate and the bytes downloaded for lists that were not picked
+        """
+        with self.lock:
+            return {
+                'prefetched': self.prefetched,
+                'hits': self.hits,
+                'hit_rate': round(self.hits / self.prefetched, 3) if self.prefetched else 0.0,
+                'bytes': self.bytes,
+                'wasted_bytes': self.wasted_bytes + sum(self.unused.values()),
+            }
+    
+    def report(self):
+        stats = self.stats()
+        print(f"[PREFETCH] {stats['hits']}/{stats['prefetched']} prefetched lists were picked "
+              f"(hit rate {stats['hit_rate']:.0%}), {stats['wasted_bytes']} of "
+              f"{stats['bytes']} bytes wasted")
+
+
 # ============================================================
 # NewsClient Class - Main Client
 # ============================================================
@@ -185,13 +597,18 @@ class NewsClient:
     Handles communication with the server and user interaction
     """
     
-    def __init__(self, host='127.0.0.1', port=5000):
+    def __init__(self, host='127.0.0.1', port=5000, deep_fetch=False, prefetch=False,
+                 reconnect_attempts=6, debug=False):
         """
         Constructor
         
         Parameters:
             host: server host (localhost)
             port: server port
+            deep_fetch: ask the server for all pages of headline results
+            prefetch: fetch the user's likely picks while a list is on screen
+            reconnect_attempts: tries after the connection drops (0 = exit)
+            debug: print the server's timing breakdown after every request
         """
         self.host = host
         self.port = port
@@ -200,11 +617,1198 @@ class NewsClient:
         self.client_name = None
         self.menu_display = MenuDisplay()
         self.news_display = NewsDisplay()
+        self.streaming = False  # server sends results one item per frame
+        self.deep_fetch = deep_fetch
+        self.next_cursor = None  # cursor for the next page of the last list
+        self.send_lock = threading.Lock()  # shared with the reader's PONG
+        self.reader = None  # FrameReader, answers the server's PING
+        self.cache = ResponseCache()  # lists already shown, by (menu, option, parameter)
+        self.etags = False  # server sends etags, so stale lists can be revalidated
+        self.prefetch = prefetch
+        self.prefetcher = None  # Prefetcher, created after the handshake
+        
+        # Reconnect: exponential backoff, then RESUME with the session token
+        self.reconnect_attempts = reconnect_attempts
+        self.backoff_base = 0.5  # seconds before the first try
+        self.backoff_max = 30    # longest wait between tries
+        self.token = None        # from "CONNECTED <token>"
+        self.menu = 'main'       # menu the user is in: 'main', 'headlines' or 'sources'
+        self.lists_requested = 0 # lists asked for in this session (for REPLAY)
+        
+        # Debug mode: the server sends a trace after every response
+        self.debug = debug
+        self.tracing = False
+        self.last_sent = None    # perf_counter() of the last frame sent
+        self.last_received = None
+        self.traces = queue.Queue()  # trace frames from the reader thread
+        self.trace_pending = False   # a request was sent whose trace is not shown yet
     
     def send(self, message):
         """Send message to server"""
-        return self.protocol.send_message(self.socket, message)
+        with self.send_lock:
+            self.last_sent = time.perf_counter()
+            return self.protocol.send_message(self.socket, message)
     
     def receive(self):
         """Receive message from server"""
-        return self.protocol.receive_message(self.socket)
+        if self.reader is not None:
+            message = self.reader.receive()
+        else:
+            message = self.protocol.receive_message(self.socket)
+        self.last_received = time.perf_counter()
+        return message
+    
+    # ============================================================
+    # Connection
+    # ============================================================
+    
+    def connect(self, client_name=None):
+        """
+        Connect to the server and send the client name
+        
+        Parameters:
+            client_name: name to use (asked with input() if not given)
+        
+        Returns:
+            True: if the server accepted the connection
+            False: if there is a problem
+        """
+        if not self.open_socket():
+            return False
+        
+        self.client_name = client_name or input("Enter your name: ").strip()
+        if self.handshake() is None:
+            return False
+        
+        print(f"Welcome {self.client_name}!")
+        self.setup_session()
+        if self.prefetch:
+            self.prefetcher = Prefetcher(self)
+        return True
+    
+    def open_socket(self):
+        """
+        Open the TCP connection
+        
+        Returns:
+            True if connected, False otherwise
+        """
+        try:
+            print(f"Connecting to server at {self.host}:{self.port}...")
+            self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.socket.connect((self.host, self.port))
+            print("Connected!")
+            return True
+        except Exception as e:
+            print(f"Connection error: {e}")
+            return False
+    
+    def handshake(self, resume=False):
+        """
+        Send the client name and read "CONNECTED <token>"
+        With resume, "RESUME <token>" is sent first to continue the
+        session of a dropped connection
+        
+        Returns:
+            "resumed" with the server's menu position, e.g. ("resumed", 'headlines'),
+            ("connected", 'main') for a new session, or None if refused/failed
+        """
+        response = None
+        if resume and self.token:
+            if not self.send(f"RESUME {self.token}"):
+                return None
+            response = self.receive()
+            if response and response.startswith("RESUMED "):
+                _, self.token, menu = response.split(' ', 2)
+                return "resumed", menu
+        
+        # New session (no token, or the server answered EXPIRED)
+        if response is None or response == "EXPIRED":
+            if not self.send(self.client_name):
+                print("Failed to send name")
+                return None
+            response = self.receive()
+        
+        if response and response.startswith('{'):
+            # The server refused the session (too many clients or overloaded)
+            print(f"Connection refused: {json.loads(response).get('message', 'Server busy')}")
+            return None
+        
+        if not response or not response.startswith("CONNECTED"):
+            print("Connection failed")
+            return None
+        
+        # Servers without resumable sessions answer only "CONNECTED"
+        self.token = response[len("CONNECTED"):].strip() or None
+        self.lists_requested = 0
+        return "connected", 'main'
+    
+    def make_reader(self):
+        """
+        From now on a background thread reads the socket: it answers
+        PING, shows pushed headlines and keeps the trace frames
+        """
+        self.reader = FrameReader(self.socket, self.send_lock, self.news_display.display_push,
+                                  self.show_trace)
+    
+    def setup_session(self):
+        """Start the reader and ask for the options of a new session"""
+        self.make_reader()
+        self.enable_streaming()
+        self.enable_etags()
+        if self.deep_fetch:
+            self.enable_deep_fetch()
+        if self.debug:
+            self.enable_tracing()
+    
+    def recover(self):
+        """
+        The connection dropped: reconnect with exponential backoff and
+        continue the session with the token of the last handshake
+        The server's menu position is brought back to the user's
+        
+        Returns:
+            "resumed": the server restored the session (options, menu,
+                       last list), "connected": a new session in the same
+                       menu, None: the server could not be reached
+        """
+        self.close_socket()
+        for attempt in range(self.reconnect_attempts):
+            delay = min(self.backoff_max, self.backoff_base * 2 ** attempt) * random.uniform(0.5, 1.0)
+            print(f"\nConnection lost. Reconnecting in {delay:.1f} s "
+                  f"(attempt {attempt + 1}/{self.reconnect_attempts})...")
+            time.sleep(delay)
+            
+            if not self.open_socket():
+                self.close_socket()
+                continue
+            result = self.handshake(resume=True)
+            if result is None:
+                self.close_socket()
+                continue
+            
+            status, server_menu = result
+            if status == "resumed":
+                self.make_reader()  # The server restored tracing too
+                print("Session resumed.")
+            else:
+                self.setup_session()
+                print("Reconnected with a new session.")
+            
+            # Go to the user's menu (the last menu change may have been lost)
+            if server_menu != self.menu and server_menu != 'main':
+                self.send('5')
+            if server_menu != self.menu and self.menu != 'main':
+                self.send('1' if self.menu == 'headlines' else '2')
+                self.receive()  # HEADLINES / SOURCES
+            return status
+        
+        print("Could not reconnect to the server.")
+        return None
+    
+    def enable_deep_fetch(self):
+        """
+        Ask the server to fetch all pages of headline queries
+        (limited by MAX_DEEP_PAGES on the server) instead of the first 15
+        """
+        if self.send("DEEP"):
+            self.deep_fetch = self.receive() == "DEEP"
+    
+    def enable_streaming(self):
+        """
+        Ask the server to stream results one item per frame
+        Older servers answer ERROR, then we keep single-frame responses
+        """
+        if self.send("STREAM"):
+            self.streaming = self.receive() == "STREAMING"
+    
+    def enable_etags(self):
+        """
+        Ask the server to send an etag with every list
+        Without it cached lists are only used until they expire
+        """
+        if self.send("ETAGS"):
+            self.etags = self.receive() == "ETAGS"
+    
+    def enable_tracing(self):
+        """
+        Ask the server to send the trace of every request (debug mode)
+        Older servers answer ERROR, then there is no breakdown
+        """
+        if self.send("TRACE"):
+            self.tracing = self.receive() == "TRACING"
+    
+    # Menu moves and session options: their traces are not shown
+    UNTRACED_ROUTES = ('main_options', 'main_headlines', 'main_sources', 'main_bye',
+                       'headlines_back', 'sources_back')
+    
+    def show_trace(self, trace):
+        """
+        A trace frame arrived (called by the reader thread): keep it
+        until the list it belongs to is on screen (print_traces)
+        """
+        if trace.get('route') not in self.UNTRACED_ROUTES:
+            self.traces.put(trace)
+    
+    def print_traces(self, wait=1.0):
+        """
+        Show the traces of the requests sent since the last call
+        (the trace frame follows the response, so wait for it a little)
+        """
+        if not self.tracing:
+            return
+        try:
+            if self.trace_pending:
+                # From the last frame of the request to the last frame of its response
+                waited_ms = None
+                if self.last_sent is not None and self.last_received is not None:
+                    waited_ms = 1000 * (self.last_received - self.last_sent)
+                self.news_display.display_trace(self.traces.get(timeout=wait), waited_ms)
+            while True:
+                self.news_display.display_trace(self.traces.get_nowait())
+        except queue.Empty:
+            pass
+        self.trace_pending = False
+    
+    def disconnect(self):
+        """Close the connection with the server"""
+        if self.prefetcher is not None:
+            self.prefetcher.report()
+            self.prefetcher.close()
+            self.prefetcher = None
+        self.close_socket()
+    
+    def close_socket(self):
+        if self.socket:
+            try:
+                self.socket.shutdown(socket.SHUT_RDWR)  # Ends the reader thread
+            except OSError:
+                pass
+            self.socket.close()
+            self.socket = None
+            self.reader = None
+    
+    # ============================================================
+    # Server Requests
+    # ============================================================
+    
+    def fetch_details(self, item, kind):
+        """
+        Ask the server for the full article/source behind a list item
+        
+        The list only carries summary fields and an item ID,
+        so the full item is requested with DETAIL when needed
+        
+        Parameters:
+            item: summary dictionary from the list
+            kind: 'article' or 'source'
+        
+        Returns:
+            full dictionary, or None if there is a problem
+        """
+        item_id = item.get('item_id')
+        if not item_id:
+            return item  # Server already sent the full item
+        
+        if not self.send("DETAIL"):
+            return None
+        self.trace_pending = True
+        self.receive()  # wait for READY
+        if not self.send(item_id):
+            return None
+        
+        response = self.receive()
+        if not response:
+            print("Error: No response from server")
+            return None
+        
+        data = json.loads(response)
+        self.print_traces()
+        if data.get('status') != 'ok':
+            print(f"Error: {data.get('message', 'Unknown error')}")
+            return None
+        return data.get(kind)
+    
+    def subscribe(self, filters, unsubscribe=False):
+        """
+        Subscribe to (or unsubscribe from) new headlines for a query
+        New articles arrive later as pushes and are shown by the reader
+        
+        Parameters:
+            filters: e.g. {"country": "us"} or {"q": "football"}
+        
+        Returns:
+            response dictionary, or None if the connection was lost
+        """
+        if not self.send("UNSUBSCRIBE" if unsubscribe else "SUBSCRIBE"):
+            return None
+        reply = self.receive()
+        if reply == "ERROR":
+            return {"status": "error", "message": "Server does not support subscriptions"}
+        if reply is None or not self.send(json.dumps(filters)):
+            return None
+        
+        response = self.receive()
+        return json.loads(response) if response else None
+    
+    def select_subscription(self):
+        """
+        Ask what to subscribe to
+        
+        Returns:
+            filters dictionary, or None if the choice is invalid
+        """
+        print("Subscribe by:  1. Keyword  2. Category  3. Country")
+        choice = input("Enter your choice: ").strip()
+        if choice == '1':
+            keyword = input("Enter keyword: ").strip()
+            return {"q": keyword} if keyword else None
+        if choice == '2':
+            self.menu_display.display_categories()
+            category = self.select_from_list(MenuDisplay.CATEGORIES, "Select category number: ")
+            return {"category": category} if category else None
+        if choice == '3':
+            self.menu_display.display_countries()
+            country = self.select_from_list(MenuDisplay.COUNTRIES, "Select country number: ")
+            return {"country": country} if country else None
+        print("Invalid choice.")
+        return None
+    
+    def fetch_batch(self, queries):
+        """
+        Run many queries in one BATCH request (from the main menu)
+        
+        Example - headlines for all countries at once:
+            client.fetch_batch([('headlines', {'country': c})
+                                for c in MenuDisplay.COUNTRIES])
+        
+        Parameters:
+            queries: list of (endpoint, filter) pairs,
+                     endpoint is 'headlines' or 'sources'
+        
+        Returns:
+            response dictionary with one entry per query in "results",
+            each with its own "status", or None if the connection was lost
+        """
+        batch = [{"endpoint": endpoint, "filter": filters} for endpoint, filters in queries]
+        
+        if not self.send("BATCH"):
+            return None
+        if self.receive() != "READY":
+            return {"status": "error", "message": "Server does not support batch requests"}
+        if not self.send(json.dumps(batch)):
+            return None
+        
+        response = self.receive()
+        if not response:
+            return None
+        return json.loads(response)
+    
+    def select_from_list(self, options, prompt):
+        """
+        Show a numbered choice and return the selected option
+        
+        Returns:
+            selected option, or None if the choice is invalid
+        """
+        choice = input(prompt).strip()
+        try:
+            index = int(choice) - 1
+            if 0 <= index < len(options):
+                return options[index]
+        except ValueError:
+            pass
+        print("Invalid choice.")
+        return None
+    
+    def select_parameter(self, menu, option, options, prompt):
+        """
+        Ask for one value of a list (category, country, language)
+        With prefetch on, the user's likely picks are fetched in the
+        background while the list is on screen
+        
+        Returns:
+            selected value, or None if the choice is invalid
+        """
+        if self.prefetcher is not None:
+            self.prefetcher.guess(menu, option, options)
+        return self.select_from_list(options, prompt)
+    
+    def select_many_from_list(self, options, prompt):
+        """
+        Ask for several numbers separated by commas (e.g. 1,4,5)
+        
+        Returns:
+            list of selected options (empty if nothing was entered),
+            or None if a number is invalid
+        """
+        selected = []
+        for part in input(prompt).split(','):
+            part = part.strip()
+            if not part:
+                continue
+            if not part.isdigit() or not 1 <= int(part) <= len(options):
+                print("Invalid choice.")
+                return None
+            if options[int(part) - 1] not in selected:
+                selected.append(options[int(part) - 1])
+        return selected
+    
+    def select_combined_headlines(self):
+        """
+        Ask for the countries and categories of a combined search
+        
+        Returns:
+            JSON string to send to the server, or None if invalid
+        """
+        self.menu_display.display_countries()
+        countries = self.select_many_from_list(
+            MenuDisplay.COUNTRIES, "Select country numbers (e.g. 1,4,5 or Enter for none): ")
+        if countries is None:
+            return None
+        
+        self.menu_display.display_categories()
+        categories = self.select_many_from_list(
+            MenuDisplay.CATEGORIES, "Select category numbers (e.g. 2,5 or Enter for none): ")
+        if categories is None:
+            return None
+        
+        if not countries and not categories:
+            print("Select at least one country or category.")
+            return None
+        
+        return json.dumps({"countries": countries, "categories": categories})
+    
+    # ============================================================
+    # Response Processing
+    # ============================================================
+    
+    def receive_list(self, kind, cache_key=None, cached=None):
+        """
+        Receive a list response and display it
+        
+        In streaming mode each row is printed as soon as its frame
+        arrives, so the first headline shows before the rest is sent
+        
+        Parameters:
+            kind: 'articles' or 'sources'
+            cache_key: client cache key of the request (None = not cached)
+            cached: (header, items, fresh) from the client cache; a fresh
+                    list is shown without reading from the server
+        
+        Returns:
+            list of displayed items (max 15),
+            None if the connection was lost
+            The cursor for the next page is kept in self.next_cursor
+        """
+        self.next_cursor = None
+        if kind == 'articles':
+            display_list = self.news_display.display_headlines_list
+        else:
+            display_list = self.news_display.display_sources_list
+        
+        if cached is not None and cached[2]:
+            self.cache.hits += 1
+            self.next_cursor = cached[0].get('cursor')
+            print("(from cache)")
+            return display_list(cached[1])
+        
+        if not self.streaming:
+            response = self.receive()
+            if not response:
+                print("Error: No response from server")
+                return None
+            
+            try:
+                data = json.loads(response)
+            except json.JSONDecodeError as e:
+                print(f"Error: Invalid JSON response - {e}")
+                return []
+            
+            if data.get('status') == 'not_modified':
+                return self.show_revalidated(display_list, cache_key, data)
+            
+            if data.get('status') != 'ok':
+                print(f"Error: {data.get('message', 'Unknown error')}")
+                return []
+            
+            self.next_cursor = data.get('cursor')
+            items = display_list(data.get(kind, []))
+            if cache_key is not None:
+                self.cache.misses += 1
+                header = {key: value for key, value in data.items() if key != kind}
+                self.cache.store(cache_key, header, items)
+            return items
+        
+        try:
+            frames = self.protocol.receive_stream(self.socket, self.receive)
+            header = next(frames)
+            
+            if header.get('status') == 'not_modified':
+                for _ in frames:
+                    pass  # Read the end frame
+                return self.show_revalidated(display_list, cache_key, header)
+            
+            if header.get('status') != 'ok':
+                print(f"Error: {header.get('message', 'Unknown error')}")
+                for _ in frames:
+                    pass  # Read until the end frame
+                return []
+            
+            self.next_cursor = header.get('cursor')
+            self.menu_display.print_header("HEADLINES" if kind == 'articles' else "SOURCES")
+            items = []
+            for item in frames:
+                if len(items) >= 15:
+                    continue  # Only the first 15 are shown
+                items.append(item)
+                if kind == 'articles':
+                    self.news_display.display_headline_row(len(items), item)
+                else:
+                    self.news_display.display_source_row(len(items), item)
+            
+            if not items:
+                print("No articles found." if kind == 'articles' else "No sources found.")
+            if cache_key is not None:
+                self.cache.misses += 1
+                self.cache.store(cache_key, header, items)
+            return items
+        
+        except (ConnectionError, StopIteration):
+            print("Error: No response from server")
+            return None
+    
+    def show_revalidated(self, display_list, cache_key, header):
+        """
+        The server answered not_modified: display the cached list
+        
+        Returns:
+            list of displayed items
+        """
+        self.cache.revalidated += 1
+        self.next_cursor = header.get('cursor')
+        print("(from cache, still up to date)")
+        return display_list(self.cache.refresh(cache_key, header))
+    
+    def send_request(self, choice, parameter, cached=None):
+        """
+        Send a menu request: the option, then its parameter after READY
+        A stale cached list is revalidated by sending "<option> <etag>"
+        
+        Returns:
+            False if the connection was lost, True otherwise
+        """
+        etag = cached[0].get('etag') if cached is not None and self.etags else None
+        if not self.send(f"{choice} {etag}" if etag else choice):
+            return False
+        self.lists_requested += 1
+        self.trace_pending = True
+        if parameter is None:
+            return True
+        self.receive()  # wait for READY
+        return self.send(parameter)
+    
+    def request_next_page(self, cursor=None):
+        """
+        Ask the server for the next page of the last list (NEXT + cursor)
+        The response is read by receive_list()
+        
+        Parameters:
+            cursor: cursor to follow (default: the one of the last list)
+        
+        Returns:
+            False if the connection was lost, True otherwise
+        """
+        if not self.send("NEXT"):
+            return False
+        self.lists_requested += 1
+        self.trace_pending = True
+        self.receive()  # wait for READY
+        return self.send(cursor or self.next_cursor)
+    
+    def request_list(self, choice, parameter, cache_key, cached, process):
+        """
+        Send a menu request and show its list; if the connection drops,
+        reconnect and show the list the server already had ready
+        (REPLAY) or send the request again
+        
+        Parameters:
+            choice, parameter: menu option and its parameter
+            cache_key, cached: client cache key and entry (a fresh entry is
+                               shown without asking the server)
+            process: process_headlines_response or process_sources_response
+        
+        Returns:
+            False if the server could not be reached again, True otherwise
+        """
+        fresh = cached is not None and cached[2]
+        if fresh or self.send_request(choice, parameter, cached):
+            if not fresh:
+                print("\nFetching data from server...")
+            if process(cache_key, cached):
+                return True
+        
+        status = self.recover()
+        if status is None:
+            return False
+        if fresh:
+            return True  # The list was shown, only a detail request was lost
+        
+        # A resumed session still has the last list sent on the server
+        if status == "resumed":
+            if not self.send(f"REPLAY {self.lists_requested}"):
+                return False
+            if self.receive() == "REPLAYING":
+                return process()
+        
+        if not self.send_request(choice, parameter, cached):
+            return False
+        return process(cache_key, cached)
+    
+    def process_headlines_response(self, cache_key=None, cached=None):
+        """
+        Display the headlines list page by page and optionally one article's details
+        
+        Parameters:
+            cache_key, cached: client cache key and entry of the first page
+        
+        Returns:
+            False if the connection was lost, True otherwise
+        """
+        while True:
+            article_list = self.receive_list('articles', cache_key, cached)
+            cache_key = cached = None  # Next pages are not cached
+            if article_list is None:
+                return False
+            self.print_traces()
+            if not article_list:
+                return True
+            
+            next_hint = ", 'n' for next page" if self.next_cursor else ""
+            detail_choice = input(
+                f"\nEnter article number for details{next_hint} (or press Enter to skip): "
+            ).strip().lower()
+            
+            if detail_choice == 'n' and self.next_cursor:
+                if not self.request_next_page():
+                    return False
+                continue
+            
+            if detail_choice.isdigit():
+                idx = int(detail_choice) - 1
+                if 0 <= idx < len(article_list):
+                    article = self.fetch_details(article_list[idx], 'article')
+                    if article:
+                        self.news_display.display_headline_details(article)
+            return True
+    
+    def process_sources_response(self, cache_key=None, cached=None):
+        """
+        Display the sources list page by page and optionally one source's details
+        
+        Parameters:
+            cache_key, cached: client cache key and entry of the first page
+        
+        Returns:
+            False if the connection was lost, True otherwise
+        """
+        while True:
+            source_list = self.receive_list('sources', cache_key, cached)
+            cache_key = cached = None  # Next pages are not cached
+            if source_list is None:
+                return False
+            self.print_traces()
+            if not source_list:
+                return True
+            
+            next_hint = ", 'n' for next page" if self.next_cursor else ""
+            detail_choice = input(
+                f"\nEnter source number for details{next_hint} (or press Enter to skip): "
+            ).strip().lower()
+            
+            if detail_choice == 'n' and self.next_cursor:
+                if not self.request_next_page():
+                    return False
+                continue
+            
+            if detail_choice.isdigit():
+                idx = int(detail_choice) - 1
+                if 0 <= idx < len(source_list):
+                    source = self.fetch_details(source_list[idx], 'source')
+                    if source:
+                        self.news_display.display_source_details(source)
+            return True
+    
+    # ============================================================
+    # Menu Handlers
+    # ============================================================
+    
+    def handle_headlines_menu(self):
+        """
+        Headlines menu loop
+        
+        Returns:
+            False if the connection was lost, True otherwise
+        """
+        while True:
+            self.menu_display.display_headlines_menu()
+            choice = input("Enter your choice: ").strip()
+            
+            if choice not in ['1', '2', '3', '4', '5', '6', '7', '8']:
+                print("Invalid choice. Please try again.")
+                continue
+            
+            # Subscriptions: new headlines are pushed by the server later
+            if choice in ['7', '8']:
+                filters = self.select_subscription()
+                if filters is None:
+                    continue
+                response = self.subscribe(filters, unsubscribe=(choice == '8'))
+                if response is None:
+                    print("Connection error")
+                    return False
+                if response.get('status') != 'ok':
+                    print(f"Error: {response.get('message', 'Unknown error')}")
+                elif choice == '7':
+                    print(f"Subscribed to {response['subscription']}. New headlines will appear here.")
+                else:
+                    print(f"Unsubscribed from {response['subscription']}.")
+                continue
+            
+            if choice == '5':
+                self.menu = 'main'
+                if not self.send(choice) and self.recover() is None:
+                    print("Connection error")
+                    return False
+                return True
+            
+            parameter = None
+            if choice == '1':
+                parameter = input("Enter keyword: ").strip()
+            elif choice == '2':
+                self.menu_display.display_categories()
+                parameter = self.select_parameter(
+                    'headlines', choice, MenuDisplay.CATEGORIES, "Select category number: ")
+            elif choice == '3':
+                self.menu_display.display_countries()
+                parameter = self.select_parameter(
+                    'headlines', choice, MenuDisplay.COUNTRIES, "Select country number: ")
+            elif choice == '6':
+                parameter = self.select_combined_headlines()
+            
+            if choice in ['2', '3', '6'] and parameter is None:
+                continue
+            
+            # A fresh cached (or prefetched) list is shown without asking the server
+            cache_key = ('headlines', choice, parameter)
+            if self.prefetcher is not None and choice in ['2', '3']:
+                self.prefetcher.picked(cache_key)
+            cached = self.cache.lookup(cache_key)
+            if not self.request_list(choice, parameter, cache_key, cached,
+                                     self.process_headlines_response):
+                print("Connection error")
+                return False
+            input("\nPress Enter to continue...")
+    
+    def handle_sources_menu(self):
+        """
+        Sources menu loop
+        
+        Returns:
+            False if the connection was lost, True otherwise
+        """
+        while True:
+            self.menu_display.display_sources_menu()
+            choice = input("Enter your choice: ").strip()
+            
+            if choice not in ['1', '2', '3', '4', '5']:
+                print("Invalid choice. Please try again.")
+                continue
+            
+            parameter = None
+            if choice == '1':
+                self.menu_display.display_categories()
+                parameter = self.select_parameter(
+                    'sources', choice, MenuDisplay.CATEGORIES, "Select category number: ")
+            elif choice == '2':
+                self.menu_display.display_countries()
+                parameter = self.select_parameter(
+                    'sources', choice, MenuDisplay.COUNTRIES, "Select country number: ")
+            elif choice == '3':
+                self.menu_display.display_languages()
+                parameter = self.select_parameter(
+                    'sources', choice, MenuDisplay.LANGUAGES, "Select language number: ")
+            
+            if choice in ['1', '2', '3'] and parameter is None:
+                continue
+            
+            if choice == '5':
+                self.menu = 'main'
+                if not self.send(choice) and self.recover() is None:
+                    print("Connection error")
+                    return False
+                return True
+            
+            cache_key = ('sources', choice, parameter)
+            if self.prefetcher is not None and parameter is not None:
+                self.prefetcher.picked(cache_key)
+            cached = self.cache.lookup(cache_key)
+            if not self.request_list(choice, parameter, cache_key, cached,
+                                     self.process_sources_response):
+                print("Connection error")
+                return False
+            input("\nPress Enter to continue...")
+    
+    # ============================================================
+    # Headless Batch Mode
+    # ============================================================
+    
+    # Menu option of each filter when a query has to go through the menus
+    MENU_OPTIONS = {
+        'headlines': {'q': '1', 'category': '2', 'country': '3'},
+        'sources': {'category': '1', 'country': '2', 'language': '3'},
+    }
+    
+    @staticmethod
+    def parse_query(line):
+        """
+        Parse one line of a batch file, either JSON:
+            {"endpoint": "headlines", "filter": {"country": "us"}}
+        or the short form (quote values with spaces):
+            headlines country=us category=sports
+            headlines q="climate change"
+            sources language=en
+        
+        Returns:
+            {"endpoint": ..., "filter": {...}}, or None if malformed
+        """
+        if line.startswith('{'):
+            try:
+                query = json.loads(line)
+                return {"endpoint": query['endpoint'], "filter": dict(query.get('filter') or {})}
+            except (ValueError, KeyError, TypeError, AttributeError):
+                return None
+        
+        try:
+            endpoint, *pairs = shlex.split(line)
+        except ValueError:
+            return None
+        filters = {}
+        for pair in pairs:
+            name, sep, value = pair.partition('=')
+            if not sep or not value:
+                return None
+            filters[name] = value
+        return {"endpoint": endpoint, "filter": filters}
+    
+    def read_result(self, kind):
+        """
+        Read one list response (one frame or a stream) as a dictionary
+        
+        Raises:
+            ConnectionError: if the connection was lost
+        """
+        if not self.streaming:
+            response = self.receive()
+            if not response:
+                raise ConnectionError("Connection closed")
+            return json.loads(response)
+        
+        frames = self.protocol.receive_stream(self.socket, self.receive)
+        data = next(frames)
+        items = list(frames)
+        if data.get('status') == 'ok':
+            data[kind] = items
+        return data
+    
+    def fetch_remaining_pages(self, result):
+        """Follow the cursor of a result and add the items of all next pages"""
+        kind = 'articles' if 'articles' in result else 'sources'
+        while result.get('cursor'):
+            if not self.request_next_page(result['cursor']):
+                raise ConnectionError("Connection closed")
+            page = self.read_result(kind)
+            if page.get('status') != 'ok':
+                result['page_error'] = page.get('message')
+                break
+            result[kind].extend(page.get(kind) or [])
+            result['cursor'] = page.get('cursor')
+        result.pop('cursor', None)
+    
+    def run_single(self, query, all_pages=False):
+        """
+        Run one query through the menus (for servers without BATCH)
+        Only queries with at most one filter fit a menu option
+        
+        Returns:
+            result dictionary
+        """
+        endpoint, filters = query['endpoint'], query['filter']
+        options = self.MENU_OPTIONS.get(endpoint)
+        if options is None or len(filters) > 1 or any(name not in options for name in filters):
+            return {"status": "error", "message": "Query needs a server with BATCH support"}
+        
+        option, parameter = '4', None
+        for name, value in filters.items():
+            option, parameter = options[name], value
+        
+        if not self.send('1' if endpoint == 'headlines' else '2'):
+            raise ConnectionError("Connection closed")
+        self.receive()  # HEADLINES / SOURCES
+        if not self.send_request(option, parameter):
+            raise ConnectionError("Connection closed")
+        
+        result = self.read_result('articles' if endpoint == 'headlines' else 'sources')
+        if all_pages and result.get('status') == 'ok':
+            self.fetch_remaining_pages(result)
+        self.send('5')  # Back to the main menu
+        return result
+    
+    def run_chunk(self, chunk, use_batch, all_pages, retries):
+        """
+        Run a group of queries: in one BATCH request (fetched concurrently
+        by the server) if it supports it, otherwise one by one.
+        Queries answered "busy" are sent again after retry_after seconds
+        
+        BATCH takes the place of pipelining the queries on the connection:
+        the server answers a batch as one response, so a query in a batch
+        has no latency of its own, only the batch's round trip
+        
+        Returns:
+            ([(query, result, latency in seconds, batched), ...], use_batch,
+             [latency of each BATCH request in seconds, ...])
+        """
+        results = {}
+        batch_latencies = []
+        pending = list(range(len(chunk)))
+        for attempt in range(retries + 1):
+            if use_batch:
+                started = time.monotonic()
+                response = self.fetch_batch([(chunk[i]['endpoint'], chunk[i]['filter'])
+                                             for i in pending])
+                if response is None:
+                    raise ConnectionError("Connection closed")
+                if 'results' not in response:
+                    print(f"[BATCH] {response.get('message')}, sending queries one by one",
+                          file=sys.stderr)
+                    use_batch = False
+                else:
+                    # All queries of a batch are answered together
+                    latency = time.monotonic() - started
+                    batch_latencies.append(latency)
+                    for i, result in zip(pending, response['results']):
+                        result.pop('endpoint', None)
+                        result.pop('filter', None)
+                        if all_pages and result.get('status') == 'ok':
+                            self.fetch_remaining_pages(result)
+                        results[i] = (result, latency, True)
+            
+            if not use_batch:
+                for i in pending:
+                    started = time.monotonic()
+                    result = self.run_single(chunk[i], all_pages)
+                    results[i] = (result, time.monotonic() - started, False)
+            
+            busy = [i for i in pending if results[i][0].get('status') == 'busy']
+            if not busy or attempt == retries:
+                break
+            wait = max(results[i][0].get('retry_after', 1) for i in busy)
+            print(f"[BATCH] {len(busy)} queries busy, retrying in {wait} s", file=sys.stderr)
+            time.sleep(wait)
+            pending = busy
+        
+        return [(chunk[i],) + results[i] for i in range(len(chunk))], use_batch, batch_latencies
+    
+    @staticmethod
+    def latency_summary(label, latencies):
+        """"<label> avg .. ms, p95 .. ms, max .. ms" of latencies in seconds"""
+        ordered = sorted(latencies)
+        p95 = ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+        return (f"{label} avg {1000 * sum(ordered) / len(ordered):.0f} ms, "
+                f"p95 {1000 * p95:.0f} ms, max {1000 * ordered[-1]:.0f} ms")
+    
+    def run_headless(self, lines, client_name, out=None, batch_size=20, all_pages=False,
+                     retries=3):
+        """
+        Non-interactive mode: run the queries of a file (or stdin) over
+        one connection and write one JSON line per query to out
+        
+        Each line is the query, its latency and the server's result:
+            {"query": {...}, "latency_ms": 84.2, "status": "ok", "articles": [...], ...}
+        Queries sent in a BATCH have "batch_latency_ms" instead: the round
+        trip of the whole batch (see run_chunk). Messages and the
+        throughput summary go to stderr, so stdout can be piped into
+        other tools
+        
+        Parameters:
+            lines: iterable of query lines (see parse_query)
+            client_name: name sent in the handshake
+            out: where the JSON lines go (stdout)
+            batch_size: queries per BATCH request (server limit MAX_BATCH_SIZE)
+            all_pages: follow the cursors and output every page
+            retries: times a "busy" query is sent again
+        
+        Returns:
+            exit code: 0 all queries ok, 1 connection failed,
+            2 some queries failed or could not be parsed
+        """
+        out = out or sys.stdout
+        
+        queries = []
+        unparsed = 0
+        for number, line in enumerate(lines, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            query = self.parse_query(line)
+            if query is None:
+                print(f"[BATCH] Line {number}: cannot parse {line!r}", file=sys.stderr)
+                unparsed += 1
+                continue
+            queries.append(query)
+        
+        # The interactive messages of connect() would mix with the JSON lines
+        with contextlib.redirect_stdout(sys.stderr):
+            if not self.connect(client_name):
+                self.disconnect()
+                return 1
+        
+        started = time.monotonic()
+        count = 0
+        latencies = []        # Queries sent one by one
+        batch_latencies = []  # BATCH requests
+        failed = 0
+        written = 0
+        use_batch = True
+        try:
+            for start in range(0, len(queries), batch_size):
+                chunk = queries[start:start + batch_size]
+                done, use_batch, batches = self.run_chunk(chunk, use_batch, all_pages, retries)
+                batch_latencies.extend(batches)
+                for query, result, latency, batched in done:
+                    field = "batch_latency_ms" if batched else "latency_ms"
+                    line = json.dumps(dict({"query": query, field: round(1000 * latency, 1)},
+                                           **result))
+                    out.write(line + "\n")
+                    written += len(line) + 1
+                    count += 1
+                    if not batched:
+                        latencies.append(latency)
+                    if result.get('status') != 'ok':
+                        failed += 1
+                out.flush()
+        except (ConnectionError, StopIteration, ValueError) as e:
+            print(f"[BATCH] Connection lost after {count} queries: {e}", file=sys.stderr)
+            return 1
+        else:
+            if self.send('3'):  # BYE: the session is not parked
+                self.receive()
+        finally:
+            with contextlib.redirect_stdout(sys.stderr):
+                self.disconnect()
+        
+        elapsed = max(time.monotonic() - started, 1e-9)
+        if count:
+            summary = (f"[BATCH] {count} queries ({count - failed} ok, {failed} failed) "
+                       f"in {elapsed:.2f} s: {count / elapsed:.1f} queries/s, "
+                       f"{written / 1024 / elapsed:.1f} KB/s")
+            if batch_latencies:
+                summary += f"; {self.latency_summary('batch latency', batch_latencies)} " \
+                           f"({len(batch_latencies)} batches)"
+            if latencies:
+                summary += f"; {self.latency_summary('query latency', latencies)}"
+            print(summary, file=sys.stderr)
+        return 2 if failed or unparsed else 0
+    
+    # ============================================================
+    # Main Loop
+    # ============================================================
+    
+    def run(self):
+        """
+        Main client loop
+        """
+        if not self.connect():
+            self.disconnect()
+            return
+        
+        try:
+            while True:
+                self.menu_display.display_main_menu()
+                choice = input("Enter your choice: ").strip()
+                
+                if choice not in ['1', '2', '3']:
+                    print("Invalid choice. Please try again.")
+                    continue
+                
+                if choice == '3':
+                    self.send(choice)
+                    print("\nGoodbye!")
+                    break
+                
+                response = self.receive() if self.send(choice) else None
+                if response is None:
+                    # Connection lost: reconnect, then show the main menu again
+                    if self.recover() is None:
+                        print("Connection error")
+                        break
+                    continue
+                
+                if choice == '1' and response == "HEADLINES":
+                    self.menu = 'headlines'
+                    if not self.handle_headlines_menu():
+                        break
+                
+                elif choice == '2' and response == "SOURCES":
+                    self.menu = 'sources'
+                    if not self.handle_sources_menu():
+                        break
+        
+        except KeyboardInterrupt:
+            print("\nGoodbye!")
+        
+        except Exception as e:
+            print(f"Error: {e}")
+        
+        finally:
+            self.disconnect()
+
+
+# ============================================================
+# Program Execution
+# ============================================================
+if __name__ == "__main__":
+    # Executed only when running this file directly
+    parser = argparse.ArgumentParser(description="News Service Client (OOP)")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--prefetch', action='store_true',
+                        help="fetch likely picks in the background while a list is shown")
+    parser.add_argument('--reconnect', type=int, default=6, metavar='N',
+                        help="reconnect tries after the connection drops (0 = exit)")
+    parser.add_argument('--deep', action='store_true',
+                        help="fetch all pages of headline queries on the server")
+    parser.add_argument('--debug', action='store_true',
+                        help="print the server's timing breakdown after every request")
+    parser.add_argument('--batch', metavar='FILE',
+                        help="run the queries in FILE ('-' = stdin) without menus, JSON lines to stdout")
+    parser.add_argument('--name', default='batch', help="client name in batch mode")
+    parser.add_argument('--batch-size', type=int, default=20,
+                        help="queries per BATCH request")
+    parser.add_argument('--all-pages', action='store_true',
+                        help="batch mode: output every page, not only the first")
+    args = parser.parse_args()
+    
+    client = NewsClient(host=args.host, port=args.port, deep_fetch=args.deep,
+                        prefetch=args.prefetch, reconnect_attempts=args.reconnect,
+                        debug=args.debug)
+    if args.batch:
+        if args.batch == '-':
+            code = client.run_headless(sys.stdin, args.name, batch_size=args.batch_size,
+                                       all_pages=args.all_pages)
+        else:
+            with open(args.batch, 'r', encoding='utf-8') as f:
+                code = client.run_headless(f, args.name, batch_size=args.batch_size,
+                                           all_pages=args.all_pages)
+        sys.exit(code)
+    client.run()
@@ -4,10 +4,114 @@
 # This file stores API information so it can be reused
 # across other project files
 
+import os
+
 # NewsAPI.org API key
 # This key is required to authenticate API requests
 NEWS_API_KEY = "a7e07d89e99a46b7b42ef4d59655df86"
 
 # Base URL for NewsAPI
 # All API requests will be sent through this base endpoint
-NEWS_API_BASE_URL = "https://newsapi.org/v2"
+# Can be pointed at fake_upstream.py for benchmarks:
+#   NEWS_API_BASE_URL=http://127.0.0.1:8080/v2 python server_oop.py
+NEWS_API_BASE_URL = os.environ.get("NEWS_API_BASE_URL", "https://newsapi.org/v2")
+
+# Server-side result cache
+# Full API responses are kept here so clients only download a summary list
+# and fetch the full details of one article/source when they need it
+RESULT_CACHE_SIZE = 256   # maximum number of stored result sets
+RESULT_CACHE_TTL = 600    # seconds before a stored result set expires
+RESULT_CACHE_MAX_BYTES = 32 * 1024 * 1024  # memory budget; paging cursors expire with it
+
+# Result paging
+# Lists are sent one page at a time; the client asks for more with NEXT
+RESULT_PAGE_SIZE = 15     # items per page
+
+# Upstream query cache
+# Identical NewsAPI queries from any client are answered from here
+QUERY_CACHE_SIZE = 128    # maximum number of cached queries
+QUERY_CACHE_TTL = 120     # seconds before a cached query is fetched again
+
+# Batch requests
+MAX_BATCH_SIZE = 20       # maximum number of queries in one BATCH request
+BATCH_CONCURRENCY = 4     # queries of one batch fetched at the same time
+
+# Upstream rate limit (shared by all clients)
+# NewsAPI requests wait for a free slot instead of all going out at once
+UPSTREAM_RATE_LIMIT = 10  # requests per second
+UPSTREAM_BURST = 20       # requests allowed at once before waiting
+
+# Deep fetch (all pages of a query instead of the first 15 results)
+DEEP_PAGE_SIZE = 100      # results per page (NewsAPI maximum)
+MAX_DEEP_PAGES = 5        # never fetch more pages than this per query
+
+# Multi-process server (python server_oop.py --workers N)
+WORKER_RESTART_DELAY = 1  # seconds to wait before restarting a failed worker
+
+# Shared cache for worker processes (python server_oop.py --workers N)
+# One mmap'd file on this host lets every worker see the others' fetches
+SHARED_CACHE_BYTES = 64 * 1024 * 1024  # capacity of the shared cache in bytes
+SHARED_CACHE_SLOTS = 4096              # number of index entries
+
+# Front proxy (python proxy.py --backend host:port --backend host:port)
+PROXY_PORT = 5100             # port the proxy listens on
+PROXY_VIRTUAL_NODES = 100     # points per backend on the hash ring
+HEALTH_CHECK_INTERVAL = 5     # seconds between backend health checks
+HEALTH_CHECK_FAILURES = 2     # failed checks before a backend is ejected
+BACKEND_TIMEOUT = 30          # seconds to wait for a backend response
+
+# Event-loop server (server_selectors.py)
+SELECTOR_WORKERS = 4          # threads that run the NewsAPI calls
+MAX_FRAME_SIZE = 1024 * 1024  # largest message accepted from a client
+
+# Upstream worker pool (all NewsAPI calls of server_oop.py go through it)
+UPSTREAM_WORKERS = 8          # NewsAPI calls running at the same time
+UPSTREAM_QUEUE_SIZE = 64      # calls allowed to wait; more get a "busy" reply
+POOL_STATS_INTERVAL = 30      # seconds between pool statistics lines
+
+# Admission control (server_oop.py)
+MAX_SESSIONS = 100            # clients served at the same time
+LISTEN_BACKLOG = 64           # connections the OS keeps before accept()
+ADMISSION_POLICY = 'reject'   # 'reject' or 'queue' when MAX_SESSIONS is reached
+ADMISSION_QUEUE_SIZE = 50     # clients that may wait for a session ('queue')
+ADMISSION_QUEUE_TIMEOUT = 5   # seconds a client may wait before it is refused
+OVERLOAD_IN_FLIGHT = 48       # upstream calls (running + queued) that mean overload
+OVERLOAD_QUEUE_DELAY = 2.0    # seconds of upstream queue delay that mean overload
+
+# Fair queuing of upstream calls between clients (keyed by client name)
+FAIR_QUEUING = True           # False = one FIFO queue for everybody
+CLIENT_MAX_CONCURRENT = 4     # calls of one client running at the same time
+CLIENT_MAX_QUEUED = 20        # calls of one client waiting (>= MAX_BATCH_SIZE)
+CLIENT_RATE_LIMIT = 5         # calls per second per client (None = no cap)
+CLIENT_BURST = 20             # calls one client may send at once
+CLIENT_WEIGHTS = {}           # client name -> weight (default 1)
+
+# Heartbeats and idle sessions (server_oop.py)
+PING_INTERVAL = 30            # seconds of silence before the server sends PING
+PONG_TIMEOUT = 10             # seconds to answer a PING before the session is closed
+SESSION_IDLE_TIMEOUT = 1800   # seconds without a request before the session is closed
+REAPER_INTERVAL = 5           # seconds between checks of all sessions
+
+# Push subscriptions (SUBSCRIBE command)
+SUBSCRIPTION_REFRESH_INTERVAL = 60  # seconds between refreshes of each subscribed query
+MAX_SUBSCRIPTIONS = 10              # subscriptions per client
+SUBSCRIPTION_SEEN_LIMIT = 500       # article URLs remembered per subscribed query
+PUSH_OUTBOX_SIZE = 32               # pushes waiting for a slow client (>= MAX_SUBSCRIPTIONS)
+
+# Resumable sessions ("CONNECTED <token>", RESUME <token>)
+SESSION_RESUME_TTL = 300      # seconds a dropped session can be resumed
+MAX_PARKED_SESSIONS = 1000    # dropped sessions kept for resuming
+
+# Admin HTTP server (GET /metrics), bound to 127.0.0.1
+ADMIN_PORT = None             # e.g. 9100; None = no admin server
+
+# Structured logging (JSON lines written by a background thread)
+LOG_LEVEL = 'info'            # 'debug', 'info', 'warning' or 'error'
+LOG_QUEUE_SIZE = 10000        # lines waiting for the writer; more are dropped
+LOG_PATH = None               # file to append to; None = stdout
+LOG_SAMPLE_RATE = 1.0         # fraction of the per-request lines kept (0.1 = one in ten)
+
+# Request traces (TRACE command, slow trace file)
+TRACE_SLOW_MS = 1000          # requests slower than this are written to the trace file
+TRACE_SAMPLE_RATE = 1.0       # fraction of the slow traces written
+TRACE_PATH = None             # file of the slow traces; None = not written
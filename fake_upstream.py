@@ -0,0 +1,152 @@
+# ============================================================
+# Fake Upstream - Local NewsAPI Stand-in for Benchmarks
+# ============================================================
+# Serves /v2/top-headlines and /v2/top-headlines/sources from the
+# sample JSON files in this folder, so the server can be load
+# tested without an API key or internet access.
+#
+# Usage:
+#   python fake_upstream.py --port 8080 --delay 0.05
+#   NEWS_API_BASE_URL=http://127.0.0.1:8080/v2 python server_oop.py
+
+import argparse   # For command line options
+import json       # For building responses
+import os         # For locating the sample files
+import threading  # For running in the background of a benchmark
+import time       # For simulated latency
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+# Sample responses saved from the real API
+SAMPLE_FILES = ['noor_category_GB5.json', 'noor_country_GB5.json']
+
+
+def load_sample_articles():
+    """Load the articles of the sample files (used as the article pool)"""
+    articles = []
+    for filename in SAMPLE_FILES:
+        try:
+            path = os.path.join(os.path.dirname(os.path.abspath(__file__)), filename)
+            with open(path, encoding='utf-8') as f:
+                articles.extend(json.load(f).get('articles', []))
+        except (OSError, ValueError):
+            continue
+    return articles
+
+
+def build_sources(count=120):
+    """Build a list of fake sources with the same fields as NewsAPI"""
+    categories = ['business', 'general', 'health', 'science', 'sports', 'technology']
+    countries = ['au', 'ca', 'jp', 'ae', 'sa', 'kr', 'us', 'ma']
+    return [{
+        "id": f"source-{i}",
+        "name": f"Source {i}",
+        "description": f"Sample news source number {i}",
+        "url": f"https://source-{i}.example.com",
+        "category": categories[i % len(categories)],
+        "language": 'ar' if countries[i % len(countries)] in ('ae', 'sa', 'ma') else 'en',
+        "country": countries[i % len(countries)],
+    } for i in range(count)]
+
+
+class FakeNewsAPIHandler(BaseHTTPRequestHandler):
+    """
+    Answers NewsAPI requests from the sample data
+    Filters by the query parameters and supports page/pageSize
+    """
+
+    articles = []
+    sources = []
+    delay = 0.0  # simulated upstream latency (seconds)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+
+        if self.delay:
+            time.sleep(self.delay)
+
+        if url.path.endswith('/top-headlines/sources'):
+            data = self.sources_response(params)
+        elif url.path.endswith('/top-headlines'):
+            data = self.headlines_response(params)
+        else:
+            self.send_json(404, {"status": "error", "message": "Not found"})
+            return
+
+        self.send_json(200, data)
+
+    def headlines_response(self, params):
+        """Filtered, paged headlines. Every query gets its own copies of the pool"""
+        tag = params.get('country', '') + params.get('category', '') + params.get('q', '')
+        total = len(self.articles)
+        page_size = int(params.get('pageSize', 20))
+        page = int(params.get('page', 1))
+
+        page_articles = []
+        for i in range((page - 1) * page_size, min(page * page_size, total)):
+            article = dict(self.articles[i])
+            article['url'] = f"{article.get('url')}#{tag}"  # unique per query
+            page_articles.append(article)
+
+        return {"status": "ok", "totalResults": total, "articles": page_articles}
+
+    def sources_response(self, params):
+        """Sources filtered by category, country and language"""
+        sources = [
+            source for source in self.sources
+            if all(source.get(key) == params[key]
+                   for key in ('category', 'country', 'language') if key in params)
+        ]
+        return {"status": "ok", "sources": sources}
+
+    def send_json(self, status, data):
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Keep benchmark output clean
+
+
+def start_fake_upstream(host='127.0.0.1', port=8080, delay=0.0, background=True):
+    """
+    Start the fake NewsAPI server
+
+    Parameters:
+        host, port: address to listen on (port 0 = any free port)
+        delay: simulated upstream latency in seconds
+        background: run in a daemon thread and return immediately
+
+    Returns:
+        the HTTP server object (server.server_address has the real port)
+    """
+    FakeNewsAPIHandler.articles = load_sample_articles()
+    FakeNewsAPIHandler.sources = build_sources()
+    FakeNewsAPIHandler.delay = delay
+
+    httpd = ThreadingHTTPServer((host, port), FakeNewsAPIHandler)
+    httpd.daemon_threads = True
+
+    if background:
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    else:
+        print(f"Fake NewsAPI listening on http://{host}:{httpd.server_address[1]}/v2")
+        try:
+            httpd.serve_forever()
+        except KeyboardInterrupt:
+            pass
+    return httpd
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local fake NewsAPI for benchmarks")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--delay', type=float, default=0.0, help="simulated latency (seconds)")
+    args = parser.parse_args()
+
+    start_fake_upstream(args.host, args.port, args.delay, background=False)
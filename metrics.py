@@ -0,0 +1,280 @@
+# ============================================================
+# Metrics - Counters, Gauges and Histograms for the Admin Port
+# ============================================================
+# The server counts its work in a MetricsRegistry and the admin port
+# (admin.py) renders it in the Prometheus text format:
+#
+#   curl http://127.0.0.1:9100/metrics
+#
+# Recording is cheap on purpose: a counter or histogram update is a
+# dictionary lookup and a few additions under a lock, and a request
+# is timed with time.perf_counter() marks (RequestTimer), which are
+# also the spans of the request's trace. Cumulative buckets, ratios
+# and the pool/session gauges are only computed when the page is
+# scraped.
+
+import bisect     # Histogram bucket of a value
+import random     # Trace IDs
+import threading  # Metrics are updated by all client threads
+import time       # Request timing
+
+# Upper bounds of the latency buckets (seconds)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def format_labels(names, values, extra=''):
+    pairs = [f'{name}="{escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """
+    One metric name with a child per combination of label values
+    """
+
+    kind = 'untyped'
+
+    def __init__(self, name, description, labels=()):
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+        self.children = {}  # label values -> value
+        self.lock = threading.Lock()
+
+    def samples(self):
+        """(suffix, label values, extra label, value) of every sample"""
+        with self.lock:
+            return [('', values, '', value) for values, value in self.children.items()]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, values, extra, value in self.samples():
+            lines.append(f"{self.name}{suffix}{format_labels(self.labels, values, extra)} "
+                         f"{format_value(value)}")
+        return lines
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, *values, amount=1):
+        with self.lock:
+            self.children[values] = self.children.get(values, 0) + amount
+
+    def value(self, *values):
+        with self.lock:
+            return self.children.get(values, 0)
+
+
+class Gauge(Metric):
+    """
+    A value that goes up and down; with a function, the values are
+    read from it when the page is scraped (nothing to update)
+    """
+
+    kind = 'gauge'
+
+    def __init__(self, name, description, labels=(), function=None):
+        """
+        Parameters:
+            function: returns a number, or a dictionary label values -> number
+        """
+        super().__init__(name, description, labels)
+        self.function = function
+
+    def inc(self, *values, amount=1):
+        with self.lock:
+            self.children[values] = self.children.get(values, 0) + amount
+
+    def dec(self, *values, amount=1):
+        self.inc(*values, amount=-amount)
+
+    def set(self, value, *values):
+        with self.lock:
+            self.children[values] = value
+
+    def samples(self):
+        if self.function is None:
+            return super().samples()
+        result = self.function()
+        if not isinstance(result, dict):
+            result = {(): result}
+        return [('', values, '', value) for values, value in result.items() if value is not None]
+
+
+class Histogram(Metric):
+    """
+    Counts of observations per bucket, plus their sum and count
+    """
+
+    kind = 'histogram'
+
+    def __init__(self, name, description, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, description, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            child = self.children.get(values)
+            if child is None:
+                # Counts per bucket (the last one is +Inf), sum, count
+                child = self.children[values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            child[0][index] += 1
+            child[1] += value
+            child[2] += 1
+
+    def samples(self):
+        with self.lock:
+            children = [(values, list(counts), total, count)
+                        for values, (counts, total, count) in self.children.items()]
+
+        samples = []
+        for values, counts, total, count in children:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                samples.append(('_bucket', values, f'le="{format_value(bound)}"', cumulative))
+            samples.append(('_sum', values, '', total))
+            samples.append(('_count', values, '', count))
+        return samples
+
+
+class MetricsRegistry:
+    """
+    All metrics of one process, rendered together
+    """
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, description, labels=()):
+        return self.register(Counter(name, description, labels))
+
+    def gauge(self, name, description, labels=(), function=None):
+        return self.register(Gauge(name, description, labels, function))
+
+    def histogram(self, name, description, labels=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, description, labels, buckets))
+
+    def render(self):
+        """
+        Returns:
+            the Prometheus text format (version 0.0.4) of all metrics
+        """
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+# ============================================================
+# Request Timing
+# ============================================================
+
+class RequestTimer:
+    """
+    Phases of one request: each mark adds the time since the last
+    mark to a phase ('receive', 'upstream', 'save', 'serialize', 'send')
+    and records a span (phase, start, duration) for the request's trace
+    """
+
+    __slots__ = ('route', 'started', 'last', 'phases', 'spans', 'trace_id')
+
+    def __init__(self, route):
+        self.route = route
+        self.started = self.last = time.perf_counter()
+        self.phases = {}
+        self.spans = []
+        self.trace_id = f"{random.getrandbits(64):016x}"
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.phases[phase] = self.phases.get(phase, 0.0) + now - self.last
+        self.spans.append((phase, self.last, now))
+        self.last = now
+
+    def elapsed(self):
+        return self.last - self.started
+
+    def trace(self):
+        """
+        Returns:
+            dictionary with the trace ID, the route, the total time and
+            the spans [phase, ms since the request started, ms]
+        """
+        return {
+            'trace_id': self.trace_id,
+            'route': self.route,
+            'total_ms': round(1000 * self.elapsed(), 3),
+            'spans': [[phase, round(1000 * (start - self.started), 3), round(1000 * (end - start), 3)]
+                      for phase, start, end in self.spans],
+        }
+
+
+class ServerMetrics(MetricsRegistry):
+    """
+    The metrics of NewsServer (one set per process)
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.requests = self.counter(
+            'news_requests_total', "Requests handled, by route", ('route',))
+        self.request_seconds = self.histogram(
+            'news_request_seconds', "Time from the request to the end of its response", ('route',))
+        self.phase_seconds = self.histogram(
+            'news_request_phase_seconds', "Time of each phase of a request", ('route', 'phase'))
+        self.in_flight = self.gauge(
+            'news_requests_in_flight', "Requests being handled now", ('route',))
+        self.upstream_responses = self.counter(
+            'news_upstream_responses_total', "NewsAPI calls by HTTP status ('error' = no response, "
+            "'busy' = refused by the pool)", ('code',))
+        self.cache_lookups = self.counter(
+            'news_cache_lookups_total', "Query cache lookups", ('cache', 'result'))
+        self.not_modified = self.counter(
+            'news_not_modified_total', "Lists answered 'not_modified' (client etag matched)")
+        self.gauge('news_cache_hit_ratio', "Hits / lookups of each cache", ('cache',),
+                   self.cache_hit_ratios)
+        self.shared_caches = []  # SharedQueryCache objects counting their own hits
+
+    def start(self, route):
+        """A request started: returns its RequestTimer"""
+        self.in_flight.inc(route)
+        return RequestTimer(route)
+
+    def finish(self, timer):
+        """The request's response was sent"""
+        self.in_flight.dec(timer.route)
+        self.requests.inc(timer.route)
+        self.request_seconds.observe(timer.elapsed(), timer.route)
+        for phase, seconds in timer.phases.items():
+            self.phase_seconds.observe(seconds, timer.route, phase)
+
+    def cache_hit_ratios(self):
+        ratios = {}
+        hits = self.cache_lookups.value('query', 'hit')
+        misses = self.cache_lookups.value('query', 'miss')
+        if hits + misses:
+            ratios[('query',)] = round(hits / (hits + misses), 4)
+        for shared in self.shared_caches:
+            if shared.hits + shared.misses:
+                ratios[('shared',)] = round(shared.hits / (shared.hits + shared.misses), 4)
+        return ratios
@@ -5,44 +5,159 @@
 
 import requests  # مكتبة لعمل HTTP requests
 import json      # مكتبة للتعامل مع JSON
+import copy      # لنسخة الـ handler بتاعة كل عميل
+import math
+from concurrent.futures import ThreadPoolExecutor  # لتنفيذ أكتر من طلب في نفس الوقت
+from datetime import datetime
+from urllib.parse import urlencode
 from config import NEWS_API_KEY, NEWS_API_BASE_URL  # جلب الإعدادات
+from config import BATCH_CONCURRENCY, MAX_BATCH_SIZE
+from config import DEEP_PAGE_SIZE, MAX_DEEP_PAGES
+
+# الـ filters المسموحة لكل endpoint في الـ batch
+BATCH_FILTERS = {
+    'headlines': ('q', 'category', 'country'),
+    'sources': ('category', 'country', 'language'),
+}
+
+
+def make_query_key(endpoint, params):
+    """
+    بيعمل key ثابت للاستعلام عشان نستخدمه في الـ cache
+    مثال: headlines?country=ae&pageSize=15
+
+    الـ params بتترتب عشان نفس الاستعلام يدي نفس الـ key
+    """
+    return f"{endpoint}?{urlencode(sorted(params.items()))}"
+
+
+def published_epoch(article):
+    """
+    بيحول publishedAt لرقم (epoch seconds) عشان الترتيب
+    بنحسبه مرة واحدة لكل خبر بدل ما نعمل parse في كل مقارنة
+
+    Returns:
+        الوقت بالثواني، أو 0 لو التاريخ مش موجود أو غلط
+    """
+    published_at = article.get('publishedAt')
+    if not published_at:
+        return 0.0
+    try:
+        return datetime.fromisoformat(published_at.replace('Z', '+00:00')).timestamp()
+    except ValueError:
+        return 0.0
+
+
+def duplicate_key(article):
+    """
+    المفتاح اللي بنعرف بيه إن الخبر اتكرر في أكتر من استعلام
+    الـ url لو موجود، وإلا (العنوان، اسم المصدر)
+
+    Returns:
+        المفتاح، أو None لو مفيش حاجة نقارن بيها (الخبر بيفضل)
+    """
+    url = article.get('url')
+    if url:
+        return url
+    title = article.get('title')
+    if not title:
+        return None
+    return (title, (article.get('source') or {}).get('name'))
 
 class NewsHandler:
     """
     كلاس بيتعامل مع NewsAPI ويجيب الأخبار والمصادر
     """
     
-    def __init__(self):
+    def __init__(self, cache=None, rate_limiter=None, pool=None, metrics=None):
         """
         Constructor - بيتنفذ لما نعمل object من الكلاس
         بيحفظ الـ API key والـ base URL
+
+        Parameters:
+            cache: QueryCache (اختياري) - لو موجود، الاستعلامات المتكررة
+                   بترجع من الـ cache من غير ما نكلم الـ API تاني
+            rate_limiter: RateLimiter (اختياري) - بيحدد عدد الطلبات في الثانية
+            pool: UpstreamPool (اختياري) - لو موجود، كل طلبات الـ API
+                  بتتنفذ فيه بعدد محدود، ولو مليان بنرجع "busy"
+            metrics: ServerMetrics (اختياري) - بنعد فيه الـ cache hits
+                     والـ status codes بتاعة الـ API
         """
         self.api_key = NEWS_API_KEY
         self.base_url = NEWS_API_BASE_URL
+        self.cache = cache
+        self.rate_limiter = rate_limiter
+        self.pool = pool
+        self.metrics = metrics
+        self.client_id = None  # العميل اللي الطلبات بتتحسب عليه في الـ pool
     
-    def get_headlines(self, **params):
+    def for_client(self, client_id):
         """
-        دالة عامة لجلب الأخبار الرئيسية (headlines)
+        نسخة من الـ handler لعميل معين (نفس الـ cache والـ pool)
+        عشان الـ pool يوزع الطلبات بالعدل بين العملاء
         
         Parameters:
-            **params: أي parameters نعوز نبعتها للـ API
-                     مثلاً: country='us', category='sports'
-        
+            client_id: اسم العميل
+        """
+        handler = copy.copy(self)
+        handler.client_id = client_id
+        return handler
+    
+    def fetch(self, url, key, params, fresh=False):
+        """
+        بتبعت الـ GET request للـ API، أو بترجع النتيجة من الـ cache لو موجودة
+
+        Parameters:
+            url: الـ URL الكامل
+            key: الـ key بتاع الاستعلام في الـ cache (None = من غير cache)
+            params: الـ parameters (من غير الـ API key)
+            fresh: لو True منقراش من الـ cache (بس بنخزن النتيجة الجديدة فيه)
+
         Returns:
-            dictionary فيه البيانات من الـ API
+            dictionary فيه البيانات، أو رسالة خطأ
         """
-        # بناء الـ URL الكامل
-        url = f"{self.base_url}/top-headlines"
+        use_cache = self.cache is not None and key is not None
+        if use_cache and not fresh:
+            data = self.cache.get(key)
+            self.count_lookup(data is not None)
+            if data is not None:
+                return data  # موجودة في الـ cache
         
-        # إضافة الـ API key للـ parameters
-        params['apiKey'] = self.api_key
+        if self.pool is None:
+            data = self.request(url, params)
+        else:
+            # الطلب بيستنى دوره في الـ pool، ولو الطابور مليان بنرد على طول
+            future = self.pool.submit(self.request, url, params, client=self.client_id)
+            if future is None:
+                if self.metrics is not None:
+                    self.metrics.upstream_responses.inc('busy')
+                retry_after = self.pool.retry_after()
+                return {"status": "busy", "retry_after": retry_after,
+                        "message": f"Server busy, please retry after {retry_after}s"}
+            data = future.result()
         
-        # تحديد عدد النتائج بحد أقصى 15 (حسب المطلوب في المشروع)
-        params['pageSize'] = 15
+        # بنخزن النتايج الصحيحة بس
+        if use_cache and data.get('status') == 'ok':
+            self.cache.put(key, data)
+        return data
+    
+    def request(self, url, params):
+        """
+        الطلب نفسه للـ API (بيتنفذ في الـ pool لو موجود)
         
+        Returns:
+            dictionary فيه البيانات، أو رسالة خطأ
+        """
+        # نستنى دورنا لو في rate limit
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+        
+        response = None
         try:
             # إرسال GET request للـ API
-            response = requests.get(url, params=params)
+            response = requests.get(url, params=dict(params, apiKey=self.api_key))
+            if self.metrics is not None:
+                self.metrics.upstream_responses.inc(str(response.status_code))
             
             # التأكد إن الـ response نجح (status code 200)
             response.raise_for_status()
@@ -51,9 +166,91 @@ class NewsHandler:
             return response.json()
             
         except Exception as e:
+            # ما وصلناش رد خالص (connection error أو timeout)
+            if self.metrics is not None and response is None:
+                self.metrics.upstream_responses.inc('error')
             # لو حصل error، نرجع رسالة خطأ
             return {"status": "error", "message": str(e)}
     
+    def count_lookup(self, hit):
+        """بنعد الـ hit أو الـ miss في الـ metrics (لو موجودة)"""
+        if self.metrics is not None:
+            self.metrics.cache_lookups.inc('query', 'hit' if hit else 'miss')
+    
+    def get_headlines(self, deep=False, fresh=False, **params):
+        """
+        دالة عامة لجلب الأخبار الرئيسية (headlines)
+        
+        Parameters:
+            deep: لو True بنجيب كل الصفحات (get_all_pages) بدل أول 15 بس
+            fresh: نجيب من الـ API حتى لو النتيجة في الـ cache (للـ subscriptions)
+            **params: أي parameters نعوز نبعتها للـ API
+                     مثلاً: country='us', category='sports'
+        
+        Returns:
+            dictionary فيه البيانات من الـ API
+        """
+        if deep:
+            return self.get_all_pages(**params)
+        
+        # بناء الـ URL الكامل
+        url = f"{self.base_url}/top-headlines"
+        
+        # تحديد عدد النتائج بحد أقصى 15 (حسب المطلوب في المشروع)
+        params['pageSize'] = 15
+        
+        return self.fetch(url, make_query_key('headlines', params), params, fresh)
+    
+    def get_all_pages(self, **params):
+        """
+        Deep fetch - جلب كل صفحات الاستعلام مش أول 15 بس
+        
+        الخطوات:
+        1. نجيب الصفحة الأولى ونعرف totalResults
+        2. نحسب عدد الصفحات (بحد أقصى MAX_DEEP_PAGES)
+        3. نجيب باقي الصفحات مع بعض (والـ rate limiter بيتحكم في السرعة)
+        4. نخزن كل الصفحات في الـ cache كنتيجة واحدة
+        
+        Returns:
+            dictionary بنفس شكل رد الـ API وفيه كل الأخبار
+        """
+        url = f"{self.base_url}/top-headlines"
+        key = make_query_key('headlines-deep', params)
+        
+        if self.cache is not None:
+            data = self.cache.get(key)
+            self.count_lookup(data is not None)
+            if data is not None:
+                return data
+        
+        # الصفحات نفسها مش بتتخزن لوحدها (key = None)
+        first = self.fetch(url, None, dict(params, pageSize=DEEP_PAGE_SIZE, page=1))
+        if first.get('status') != 'ok':
+            return first
+        
+        total = first.get('totalResults', 0)
+        pages = min(MAX_DEEP_PAGES, math.ceil(total / DEEP_PAGE_SIZE))
+        articles = list(first.get('articles') or [])
+        complete = True
+        
+        if pages > 1:
+            def fetch_page(page):
+                return self.fetch(url, None, dict(params, pageSize=DEEP_PAGE_SIZE, page=page))
+            
+            with ThreadPoolExecutor(max_workers=pages - 1) as executor:
+                for data in executor.map(fetch_page, range(2, pages + 1)):
+                    if data.get('status') != 'ok':
+                        complete = False  # صفحة فشلت، نرجع اللي وصل بس
+                        continue
+                    articles.extend(data.get('articles') or [])
+        
+        data = {"status": "ok", "totalResults": total, "articles": articles}
+        
+        # النتيجة الناقصة مش بتتخزن عشان نجرب تاني المرة الجاية
+        if complete and self.cache is not None:
+            self.cache.put(key, data)
+        return data
+    
     def get_sources(self, **params):
         """
         دالة عامة لجلب مصادر الأخبار (sources)
@@ -65,20 +262,60 @@ class NewsHandler:
             dictionary فيه بيانات المصادر
         """
         url = f"{self.base_url}/top-headlines/sources"
-        params['apiKey'] = self.api_key
+        return self.fetch(url, make_query_key('sources', params), params)
+    
+    # ============================================================
+    # Batch - تنفيذ أكتر من استعلام في طلب واحد
+    # ============================================================
+    
+    def query(self, endpoint, filters):
+        """
+        تنفيذ استعلام واحد من الـ batch
         
-        try:
-            response = requests.get(url, params=params)
-            response.raise_for_status()
-            return response.json()
-        except Exception as e:
-            return {"status": "error", "message": str(e)}
+        Parameters:
+            endpoint: 'headlines' أو 'sources'
+            filters: dictionary زي {'country': 'ae'}
+        
+        Returns:
+            dictionary فيه البيانات، أو رسالة خطأ
+        """
+        allowed = BATCH_FILTERS.get(endpoint)
+        if allowed is None:
+            return {"status": "error", "message": f"Unknown endpoint: {endpoint}"}
+        
+        unknown = [name for name in filters if name not in allowed]
+        if unknown:
+            return {"status": "error", "message": f"Unknown filter: {', '.join(unknown)}"}
+        
+        if endpoint == 'headlines':
+            return self.get_headlines(**filters)
+        return self.get_sources(**filters)
+    
+    def run_batch(self, queries, concurrency=BATCH_CONCURRENCY):
+        """
+        تنفيذ كذا استعلام في نفس الوقت
+        كل استعلام بيروح للـ cache أو للـ API، وبحد أقصى concurrency
+        استعلامات شغالين مع بعض
+        
+        Parameters:
+            queries: list من (endpoint, filters)
+            concurrency: أقصى عدد استعلامات شغالين في نفس الوقت
+        
+        Returns:
+            list بالنتايج بنفس ترتيب الاستعلامات
+        """
+        if not queries:
+            return []
+        
+        workers = max(1, min(concurrency, len(queries)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(lambda q: self.query(*q), queries))
     
     # ============================================================
     # دوال البحث في الأخبار - Headlines Search Functions
     # ============================================================
     
-    def search_headlines_by_keyword(self, keyword, country=None):
+    def search_headlines_by_keyword(self, keyword, country=None, deep=False):
         """
         البحث في الأخبار باستخدام كلمة مفتاحية
         مثال: البحث عن "football"
@@ -86,13 +323,14 @@ class NewsHandler:
         Parameters:
             keyword: الكلمة اللي هنبحث عنها
             country: البلد (اختياري)
+            deep: جلب كل الصفحات (اختياري)
         """
         params = {'q': keyword}  # q = query (استعلام)
         if country:
             params['country'] = country
-        return self.get_headlines(**params)
+        return self.get_headlines(deep=deep, **params)
     
-    def get_headlines_by_category(self, category, country='us'):
+    def get_headlines_by_category(self, category, country='us', deep=False):
         """
         جلب الأخبار حسب الفئة
         مثال: أخبار رياضية (sports)
@@ -100,30 +338,95 @@ class NewsHandler:
         Parameters:
             category: الفئة (business, sports, technology, etc.)
             country: البلد (default: us)
+            deep: جلب كل الصفحات (اختياري)
         """
         params = {'category': category, 'country': country}
-        return self.get_headlines(**params)
+        return self.get_headlines(deep=deep, **params)
     
-    def get_headlines_by_country(self, country):
+    def get_headlines_by_country(self, country, deep=False):
         """
         جلب الأخبار حسب البلد
         مثال: أخبار من السعودية (sa)
         
         Parameters:
             country: كود البلد (sa, us, ae, etc.)
+            deep: جلب كل الصفحات (اختياري)
         """
         params = {'country': country}
-        return self.get_headlines(**params)
+        return self.get_headlines(deep=deep, **params)
     
-    def get_all_headlines(self, country='us'):
+    def get_all_headlines(self, country='us', deep=False):
         """
         جلب كل الأخبار الرئيسية بدون تصفية
         
         Parameters:
             country: البلد (default: us)
+            deep: جلب كل الصفحات (اختياري)
         """
         params = {'country': country}
-        return self.get_headlines(**params)
+        return self.get_headlines(deep=deep, **params)
+    
+    def get_aggregated_headlines(self, countries=None, categories=None):
+        """
+        جلب الأخبار من كذا بلد و/أو كذا فئة في نفس الوقت ودمجها
+        
+        - لو في بلاد وفئات: بنجيب كل فئة في كل بلد
+        - لو في فئات بس: بنجيبهم من الـ us (زي get_headlines_by_category)
+        - كل الاستعلامات بتشتغل مع بعض، فالوقت = وقت أبطأ استعلام
+        - الأخبار المكررة (نفس الـ url) بتتشال
+        - الترتيب من الأحدث للأقدم حسب publishedAt
+        
+        Parameters:
+            countries: list أكواد البلاد (مثلاً ['ae', 'sa'])
+            categories: list الفئات (مثلاً ['sports'])
+        
+        Returns:
+            dictionary بنفس شكل رد الـ API
+        """
+        countries = list(countries or [])
+        categories = list(categories or [])
+        
+        if countries and categories:
+            queries = [{'country': c, 'category': cat} for c in countries for cat in categories]
+        elif categories:
+            queries = [{'country': 'us', 'category': cat} for cat in categories]
+        else:
+            queries = [{'country': c} for c in countries]
+        
+        if not queries:
+            return {"status": "error", "message": "No countries or categories given"}
+        if len(queries) > MAX_BATCH_SIZE:
+            return {"status": "error", "message": f"Too many queries ({len(queries)} > {MAX_BATCH_SIZE})"}
+        
+        # كل الاستعلامات مع بعض
+        results = self.run_batch([('headlines', q) for q in queries], concurrency=len(queries))
+        
+        seen = set()   # الـ url، أو (العنوان، المصدر) لو مفيش url
+        keyed = []     # (epoch, ترتيب الوصول, الخبر)
+        failed = []
+        for filters, data in zip(queries, results):
+            if data.get('status') != 'ok':
+                failed.append({"filter": filters, "message": data.get('message', 'Unknown error')})
+                continue
+            for article in data.get('articles') or []:
+                key = duplicate_key(article)
+                if key is not None:
+                    if key in seen:
+                        continue  # خبر مكرر
+                    seen.add(key)
+                keyed.append((published_epoch(article), len(keyed), article))
+        
+        if failed and not keyed:
+            return {"status": "error", "message": failed[0]['message'], "failed": failed}
+        
+        # الترتيب على الـ key المحسوب مرة واحدة (الأحدث الأول)
+        keyed.sort(key=lambda entry: (-entry[0], entry[1]))
+        articles = [article for _, _, article in keyed]
+        
+        data = {"status": "ok", "totalResults": len(articles), "articles": articles}
+        if failed:
+            data["failed"] = failed
+        return data
     
     # ============================================================
     # دوال البحث في المصادر - Sources Search Functions
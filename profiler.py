@@ -0,0 +1,261 @@
+# ============================================================
+# Profiler Class - On-Demand Profiling of a Running Server
+# ============================================================
+# Started from the admin port (admin.py), without a restart:
+#
+#   curl 'http://127.0.0.1:9100/profile?seconds=10'                  # sampling
+#   curl 'http://127.0.0.1:9100/profile?seconds=10&mode=cprofile'    # cProfile
+#   curl 'http://127.0.0.1:9100/profile?seconds=30&memory=1'         # + tracemalloc
+#
+# sample:   a background thread reads the stack of every thread every
+#           few milliseconds (sys._current_frames). The output is one
+#           collapsed stack per line, "thread;file:function;... count",
+#           ready for flamegraph.pl or speedscope. Costs nothing when
+#           it is not running, and little when it is.
+# cprofile: before Python 3.12, cProfile only sees the thread that
+#           enabled it, so the client threads (and the upstream workers)
+#           enable their own profiler at the start of each request while
+#           a profile is running (enter / leave). From 3.12 cProfile uses
+#           sys.monitoring: one profiler sees every thread and a second
+#           one cannot be enabled, so the admin thread runs a single one.
+#           The output is the pstats table.
+# memory:   tracemalloc snapshots at the start and the end; the output
+#           lists the lines whose allocations grew the most.
+#
+# Only one profile runs at a time.
+
+import cProfile   # Deterministic profiler
+import io         # pstats prints to a stream
+import os         # Short file names in the stacks
+import pstats     # Combining the per-thread profiles
+import re         # Thread names without their numbers
+import sys        # Stacks of all threads
+import threading  # The sampler thread
+import time       # Sampling interval
+import tracemalloc  # Memory growth
+from collections import Counter
+
+PROFILE_MODES = ('sample', 'cprofile')
+
+# Python < 3.12: a cProfile.Profile only sees its own thread
+PER_THREAD_PROFILES = sys.version_info < (3, 12)
+
+
+class ProfilerBusy(Exception):
+    """A profile is already running"""
+
+
+class Profiler:
+    """
+    Runs one profile at a time for the whole process
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.running = False
+        self.session = None     # ProfileSession while a cProfile runs
+        self.local = threading.local()
+
+    def run(self, seconds, mode='sample', memory=False, interval=0.005):
+        """
+        Profile the process for some seconds (blocks the calling thread)
+
+        Parameters:
+            seconds: how long to profile
+            mode: 'sample' or 'cprofile'
+            memory: also compare tracemalloc snapshots
+            interval: seconds between samples ('sample' mode)
+
+        Returns:
+            the report as text
+
+        Raises:
+            ProfilerBusy: another profile is running
+        """
+        with self.lock:
+            if self.running:
+                raise ProfilerBusy("a profile is already running")
+            self.running = True
+
+        try:
+            started_tracing = False
+            if memory:
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start(10)
+                    started_tracing = True
+                before = tracemalloc.take_snapshot()
+
+            if mode == 'cprofile':
+                report = self.run_cprofile(seconds)
+            else:
+                report = self.run_sampler(seconds, interval)
+
+            if memory:
+                after = tracemalloc.take_snapshot()
+                if started_tracing:
+                    tracemalloc.stop()
+                report += "\n" + memory_report(before, after)
+            return report
+        finally:
+            self.running = False
+
+    # ============================================================
+    # Sampling Mode
+    # ============================================================
+
+    def run_sampler(self, seconds, interval):
+        me = threading.get_ident()
+        stacks = Counter()
+        samples = 0
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            names = {thread.ident: thread_label(thread.name) for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stacks[collapse(names.get(ident, 'thread'), frame)] += 1
+            samples += 1
+            time.sleep(interval)
+
+        lines = [f"{stack} {count}" for stack, count in stacks.most_common()]
+        header = f"# mode=sample seconds={seconds} samples={samples} interval={interval}"
+        return '\n'.join([header] + lines) + '\n'
+
+    # ============================================================
+    # cProfile Mode
+    # ============================================================
+
+    def run_cprofile(self, seconds, grace=5.0):
+        if not PER_THREAD_PROFILES:
+            return self.run_process_cprofile(seconds)
+
+        session = self.session = ProfileSession()
+        time.sleep(seconds)
+        self.session = None
+        stats = session.collect(grace)
+
+        out = io.StringIO()
+        out.write(f"# mode=cprofile seconds={seconds} requests={session.count}\n")
+        if stats is None:
+            out.write("# no requests were handled\n")
+        else:
+            stats.stream = out
+            stats.sort_stats('cumulative').print_stats(60)
+        return out.getvalue()
+
+    def run_process_cprofile(self, seconds):
+        """Python 3.12+: one profiler for all threads"""
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError as e:  # Another tool is using sys.monitoring
+            return f"# mode=cprofile unavailable: {e}\n"
+        try:
+            time.sleep(seconds)
+        finally:
+            profile.disable()
+
+        out = io.StringIO()
+        out.write(f"# mode=cprofile seconds={seconds} threads=all\n")
+        pstats.Stats(profile, stream=out).sort_stats('cumulative').print_stats(60)
+        return out.getvalue()
+
+    def enter(self):
+        """
+        A thread starts a unit of work (a request, an upstream call):
+        while a cProfile runs, profile it
+        """
+        session = self.session
+        if session is None:
+            return
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            return  # Another profiler is active: the request is not profiled
+        self.local.profile = (session, profile)
+        session.started()
+
+    def leave(self):
+        """The unit of work started with enter() is done"""
+        entry = getattr(self.local, 'profile', None)
+        if entry is None:
+            return
+        session, profile = entry
+        profile.disable()
+        self.local.profile = None
+        session.add(profile)
+
+
+class ProfileSession:
+    """
+    The per-thread profiles of one cProfile run
+    """
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.profiles = []
+        self.active = 0   # Requests still being profiled
+        self.count = 0
+
+    def started(self):
+        with self.condition:
+            self.active += 1
+
+    def add(self, profile):
+        with self.condition:
+            self.active -= 1
+            self.count += 1
+            profile.create_stats()
+            self.profiles.append(profile)
+            self.condition.notify_all()
+
+    def collect(self, grace):
+        """
+        Wait (up to grace seconds) for the requests still running
+
+        Returns:
+            pstats.Stats of all profiles, or None
+        """
+        with self.condition:
+            self.condition.wait_for(lambda: self.active == 0, grace)
+            profiles = list(self.profiles)
+        if not profiles:
+            return None
+        stats = pstats.Stats(profiles[0])
+        for profile in profiles[1:]:
+            stats.add(profile)
+        return stats
+
+
+# ============================================================
+# Helpers
+# ============================================================
+
+def thread_label(name):
+    """Thread names without numbers, so the same kind of threads add up"""
+    return re.sub(r'\d+', 'N', name).replace(';', ':')
+
+
+def collapse(label, frame):
+    """One stack as "thread;outermost;...;innermost" (flamegraph format)"""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    names.append(label)
+    return ';'.join(reversed(names))
+
+
+def memory_report(before, after, limit=30):
+    """Lines whose allocations grew the most between the snapshots"""
+    differences = after.compare_to(before, 'lineno')
+    lines = [f"# memory: top {limit} allocation changes (tracemalloc)"]
+    for difference in differences[:limit]:
+        lines.append(str(difference))
+    return '\n'.join(lines) + '\n'
+
+
+# One profiler per process
+profiler = Profiler()
@@ -0,0 +1,204 @@
+# ============================================================
+# Field Projection - Summary Lists and Item Lookup
+# ============================================================
+# The list screens only show a few fields, so the server sends a
+# small summary of each item plus an item ID. The full item is
+# fetched later with a DETAIL request using that ID.
+# Lists are sent one page at a time with a cursor; the next page is
+# served from the ResultCache with a NEXT request.
+
+import base64
+from config import RESULT_PAGE_SIZE
+
+# Fields shown by the client list screens
+ARTICLE_SUMMARY_FIELDS = ('title', 'author')
+SOURCE_SUMMARY_FIELDS = ('name',)
+
+
+def make_item_id(result_id, index):
+    """Build the item ID sent to the client: <result_id>.<index>"""
+    return f"{result_id}.{index}"
+
+
+def parse_item_id(item_id):
+    """
+    Split an item ID back into (result_id, index)
+
+    Returns:
+        (result_id, index) tuple, or None if the ID is malformed
+    """
+    result_id, _, index = item_id.strip().rpartition('.')
+    if not result_id or not index.isdigit():
+        return None
+    return result_id, int(index)
+
+
+def make_cursor(result_id, offset):
+    """Build the opaque cursor pointing at the next page of a result set"""
+    token = f"{result_id}:{offset}".encode('ascii')
+    return base64.urlsafe_b64encode(token).decode('ascii').rstrip('=')
+
+
+def parse_cursor(cursor):
+    """
+    Decode a cursor back into (result_id, offset)
+
+    Returns:
+        (result_id, offset) tuple, or None if the cursor is malformed
+    """
+    try:
+        cursor = cursor.strip()
+        token = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('ascii')
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+    result_id, _, offset = token.partition(':')
+    if not result_id or not offset.isdigit():
+        return None
+    return result_id, int(offset)
+
+
+def summarize_article(article, item_id):
+    """Return only the fields needed by the headlines list"""
+    summary = {field: article.get(field) for field in ARTICLE_SUMMARY_FIELDS}
+    summary['source'] = {'name': (article.get('source') or {}).get('name')}
+    summary['item_id'] = item_id
+    return summary
+
+
+def summarize_source(source, item_id):
+    """Return only the fields needed by the sources list"""
+    summary = {field: source.get(field) for field in SOURCE_SUMMARY_FIELDS}
+    summary['item_id'] = item_id
+    return summary
+
+
+def response_kind(data):
+    """Return 'articles' or 'sources' depending on the response type"""
+    for kind in ('articles', 'sources'):
+        if kind in data:
+            return kind
+    return None
+
+
+def project_header(data, result_id, start=0, page_size=RESULT_PAGE_SIZE):
+    """
+    Build the part of the summary response that comes before the items
+
+    Parameters:
+        data: full API response (dictionary)
+        result_id: ID of the stored full response in the ResultCache
+        start: index of the first item of this page
+        page_size: items per page
+
+    Returns:
+        dictionary with status, result ID, total results, the page
+        offset and a cursor if more items follow.
+        Error responses are returned unchanged.
+    """
+    if data.get('status') != 'ok':
+        return data
+
+    header = {'status': 'ok', 'result_id': result_id, 'offset': start}
+    kind = response_kind(data)
+    count = len(data.get(kind) or [])
+    if kind == 'articles':
+        header['totalResults'] = data.get('totalResults', count)
+
+    if start + page_size < count:
+        header['cursor'] = make_cursor(result_id, start + page_size)
+    return header
+
+
+def iter_summaries(data, result_id, start=0, page_size=RESULT_PAGE_SIZE):
+    """
+    Yield the summary of each article/source of one page one by one
+    Used by streaming mode so the full list is never built in memory
+    """
+    if data.get('status') != 'ok':
+        return
+
+    kind = response_kind(data)
+    summarize = summarize_article if kind == 'articles' else summarize_source
+    items = data.get(kind) or []
+    for i in range(start, min(start + page_size, len(items))):
+        yield summarize(items[i], make_item_id(result_id, i))
+
+
+def project_response(data, result_id, start=0, page_size=RESULT_PAGE_SIZE):
+    """
+    Build the summary response sent to the client (one page)
+
+    Parameters:
+        data: full API response (dictionary)
+        result_id: ID of the stored full response in the ResultCache
+        start: index of the first item of this page
+        page_size: items per page
+
+    Returns:
+        dictionary with the same keys as the API response, but each
+        article/source reduced to its summary fields and an item ID.
+        Error responses are returned unchanged.
+    """
+    summary = project_header(data, result_id, start, page_size)
+
+    kind = response_kind(data)
+    if summary.get('status') == 'ok' and kind:
+        summary[kind] = list(iter_summaries(data, result_id, start, page_size))
+
+    return summary
+
+
+def lookup_page(result_cache, cursor):
+    """
+    Find the result set and offset a cursor points at
+
+    Parameters:
+        result_cache: ResultCache holding the full responses
+        cursor: cursor received from the client
+
+    Returns:
+        (data, result_id, offset) for the next page,
+        or an error response dictionary if the cursor is invalid or expired
+    """
+    parsed = parse_cursor(cursor)
+    if parsed is None:
+        return {"status": "error", "message": "Invalid cursor"}
+
+    result_id, offset = parsed
+    data = result_cache.get(result_id)
+    if data is None:
+        return {"status": "error", "message": "Cursor expired, please search again"}
+
+    return data, result_id, offset
+
+
+def lookup_item(result_cache, item_id):
+    """
+    Find the full article/source for an item ID
+
+    Parameters:
+        result_cache: ResultCache holding the full responses
+        item_id: ID received from the client
+
+    Returns:
+        response dictionary ready to be sent to the client:
+        {"status": "ok", "article": {...}} or {"status": "ok", "source": {...}}
+        or an error response if the item is unknown or expired
+    """
+    parsed = parse_item_id(item_id)
+    if parsed is None:
+        return {"status": "error", "message": "Invalid item ID"}
+
+    result_id, index = parsed
+    data = result_cache.get(result_id)
+    if data is None:
+        return {"status": "error", "message": "Item expired, please search again"}
+
+    kind = response_kind(data)
+    items = data.get(kind) or []
+    if index >= len(items):
+        return {"status": "error", "message": "Item not found"}
+
+    # 'articles' -> 'article', 'sources' -> 'source'
+    return {"status": "ok", kind[:-1]: items[index]}
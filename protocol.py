@@ -6,6 +6,9 @@
 
 import socket
 import struct
+import json
+import queue
+import threading
 
 class Protocol:
     """
@@ -93,4 +96,152 @@ class Protocol:
             
         except Exception as e:
             print(f"[PROTOCOL] Reception error: {e}")
-            return None
\ No newline at end of file
+            return None
+
+    # ============================================================
+    # Streaming - إرسال النتائج عنصر عنصر
+    # ============================================================
+    # بدل ما نبعت كل النتائج في رسالة واحدة كبيرة، بنبعت:
+    # 1. header فيه الـ status وعدد النتائج
+    # 2. رسالة لكل article أو source
+    # 3. رسالة end في الآخر
+    # كده الـ client يقدر يعرض أول خبر أول ما يوصل
+
+    @staticmethod
+    def send_stream(sock, header, items):
+        """
+        دالة لإرسال نتيجة على شكل stream
+
+        Parameters:
+            sock: الـ socket اللي هنبعت عليه
+            header: dictionary فيه الـ status والـ result_id
+            items: أي iterable فيه العناصر (ممكن يكون generator)
+
+        Returns:
+            True: لو الإرسال نجح
+            False: لو في مشكلة
+        """
+        frame = dict(header, type='header')
+        if not Protocol.send_message(sock, json.dumps(frame)):
+            return False
+
+        count = 0
+        for item in items:
+            frame = {'type': 'item', 'item': item}
+            if not Protocol.send_message(sock, json.dumps(frame)):
+                return False
+            count += 1
+
+        return Protocol.send_message(sock, json.dumps({'type': 'end', 'count': count}))
+
+    @staticmethod
+    def receive_stream(sock, receive=None):
+        """
+        Generator لاستقبال stream
+
+        أول حاجة بيرجعها هي الـ header، وبعدين كل عنصر لوحده
+        لحد ما توصل رسالة الـ end
+
+        Parameters:
+            sock: الـ socket اللي هنستقبل منه
+            receive: دالة بتجيب الرسالة الجاية (اختياري)، مثلاً
+                     FrameReader.receive بدل القراية من الـ socket على طول
+
+        Raises:
+            ConnectionError: لو الاتصال قفل في نص الـ stream
+        """
+        while True:
+            message = receive() if receive else Protocol.receive_message(sock)
+            if message is None:
+                raise ConnectionError("Connection closed during stream")
+
+            frame = json.loads(message)
+            frame_type = frame.pop('type', None)
+
+            if frame_type == 'header':
+                yield frame
+            elif frame_type == 'item':
+                yield frame['item']
+            elif frame_type == 'end':
+                return
+
+
+# ============================================================
+# FrameReader - قراية الرسايل في الخلفية
+# ============================================================
+# السيرفر بيبعت PING لو العميل ساكت فترة، ولازم يوصله PONG وإلا
+# بيقفل الـ session. العميل بيبقى مستني input() من المستخدم ومش
+# بيقرا من الـ socket، فالـ thread ده بيقرا كل الرسايل طول الوقت:
+# بيرد على PING لوحده، والـ push (تحديثات الـ subscriptions) بيبعتها
+# لدالة العرض على طول، وكمان الـ trace (توقيتات الطلب لو العميل بعت
+# TRACE)، وباقي الرسايل بيحطها في queue بالترتيب
+
+class FrameReader:
+    """
+    Thread بيقرا من الـ socket ويرد على الـ PING أوتوماتيك
+    """
+
+    def __init__(self, sock, send_lock, on_push=None, on_trace=None):
+        """
+        Parameters:
+            sock: الـ socket المتوصل بالسيرفر
+            send_lock: نفس الـ lock اللي العميل بيبعت بيه، عشان الـ PONG
+                       ميدخلش في نص رسالة تانية
+            on_push: دالة بتاخد الـ push (dictionary) وتعرضه (اختياري)
+            on_trace: دالة بتاخد الـ trace (dictionary) بعد كل رد (اختياري)
+        """
+        self.sock = sock
+        self.send_lock = send_lock
+        self.on_push = on_push
+        self.on_trace = on_trace
+        self.frames = queue.Queue()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while True:
+            message = Protocol.receive_message(self.sock)
+            if message is None:
+                self.frames.put(None)  # الاتصال قفل
+                return
+
+            if message == "PING":
+                with self.send_lock:
+                    Protocol.send_message(self.sock, "PONG")
+                continue
+
+            # بنبص على الـ "type" بعد ما نفك الـ JSON، مش على أول الرسالة،
+            # عشان ترتيب المفاتيح والمسافات ممكن يختلفوا
+            frame = None
+            if message.startswith('{'):
+                try:
+                    frame = json.loads(message)
+                except ValueError:
+                    pass  # مش JSON، تتقري زي أي رسالة
+            kind = frame.get('type') if isinstance(frame, dict) else None
+
+            # الـ push مش رد على طلب، فمبيدخلش الـ queue
+            if kind == 'push':
+                if self.on_push is not None:
+                    self.on_push(frame)
+                continue
+
+            # الـ trace بييجي بعد الرد، فمينفعش يتقري كأنه رد الطلب الجاي
+            if kind == 'trace':
+                if self.on_trace is not None:
+                    self.on_trace(frame)
+                continue
+
+            self.frames.put(message)
+
+    def receive(self):
+        """
+        الرسالة الجاية من السيرفر (بتستنى لحد ما توصل)
+
+        Returns:
+            الرسالة، أو None لو الاتصال قفل
+        """
+        message = self.frames.get()
+        if message is None:
+            self.frames.put(None)  # أي receive بعد كده كمان يرجع None
+        return message
@@ -0,0 +1,547 @@
+# ============================================================
+# Proxy Script - Consistent-hash Front Proxy
+# ============================================================
+# Sits in front of several NewsServer backends and speaks the same
+# length-prefixed protocol. The proxy follows the menu flow itself;
+# when a query is complete (menu, option, parameter) it sends it to
+# one backend chosen by consistent hashing on the canonical query.
+# Every backend therefore caches its own slice of the queries, and
+# the cache hit rate grows with the number of backends.
+#
+# Usage:
+#   python server_oop.py --port 5001
+#   python server_oop.py --port 5002
+#   python proxy.py --backend 127.0.0.1:5001 --backend 127.0.0.1:5002
+#   (clients connect to the proxy port, 5100 by default)
+
+import argparse   # For command line options
+import bisect     # For searching the hash ring
+import hashlib    # For stable hash positions
+import json       # For reading result IDs from responses
+import socket     # For network communication
+import threading  # One thread per client + health checker
+import time       # For health check timing
+from protocol import Protocol
+from projection import parse_item_id, parse_cursor
+from config import (PROXY_PORT, PROXY_VIRTUAL_NODES, HEALTH_CHECK_INTERVAL,
+                    HEALTH_CHECK_FAILURES, BACKEND_TIMEOUT)
+
+# Menu options that need a parameter, and their canonical filter names
+HEADLINE_FILTERS = {'1': 'q', '2': 'category', '3': 'country', '4': None, '6': 'combined'}
+SOURCE_FILTERS = {'1': 'category', '2': 'country', '3': 'language', '4': None}
+
+
+def ring_position(value):
+    """Position of a value on the hash ring (same on every run)"""
+    return int.from_bytes(hashlib.md5(value.encode('utf-8')).digest()[:8], 'big')
+
+
+# ============================================================
+# HashRing Class - Consistent Hashing
+# ============================================================
+
+class HashRing:
+    """
+    Consistent hash ring with virtual nodes
+    Adding or removing a backend only moves the keys of that backend
+    """
+
+    def __init__(self, virtual_nodes=PROXY_VIRTUAL_NODES):
+        self.virtual_nodes = virtual_nodes
+        self.positions = []  # sorted ring positions
+        self.owners = {}     # position -> node name
+        self.lock = threading.Lock()
+
+    def add(self, node):
+        with self.lock:
+            for i in range(self.virtual_nodes):
+                position = ring_position(f"{node}#{i}")
+                if position not in self.owners:
+                    bisect.insort(self.positions, position)
+                    self.owners[position] = node
+
+    def remove(self, node):
+        with self.lock:
+            self.positions = [p for p in self.positions if self.owners[p] != node]
+            self.owners = {p: n for p, n in self.owners.items() if n != node}
+
+    def nodes(self):
+        with self.lock:
+            return set(self.owners.values())
+
+    def get(self, key):
+        """
+        Node that owns a key
+
+        Returns:
+            node name, or None if the ring is empty
+        """
+        with self.lock:
+            if not self.positions:
+                return None
+            index = bisect.bisect(self.positions, ring_position(key)) % len(self.positions)
+            return self.owners[self.positions[index]]
+
+
+# ============================================================
+# BackendSession Class - One Client's Connection to a Backend
+# ============================================================
+
+class BackendSession:
+    """
+    Connection to one backend on behalf of one client
+    Always waits at the backend's main menu between requests
+    """
+
+    def __init__(self, address, client_name, streaming, deep_fetch):
+        self.address = address
+        self.socket = socket.create_connection(address, timeout=BACKEND_TIMEOUT)
+
+        Protocol.send_message(self.socket, client_name)
+        reply = Protocol.receive_message(self.socket)
+        if not reply or not reply.startswith("CONNECTED"):
+            self.close()
+            raise ConnectionError(f"Backend {address} refused the client")
+
+        if streaming:
+            self.command("STREAM")
+        if deep_fetch:
+            self.command("DEEP")
+
+    def receive(self):
+        """
+        Next frame from the backend. PINGs the backend sent while this
+        session sat idle are answered and skipped.
+        """
+        while True:
+            frame = Protocol.receive_message(self.socket)
+            if frame is None:
+                raise ConnectionError("Backend connection lost")
+            if frame != "PING":
+                return frame
+            Protocol.send_message(self.socket, "PONG")
+
+    def command(self, message):
+        """Send one frame and return the reply frame"""
+        if not Protocol.send_message(self.socket, message):
+            raise ConnectionError("Backend connection lost")
+        return self.receive()
+
+    def receive_response(self):
+        """
+        Read one complete response: a single frame, or all frames of a
+        stream (header ... end)
+
+        Returns:
+            list of frames (strings)
+        """
+        first = self.receive()
+
+        frames = [first]
+        if '"type": "header"' in first:
+            while True:
+                frame = self.receive()
+                frames.append(frame)
+                if frame.startswith('{"type": "end"'):
+                    break
+        return frames
+
+    def query(self, menu, option, parameter):
+        """
+        Run one menu query and return to the main menu
+
+        Parameters:
+            menu: '1' (headlines) or '2' (sources)
+            option: submenu option
+            parameter: parameter string, or None
+        """
+        self.command(menu)  # HEADLINES / SOURCES
+        if parameter is None:
+            Protocol.send_message(self.socket, option)
+        else:
+            self.command(option)  # READY
+            Protocol.send_message(self.socket, parameter)
+
+        frames = self.receive_response()
+        Protocol.send_message(self.socket, '5')  # Back to the main menu
+        return frames
+
+    def request(self, command, payload):
+        """Run a main menu request with a READY step (BATCH, DETAIL, NEXT)"""
+        self.command(command)  # READY
+        Protocol.send_message(self.socket, payload)
+        return self.receive_response()
+
+    def close(self):
+        try:
+            Protocol.send_message(self.socket, '3')
+            self.socket.close()
+        except OSError:
+            pass
+
+
+# ============================================================
+# ProxyClientHandler Class - One Client of the Proxy
+# ============================================================
+
+class ProxyClientHandler:
+    """
+    Follows the menu flow with the client and forwards each complete
+    query to the backend that owns it
+    """
+
+    def __init__(self, client_socket, client_address, proxy):
+        self.socket = client_socket
+        self.address = client_address
+        self.proxy = proxy
+        self.client_name = None
+        self.streaming = False
+        self.deep_fetch = False
+        self.sessions = {}        # backend name -> BackendSession
+        self.result_owners = {}   # result_id -> backend name
+
+    def send(self, message):
+        return Protocol.send_message(self.socket, message)
+
+    def receive(self):
+        return Protocol.receive_message(self.socket)
+
+    # ============================================================
+    # Forwarding
+    # ============================================================
+
+    def session_for(self, backend):
+        """Open (or reuse) this client's connection to a backend"""
+        session = self.sessions.get(backend)
+        if session is None:
+            session = BackendSession(self.proxy.backends[backend], self.client_name,
+                                     self.streaming, self.deep_fetch)
+            self.sessions[backend] = session
+        return session
+
+    def drop_session(self, backend):
+        session = self.sessions.pop(backend, None)
+        if session is not None:
+            session.close()
+
+    def remember_results(self, backend, frames):
+        """Note which backend holds each result ID of a response"""
+        try:
+            data = json.loads(frames[0])
+        except ValueError:
+            return
+        if not isinstance(data, dict):
+            return
+        for item in [data] + list(data.get('results') or []):
+            if item.get('result_id'):
+                self.result_owners[item['result_id']] = backend
+
+    def forward(self, key, action, backend=None):
+        """
+        Run an action on the backend that owns the key and relay the
+        response to the client. If that backend fails it is reported
+        to the proxy and the next owner on the ring is tried.
+
+        Parameters:
+            key: canonical query (used when backend is not given)
+            action: function(session) -> list of frames
+            backend: fixed backend (DETAIL/NEXT must go where the result is)
+        """
+        tried = set()
+        while True:
+            target = backend or self.proxy.ring.get(key)
+            if target is None or target in tried:
+                self.send(json.dumps({"status": "error", "message": "No backend available"}))
+                return
+
+            tried.add(target)
+            try:
+                try:
+                    reused = target in self.sessions
+                    frames = action(self.session_for(target))
+                except (OSError, ConnectionError):
+                    if not reused:
+                        raise
+                    # An idle session may have been closed by the backend's
+                    # reaper; try once more on a new connection
+                    self.drop_session(target)
+                    frames = action(self.session_for(target))
+            except (OSError, ConnectionError) as e:
+                print(f"[PROXY] Backend {target} failed: {e}")
+                self.drop_session(target)
+                self.proxy.report_failure(target)
+                if backend is not None:
+                    self.send(json.dumps({"status": "error", "message": "Result no longer available"}))
+                    return
+                continue
+
+            self.remember_results(target, frames)
+            for frame in frames:
+                self.send(frame)
+            return
+
+    def owner_of(self, result_id):
+        backend = self.result_owners.get(result_id)
+        return backend if backend in self.proxy.backends else None
+
+    def handle_result_request(self, command):
+        """
+        DETAIL / NEXT: send it to the backend that produced the result
+        """
+        self.send("READY")
+        payload = self.receive()
+        if not payload:
+            return False
+
+        parsed = parse_item_id(payload) if command == 'DETAIL' else parse_cursor(payload)
+        backend = self.owner_of(parsed[0]) if parsed else None
+        if backend is None:
+            self.send(json.dumps({"status": "error", "message": "Item expired, please search again"}))
+            return True
+
+        self.forward(None, lambda session: session.request(command, payload), backend)
+        return True
+
+    # ============================================================
+    # Menus
+    # ============================================================
+
+    def handle_menu(self, menu, filters, endpoint):
+        """
+        Headlines ('1') or sources ('2') submenu
+
+        Parameters:
+            menu: main menu choice that opened this submenu
+            filters: option -> canonical filter name
+            endpoint: 'headlines' or 'sources'
+        """
+        while True:
+            choice = self.receive()
+            if not choice:
+                return False
+
+            if choice == '5':
+                return True
+
+            if choice in ('DETAIL', 'NEXT'):
+                if not self.handle_result_request(choice):
+                    return False
+                continue
+
+            if choice not in filters:
+                self.send("ERROR")
+                continue
+
+            parameter = None
+            if filters[choice] is not None:
+                self.send("READY")
+                parameter = self.receive()
+                if not parameter:
+                    return False
+
+            key = f"{endpoint}:{filters[choice] or 'all'}={parameter or ''}"
+            self.forward(key, lambda session: session.query(menu, choice, parameter))
+
+    def handle(self):
+        print(f"[PROXY] {self.address} connected")
+        try:
+            self.client_name = self.receive()
+            if not self.client_name:
+                return
+            self.send("CONNECTED")
+
+            while True:
+                choice = self.receive()
+                if not choice:
+                    break
+
+                if choice == '1':
+                    self.send("HEADLINES")
+                    if not self.handle_menu('1', HEADLINE_FILTERS, 'headlines'):
+                        break
+                elif choice == '2':
+                    self.send("SOURCES")
+                    if not self.handle_menu('2', SOURCE_FILTERS, 'sources'):
+                        break
+                elif choice == '3':
+                    self.send("BYE")
+                    break
+                elif choice == 'STREAM':
+                    self.streaming = True
+                    self.send("STREAMING")
+                elif choice == 'DEEP':
+                    self.deep_fetch = True
+                    self.send("DEEP")
+                elif choice == 'BATCH':
+                    self.send("READY")
+                    payload = self.receive()
+                    if not payload:
+                        break
+                    self.forward(f"batch:{payload}",
+                                 lambda session: session.request('BATCH', payload))
+                elif choice in ('DETAIL', 'NEXT'):
+                    if not self.handle_result_request(choice):
+                        break
+                else:
+                    self.send("ERROR")
+
+        except Exception as e:
+            print(f"[PROXY ERROR] {self.client_name}: {e}")
+
+        finally:
+            for backend in list(self.sessions):
+                self.drop_session(backend)
+            self.socket.close()
+
+
+# ============================================================
+# NewsProxy Class - Main Proxy
+# ============================================================
+
+class NewsProxy:
+    """
+    Accepts clients, keeps the hash ring of healthy backends and
+    checks the backends in the background
+    """
+
+    def __init__(self, backends, host='127.0.0.1', port=PROXY_PORT):
+        """
+        Parameters:
+            backends: list of (host, port) of NewsServer backends
+            host, port: address the proxy listens on
+        """
+        self.host = host
+        self.port = port
+        self.backends = {}   # name -> (host, port)
+        self.failures = {}   # name -> failed checks in a row
+        self.ring = HashRing()
+        self.lock = threading.Lock()
+        self.is_running = False
+        for address in backends:
+            self.add_backend(address)
+
+    # ============================================================
+    # Membership
+    # ============================================================
+
+    def add_backend(self, address):
+        """Add a backend; it takes over its share of the keys"""
+        name = f"{address[0]}:{address[1]}"
+        with self.lock:
+            self.backends[name] = tuple(address)
+            self.failures[name] = 0
+        self.ring.add(name)
+        print(f"[PROXY] Backend {name} added")
+
+    def remove_backend(self, name):
+        """Remove a backend for good; its keys move to the others"""
+        self.ring.remove(name)
+        with self.lock:
+            self.backends.pop(name, None)
+            self.failures.pop(name, None)
+        print(f"[PROXY] Backend {name} removed")
+
+    def report_failure(self, name):
+        """A request to this backend failed: eject it until it is healthy again"""
+        with self.lock:
+            if name not in self.failures:
+                return
+            self.failures[name] = HEALTH_CHECK_FAILURES
+        if name in self.ring.nodes():
+            self.ring.remove(name)
+            print(f"[PROXY] Backend {name} ejected")
+
+    # ============================================================
+    # Health Checks
+    # ============================================================
+
+    @staticmethod
+    def check_backend(address):
+        """Handshake with a backend and quit. Returns True if it answered"""
+        try:
+            with socket.create_connection(address, timeout=2) as sock:
+                sock.settimeout(2)
+                Protocol.send_message(sock, "__healthcheck__")
+                reply = Protocol.receive_message(sock)
+                Protocol.send_message(sock, '3')
+                # A "busy" refusal (admission control) still means it is alive
+                return bool(reply)
+        except OSError:
+            return False
+
+    def health_check_loop(self):
+        """
+        Check every backend. Eject a backend after HEALTH_CHECK_FAILURES
+        failed checks and put it back on the ring when it recovers
+        """
+        while self.is_running:
+            with self.lock:
+                backends = dict(self.backends)
+
+            for name, address in backends.items():
+                healthy = self.check_backend(address)
+                in_ring = name in self.ring.nodes()
+
+                with self.lock:
+                    if name not in self.failures:
+                        continue  # Removed meanwhile
+                    self.failures[name] = 0 if healthy else self.failures[name] + 1
+                    failed = self.failures[name] >= HEALTH_CHECK_FAILURES
+
+                if healthy and not in_ring:
+                    self.ring.add(name)
+                    print(f"[PROXY] Backend {name} healthy again, back on the ring")
+                elif failed and in_ring:
+                    self.ring.remove(name)
+                    print(f"[PROXY] Backend {name} ejected after failed health checks")
+
+            time.sleep(HEALTH_CHECK_INTERVAL)
+
+    # ============================================================
+    # Accept Loop
+    # ============================================================
+
+    def start(self):
+        self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server_socket.bind((self.host, self.port))
+        self.server_socket.listen(16)
+        self.is_running = True
+
+        threading.Thread(target=self.health_check_loop, daemon=True).start()
+
+        print("=" * 60)
+        print(f"NEWS PROXY - listening on {self.host}:{self.port}")
+        print(f"Backends: {', '.join(self.backends)}")
+        print("=" * 60)
+
+        try:
+            while self.is_running:
+                client_socket, client_address = self.server_socket.accept()
+                handler = ProxyClientHandler(client_socket, client_address, self)
+                threading.Thread(target=handler.handle, daemon=True).start()
+        except KeyboardInterrupt:
+            print("\n[PROXY] Shutting down...")
+        finally:
+            self.stop()
+
+    def stop(self):
+        self.is_running = False
+        self.server_socket.close()
+        print("[PROXY] Stopped")
+
+
+def parse_address(text):
+    host, _, port = text.rpartition(':')
+    return (host or '127.0.0.1', int(port))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Consistent-hash proxy for NewsServer backends")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=PROXY_PORT)
+    parser.add_argument('--backend', action='append', required=True,
+                        help="backend address host:port (repeat for each backend)")
+    args = parser.parse_args()
+
+    NewsProxy([parse_address(b) for b in args.backend], args.host, args.port).start()
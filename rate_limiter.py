@@ -0,0 +1,68 @@
+# ============================================================
+# RateLimiter Class - Upstream Rate Limit
+# ============================================================
+# Token bucket shared by all threads that call NewsAPI, so
+# concurrent fetches (batch, combined headlines, deep fetch)
+# never send more than the configured requests per second
+
+import threading  # Shared by all client threads
+import time       # For measuring and waiting
+from config import UPSTREAM_RATE_LIMIT, UPSTREAM_BURST
+
+
+class RateLimiter:
+    """
+    Token bucket: up to `burst` requests at once, then `rate` per second
+    """
+
+    def __init__(self, rate=UPSTREAM_RATE_LIMIT, burst=UPSTREAM_BURST):
+        """
+        Constructor
+
+        Parameters:
+            rate: requests allowed per second
+            burst: requests allowed at once before waiting
+        """
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.last_update = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Wait until a request is allowed
+
+        Each caller reserves its slot under the lock and then sleeps
+        outside it, so waiting threads are served in arrival order
+        """
+        with self.lock:
+            now = time.monotonic()
+            elapsed = now - self.last_update
+            self.tokens = min(self.burst, self.tokens + elapsed * self.rate)
+            self.last_update = now
+
+            self.tokens -= 1
+            wait = 0 if self.tokens >= 0 else -self.tokens / self.rate
+
+        if wait > 0:
+            time.sleep(wait)
+
+    def try_acquire(self):
+        """
+        Take a token without waiting
+
+        Returns:
+            0 if the request is allowed now,
+            otherwise the seconds until a token is free
+        """
+        with self.lock:
+            now = time.monotonic()
+            elapsed = now - self.last_update
+            self.tokens = min(self.burst, self.tokens + elapsed * self.rate)
+            self.last_update = now
+
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
@@ -10,6 +10,12 @@ import threading  # To handle multiple clients at the same time
 import json       # For handling JSON
 import struct     # For data packing
 from news_handler import NewsHandler  # News fetching class
+from cache import ResultCache, QueryCache  # Server-side caches
+from rate_limiter import RateLimiter   # Upstream rate limit
+from projection import project_response, project_header, iter_summaries  # Summary lists
+from projection import lookup_item, lookup_page
+from structured_log import log          # JSON lines written in the background
+from config import LOG_SAMPLE_RATE
 
 # ============================================================
 # Settings
@@ -19,7 +25,11 @@ PORT = 5000         # Port number
 GROUP_ID = "GB5"    # Group ID
 
 # Create an object from NewsHandler (used in all functions)
-news_handler = NewsHandler()
+# Identical queries from different clients are answered from its cache
+news_handler = NewsHandler(cache=QueryCache(), rate_limiter=RateLimiter())
+
+# Full responses are kept here so clients can ask for one item's details
+result_cache = ResultCache()
 
 # ============================================================
 # Communication Functions
@@ -52,7 +62,7 @@ def send_message(client_socket, message):
         client_socket.sendall(length + data)
         return True
     except Exception as e:
-        print(f"[PROTOCOL] Send error: {e}")
+        log.error("send_error", error=repr(e))
         return False
 
 def receive_message(client_socket):
@@ -90,20 +100,113 @@ def receive_message(client_socket):
 
         return data.decode('utf-8')
     except Exception as e:
-        print(f"[PROTOCOL] Receive error: {e}")
+        log.error("receive_error", error=repr(e))
         return None
 
+# ============================================================
+# Result Functions
+# ============================================================
+
+def send_stream(client_socket, header, items):
+    """
+    Send a result as a stream: a header frame, one frame per item,
+    then an end frame, so the client can display the first item
+    as soon as it arrives
+
+    Parameters:
+        client_socket: the client's socket
+        header: dictionary with status and result ID
+        items: iterable of items (can be a generator)
+    """
+    if not send_message(client_socket, json.dumps(dict(header, type='header'))):
+        return False
+
+    count = 0
+    for item in items:
+        if not send_message(client_socket, json.dumps({'type': 'item', 'item': item})):
+            return False
+        count += 1
+
+    return send_message(client_socket, json.dumps({'type': 'end', 'count': count}))
+
+def send_results(client_socket, data, stream=False):
+    """
+    Store the full response and send only the summary list
+    The client asks for one item's details later with DETAIL
+
+    Parameters:
+        client_socket: the client's socket
+        data: full API response (dictionary)
+        stream: send one frame per item instead of one big frame
+    """
+    result_id = result_cache.put(data)
+    return send_page(client_socket, data, result_id, 0, stream)
+
+def send_page(client_socket, data, result_id, start, stream=False):
+    """
+    Send one page of summaries starting at index start
+    The response carries a cursor when more items follow
+    """
+    if stream:
+        return send_stream(
+            client_socket,
+            project_header(data, result_id, start),
+            iter_summaries(data, result_id, start)
+        )
+
+    return send_message(client_socket, json.dumps(project_response(data, result_id, start)))
+
+def handle_next_request(client_socket, client_name, stream=False):
+    """
+    NEXT request: send the page a cursor points at
+    Served from the result cache, NewsAPI is not called again
+
+    Returns:
+        False if the connection was closed, True otherwise
+    """
+    send_message(client_socket, "READY")
+    cursor = receive_message(client_socket)
+    if not cursor:
+        return False
+
+    log.info("next_page", client=client_name, sample=LOG_SAMPLE_RATE)
+
+    page = lookup_page(result_cache, cursor)
+    if isinstance(page, dict):
+        send_page(client_socket, page, None, 0, stream)  # Error response
+    else:
+        send_page(client_socket, *page, stream)
+    return True
+
+def handle_detail_request(client_socket, client_name):
+    """
+    DETAIL request: send the full article/source for one item ID
+
+    Returns:
+        False if the connection was closed, True otherwise
+    """
+    send_message(client_socket, "READY")
+    item_id = receive_message(client_socket)
+    if not item_id:
+        return False
+
+    log.info("detail", client=client_name, item_id=item_id, sample=LOG_SAMPLE_RATE)
+
+    send_message(client_socket, json.dumps(lookup_item(result_cache, item_id)))
+    return True
+
 # ============================================================
 # Headlines Menu Handler
 # ============================================================
 
-def handle_headlines_menu(client_socket, client_name):
+def handle_headlines_menu(client_socket, client_name, stream=False):
     """
     Function that handles headlines menu requests
 
     Parameters:
         client_socket: the socket
         client_name: client name
+        stream: send results as a stream of frames
     """
     while True:
         # Receive client choice
@@ -111,7 +214,8 @@ def handle_headlines_menu(client_socket, client_name):
         if not choice:
             break
 
-        print(f"[{client_name}] Headlines request: {choice}")
+        log.debug("menu_choice", client=client_name, menu="headlines", choice=choice,
+                  sample=LOG_SAMPLE_RATE)
 
         # ============================================================
         # Option 1: Search by keyword
@@ -122,7 +226,8 @@ def handle_headlines_menu(client_socket, client_name):
             if not keyword:
                 break
 
-            print(f"[{client_name}] Searching headlines for keyword: {keyword}")
+            log.info("search", client=client_name, menu="headlines", filter="keyword",
+                     value=keyword, sample=LOG_SAMPLE_RATE)
 
             # Fetch data from NewsAPI
             data = news_handler.search_headlines_by_keyword(keyword)
@@ -133,7 +238,7 @@ def handle_headlines_menu(client_socket, client_name):
             news_handler.save_to_json(data, filename)
 
             # Send data to client
-            send_message(client_socket, json.dumps(data))
+            send_results(client_socket, data, stream)
 
         # ============================================================
         # Option 2: Search by category
@@ -144,13 +249,14 @@ def handle_headlines_menu(client_socket, client_name):
             if not category:
                 break
 
-            print(f"[{client_name}] Searching headlines by category: {category}")
+            log.info("search", client=client_name, menu="headlines", filter="category",
+                     value=category, sample=LOG_SAMPLE_RATE)
 
             data = news_handler.get_headlines_by_category(category)
             filename = f"{client_name}_category_{GROUP_ID}.json"
             news_handler.save_to_json(data, filename)
 
-            send_message(client_socket, json.dumps(data))
+            send_results(client_socket, data, stream)
 
         # ============================================================
         # Option 3: Search by country
@@ -161,25 +267,27 @@ def handle_headlines_menu(client_socket, client_name):
             if not country:
                 break
 
-            print(f"[{client_name}] Searching headlines by country: {country}")
+            log.info("search", client=client_name, menu="headlines", filter="country",
+                     value=country, sample=LOG_SAMPLE_RATE)
 
             data = news_handler.get_headlines_by_country(country)
             filename = f"{client_name}_country_{GROUP_ID}.json"
             news_handler.save_to_json(data, filename)
 
-            send_message(client_socket, json.dumps(data))
+            send_results(client_socket, data, stream)
 
         # ============================================================
         # Option 4: All headlines
         # ============================================================
         elif choice == '4':
-            print(f"[{client_name}] Fetching all headlines")
+            log.info("search", client=client_name, menu="headlines", filter="all",
+                     sample=LOG_SAMPLE_RATE)
 
             data = news_handler.get_all_headlines()
             filename = f"{client_name}_all_headlines_{GROUP_ID}.json"
             news_handler.save_to_json(data, filename)
 
-            send_message(client_socket, json.dumps(data))
+            send_results(client_socket, data, stream)
 
         # ============================================================
         # Option 5: Return to main menu
@@ -187,6 +295,16 @@ def handle_headlines_menu(client_socket, client_name):
         elif choice == '5':
             break
 
+        # Details of one item from the last list
+        elif choice == 'DETAIL':
+            if not handle_detail_request(client_socket, client_name):
+                break
+
+        # Next page of the last list
+        elif choice == 'NEXT':
+            if not handle_next_request(client_socket, client_name, stream):
+                break
+
         else:
             send_message(client_socket, "ERROR")
 
@@ -194,20 +312,22 @@ def handle_headlines_menu(client_socket, client_name):
 # Sources Menu Handler
 # ============================================================
 
-def handle_sources_menu(client_socket, client_name):
+def handle_sources_menu(client_socket, client_name, stream=False):
     """
     Function that handles sources menu requests
 
     Parameters:
         client_socket: the socket
         client_name: client name
+        stream: send results as a stream of frames
     """
     while True:
         choice = receive_message(client_socket)
         if not choice:
             break
 
-        print(f"[{client_name}] Sources request: {choice}")
+        log.debug("menu_choice", client=client_name, menu="sources", choice=choice,
+                  sample=LOG_SAMPLE_RATE)
 
         # Option 1: Search by category
         if choice == '1':
@@ -216,13 +336,14 @@ def handle_sources_menu(client_socket, client_name):
             if not category:
                 break
 
-            print(f"[{client_name}] Searching sources by category: {category}")
+            log.info("search", client=client_name, menu="sources", filter="category",
+                     value=category, sample=LOG_SAMPLE_RATE)
 
             data = news_handler.get_sources_by_category(category)
             filename = f"{client_name}_sources_category_{GROUP_ID}.json"
             news_handler.save_to_json(data, filename)
 
-            send_message(client_socket, json.dumps(data))
+            send_results(client_socket, data, stream)
 
         # Option 2: Search by country
         elif choice == '2':
@@ -231,13 +352,14 @@ def handle_sources_menu(client_socket, client_name):
             if not country:
                 break
 
-            print(f"[{client_name}] Searching sources by country: {country}")
+            log.info("search", client=client_name, menu="sources", filter="country",
+                     value=country, sample=LOG_SAMPLE_RATE)
 
             data = news_handler.get_sources_by_country(country)
             filename = f"{client_name}_sources_country_{GROUP_ID}.json"
             news_handler.save_to_json(data, filename)
 
-            send_message(client_socket, json.dumps(data))
+            send_results(client_socket, data, stream)
 
         # Option 3: Search by language
         elif choice == '3':
@@ -246,28 +368,40 @@ def handle_sources_menu(client_socket, client_name):
             if not language:
                 break
 
-            print(f"[{client_name}] Searching sources by language: {language}")
+            log.info("search", client=client_name, menu="sources", filter="language",
+                     value=language, sample=LOG_SAMPLE_RATE)
 
             data = news_handler.get_sources_by_language(language)
             filename = f"{client_name}_sources_language_{GROUP_ID}.json"
             news_handler.save_to_json(data, filename)
 
-            send_message(client_socket, json.dumps(data))
+            send_results(client_socket, data, stream)
 
         # Option 4: All sources
         elif choice == '4':
-            print(f"[{client_name}] Fetching all sources")
+            log.info("search", client=client_name, menu="sources", filter="all",
+                     sample=LOG_SAMPLE_RATE)
 
             data = news_handler.get_all_sources()
             filename = f"{client_name}_all_sources_{GROUP_ID}.json"
             news_handler.save_to_json(data, filename)
 
-            send_message(client_socket, json.dumps(data))
+            send_results(client_socket, data, stream)
 
         # Option 5: Return to main menu
         elif choice == '5':
             break
 
+        # Details of one item from the last list
+        elif choice == 'DETAIL':
+            if not handle_detail_request(client_socket, client_name):
+                break
+
+        # Next page of the last list
+        elif choice == 'NEXT':
+            if not handle_next_request(client_socket, client_name, stream):
+                break
+
         else:
             send_message(client_socket, "ERROR")
 
@@ -284,9 +418,10 @@ def handle_client(client_socket, client_address):
         client_socket: client socket
         client_address: client address (IP + Port)
     """
-    print(f"[NEW CONNECTION] {client_address} connected")
+    log.info("connection", address=client_address)
 
     client_name = None
+    stream = False  # Client asked for streaming responses
 
     try:
         # Step 1: Receive client name
@@ -294,7 +429,7 @@ def handle_client(client_socket, client_address):
         if not client_name:
             return
 
-        print(f"[CLIENT NAME] {client_name} from {client_address}")
+        log.info("session_started", client=client_name, address=client_address)
         send_message(client_socket, "CONNECTED")
 
         # Step 2: Main menu loop
@@ -303,30 +438,35 @@ def handle_client(client_socket, client_address):
             if not choice:
                 break
 
-            print(f"[{client_name}] Main menu choice: {choice}")
+            log.debug("menu_choice", client=client_name, menu="main", choice=choice,
+                      sample=LOG_SAMPLE_RATE)
 
             if choice == '1':
                 send_message(client_socket, "HEADLINES")
-                handle_headlines_menu(client_socket, client_name)
+                handle_headlines_menu(client_socket, client_name, stream)
 
             elif choice == '2':
                 send_message(client_socket, "SOURCES")
-                handle_sources_menu(client_socket, client_name)
+                handle_sources_menu(client_socket, client_name, stream)
 
             elif choice == '3':
-                print(f"[DISCONNECTED] {client_name} disconnected")
+                log.info("bye", client=client_name)
                 send_message(client_socket, "BYE")
                 break
 
+            elif choice == 'STREAM':
+                stream = True
+                send_message(client_socket, "STREAMING")
+
             else:
                 send_message(client_socket, "ERROR")
 
     except Exception as e:
-        print(f"[ERROR] {client_name if client_name else 'Unknown'}: {e}")
+        log.error("session_error", client=client_name, address=client_address, error=repr(e))
 
     finally:
         client_socket.close()
-        print(f"[CLOSED] Connection with {client_name if client_name else 'client'} closed")
+        log.info("session_closed", client=client_name)
 
 # ============================================================
 # Start Server Function
@@ -367,14 +507,15 @@ def start_server():
             )
             thread.start()
 
-            print(f"[ACTIVE CONNECTIONS] {threading.active_count() - 1}")
+            log.debug("threads_active", threads=threading.active_count())
 
     except KeyboardInterrupt:
         print("\n[SHUTTING DOWN] Server closing...")
 
     finally:
         server_socket.close()
-        print("[SERVER] Stopped")
+        log.info("server_stopped")
+        log.flush()
 
 # ============================================================
 # Entry Point
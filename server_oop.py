@@ -3,11 +3,60 @@
 # ============================================================
 # This script runs the Server that accepts Clients
 
+import argparse   # For command line options
+import os         # For reading the process memory
+import queue      # Outbox of pushed updates
+import secrets    # Key of the recording's name hash
 import socket     # For network communication
 import threading  # To handle more than one client at the same time
 import json       # For handling JSON
+import time       # For the statistics interval
 from news_handler import NewsHandler  # News fetching class
 from protocol import Protocol          # Protocol class
+from cache import ResultCache, QueryCache, TieredCache  # Server-side caches
+from rate_limiter import RateLimiter   # Upstream rate limit
+from upstream_pool import UpstreamPool # Bounded pool for NewsAPI calls
+from admission import AdmissionController  # Session limit + overload detector
+from subscriptions import SubscriptionManager  # Pushed headline updates
+from session_store import SessionStore  # Tokens + state of dropped sessions
+from traffic_recorder import TrafficRecorder  # Sessions recorded for replay
+from metrics import ServerMetrics      # Counters and latency histograms
+from admin import start_admin_server   # /metrics on the local admin port
+from structured_log import log, LEVELS, StructuredLogger  # JSON lines written in the background
+from profiler import profiler          # cProfile hooks (started from the admin port)
+from projection import project_response, project_header, iter_summaries  # Summary lists
+from projection import lookup_item, lookup_page
+from config import MAX_BATCH_SIZE, BATCH_CONCURRENCY, SHARED_CACHE_BYTES, POOL_STATS_INTERVAL
+from config import MAX_SESSIONS, LISTEN_BACKLOG, ADMISSION_POLICY, FAIR_QUEUING
+from config import PING_INTERVAL, PONG_TIMEOUT, SESSION_IDLE_TIMEOUT, REAPER_INTERVAL
+from config import ADMIN_PORT, LOG_LEVEL, LOG_PATH, LOG_SAMPLE_RATE
+from config import TRACE_PATH, TRACE_SLOW_MS, TRACE_SAMPLE_RATE, PUSH_OUTBOX_SIZE
+
+# Metric label of each menu option (route); other frames are '<menu>_other'
+ROUTES = {
+    'main': {'1': 'main_headlines', '2': 'main_sources', '3': 'main_bye',
+             'STREAM': 'main_options', 'DEEP': 'main_options', 'ETAGS': 'main_options',
+             'TRACE': 'main_options',
+             'BATCH': 'main_batch', 'DETAIL': 'main_detail', 'NEXT': 'main_next',
+             'REPLAY': 'main_replay', 'SUBSCRIBE': 'main_subscribe', 'UNSUBSCRIBE': 'main_subscribe'},
+    'headlines': {'1': 'headlines_keyword', '2': 'headlines_category', '3': 'headlines_country',
+                  '4': 'headlines_all', '5': 'headlines_back', '6': 'headlines_combined',
+                  'DETAIL': 'headlines_detail', 'NEXT': 'headlines_next', 'REPLAY': 'headlines_replay',
+                  'SUBSCRIBE': 'headlines_subscribe', 'UNSUBSCRIBE': 'headlines_subscribe'},
+    'sources': {'1': 'sources_category', '2': 'sources_country', '3': 'sources_language',
+                '4': 'sources_all', '5': 'sources_back', 'DETAIL': 'sources_detail',
+                'NEXT': 'sources_next', 'REPLAY': 'sources_replay'},
+}
+
+
+def process_rss():
+    """Resident memory of this process in bytes (Linux), or None"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
 
 # ============================================================
 # ClientHandler Class - Client Handler
@@ -19,7 +68,9 @@ class ClientHandler:
     Each client runs in a separate thread
     """
     
-    def __init__(self, client_socket, client_address, group_id):
+    def __init__(self, client_socket, client_address, group_id, result_cache, news_handler,
+                 subscriptions=None, session_store=None, recorder=None, metrics=None,
+                 slow_traces=None, trace_slow_ms=TRACE_SLOW_MS):
         """
         Constructor - executed when a new object is created
         
@@ -27,21 +78,412 @@ class ClientHandler:
             client_socket: the client's socket
             client_address: client address (IP + Port)
             group_id: group ID (GB5)
+            result_cache: ResultCache shared by all clients
+            news_handler: NewsHandler shared by all clients (shares its query cache)
+            subscriptions: SubscriptionManager shared by all clients (optional)
+            session_store: SessionStore for resuming dropped sessions (optional)
+            recorder: TrafficRecorder the session is written to (optional)
+            metrics: ServerMetrics requests are counted and timed in (optional)
+            slow_traces: StructuredLogger the slow requests' traces are written to (optional)
+            trace_slow_ms: requests slower than this are slow
         """
         self.socket = client_socket       # socket
         self.address = client_address     # address
         self.group_id = group_id          # group ID
+        self.result_cache = result_cache  # full responses for DETAIL requests
         self.client_name = None           # client name (received later)
-        self.news_handler = NewsHandler() # news handler object
+        self.news_handler = news_handler  # news handler object
         self.protocol = Protocol()        # communication protocol object
+        self.streaming = False            # send results one item per frame
+        self.deep_fetch = False           # fetch all pages, not only the first 15
+        self.etags = False                # lists carry an etag; "<option> <etag>" is conditional
+        self.if_none_match = ''           # etag the client sent with the current request
+        self.subscriptions = subscriptions
+        self.outbox = None                # pushed updates waiting for this socket (push_loop)
+        self.push_failed = False          # the outbox overflowed: no more pushes
+        
+        # Resumable state: parked in the SessionStore if the connection drops
+        self.session_store = session_store
+        self.token = None                 # issued at the handshake
+        self.menu = 'main'                # 'main', 'headlines' or 'sources'
+        self.last_page = None             # (result_id, start) of the last list sent
+        self.lists_sent = 0               # list responses sent (REPLAY checks it)
+        self.said_bye = False             # ended with BYE: nothing to resume
+        
+        # Traffic recording (server_oop.py --record)
+        self.recorder = recorder
+        self.recording = None             # SessionRecording, started after the handshake
+        
+        # Metrics: the current request's phases are timed until the next request
+        self.metrics = metrics
+        self.timer = None                 # RequestTimer of the current request
+        self.tracing = False              # send the trace of every request (TRACE)
+        self.slow_traces = slow_traces
+        self.trace_slow = trace_slow_ms / 1000
+        
+        # Session state read by the reaper (NewsServer.reap_sessions)
+        self.send_lock = threading.Lock() # the reaper's PING must not cut into a response
+        self.started_at = time.monotonic()
+        self.last_seen = self.started_at    # last frame of any kind (PONG too)
+        self.last_request = self.started_at # last real request
+        self.ping_sent_at = None            # PING waiting for an answer
+        self.waiting = False                # blocked in receive() (not working)
+        self.requests = 0
     
     def send(self, message):
         """Send a message to the client - wrapper function"""
-        return self.protocol.send_message(self.socket, message)
+        if self.recording is not None:
+            self.recording.response(message)
+        sent = self.send_frame(message)
+        if self.timer is not None:
+            self.timer.mark('send')
+        return sent
+    
+    def send_frame(self, message):
+        """Send without recording (PING and pushed updates are not replayed)"""
+        with self.send_lock:
+            return self.protocol.send_message(self.socket, message)
+    
+    def send_stream(self, header, items):
+        """Streamed list: header frame, one frame per item, then an end frame"""
+        if self.recording is not None:
+            self.recording.response(header)
+        with self.send_lock:
+            sent = self.protocol.send_stream(self.socket, header, items)
+        if self.timer is not None:
+            self.timer.mark('send')  # Items are built while they are sent
+        return sent
     
     def receive(self):
-        """Receive a message from the client - wrapper function"""
-        return self.protocol.receive_message(self.socket)
+        """
+        Receive a message from the client - wrapper function
+        PONG answers to the server's PING are noted and skipped
+        """
+        while True:
+            self.waiting = True
+            message = self.protocol.receive_message(self.socket)
+            self.waiting = False
+            if message is None:
+                return None
+            
+            self.last_seen = time.monotonic()
+            self.ping_sent_at = None
+            if message == "PONG":
+                continue
+            
+            self.last_request = self.last_seen
+            self.requests += 1
+            if self.recording is not None:
+                self.recording.request(message)
+            if self.timer is not None:
+                self.timer.mark('receive')  # The parameter of the current request
+            return message
+    
+    # ============================================================
+    # Request Metrics
+    # ============================================================
+    
+    def begin_request(self, menu, choice):
+        """An option arrived: time it until the next one (see finish_request)"""
+        if self.metrics is not None:
+            self.timer = self.metrics.start(ROUTES[menu].get(choice) or f"{menu}_other")
+        profiler.enter()
+    
+    def finish_request(self):
+        """
+        Called before waiting for the next option: the response of the
+        current request has been sent
+        """
+        timer = self.timer
+        if timer is not None:
+            self.metrics.finish(timer)
+            self.timer = None
+            if self.tracing or (self.slow_traces is not None and timer.elapsed() >= self.trace_slow):
+                self.send_trace(timer)
+        profiler.leave()
+    
+    def enable_tracing(self):
+        """
+        Send a trace frame after every response from now on. The trace
+        is a second small write right after the response: without
+        TCP_NODELAY, Nagle would hold it (and the next response) until
+        the client's delayed ACK, about 40 ms
+        """
+        self.tracing = True
+        try:
+            self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        except OSError:
+            pass
+    
+    def send_trace(self, timer):
+        """
+        Trailer frame with the spans of the request that just ended
+        (TRACE), and the slow trace file
+        """
+        trace = timer.trace()
+        if self.tracing:
+            self.send_frame(json.dumps({'type': 'trace', **trace}))
+        if self.slow_traces is not None and timer.elapsed() >= self.trace_slow:
+            self.slow_traces.info("slow_trace", client=self.client_name,
+                                  sample=TRACE_SAMPLE_RATE, **trace)
+    
+    def mark(self, phase):
+        """The time since the last mark was spent in this phase"""
+        if self.timer is not None:
+            self.timer.mark(phase)
+    
+    def save_results(self, data, filename):
+        """Save the NewsAPI response to the client's JSON file"""
+        self.mark('upstream')
+        self.news_handler.save_to_json(data, filename)
+        self.mark('save')
+    
+    def push(self, frame):
+        """
+        Queue a frame the client did not ask for (subscription update)
+        
+        Called by the subscriptions' refresh thread, so it never waits
+        for this socket: the session's push thread sends the frame (the
+        send lock keeps it out of the middle of a response). A client
+        whose outbox is full is not reading; its session is closed.
+        
+        Returns:
+            True if the frame was queued
+        """
+        if self.push_failed:
+            return False
+        if self.outbox is None:
+            # Only the refresh thread pushes, so no lock is needed here
+            self.outbox = queue.Queue(PUSH_OUTBOX_SIZE)
+            threading.Thread(target=self.push_loop, name="push", daemon=True).start()
+        try:
+            self.outbox.put_nowait(frame)
+            return True
+        except queue.Full:
+            self.push_failed = True
+            self.close_session("not reading its pushed updates")
+            return False
+    
+    def push_loop(self):
+        """Send the queued pushes (runs in the session's push thread)"""
+        while True:
+            frame = self.outbox.get()
+            if frame is None or not self.send_frame(frame):
+                return  # Session ended, or the connection is gone
+    
+    def stop_pushes(self):
+        if self.outbox is not None:
+            try:
+                self.outbox.put_nowait(None)
+            except queue.Full:
+                pass  # The push thread is stuck in a send; the closed socket ends it
+    
+    def ping(self):
+        """Heartbeat: the client's reader answers with PONG"""
+        self.ping_sent_at = time.monotonic()
+        return self.send_frame("PING")
+    
+    def close_session(self, reason):
+        """
+        Called by the reaper: shut the socket down so the blocked
+        receive() returns None and handle() ends normally
+        """
+        log.warning("session_reaped", client=self.client_name, address=self.address, reason=reason)
+        try:
+            self.socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+    
+    def stats(self):
+        """Numbers of this session for the [SESSIONS] report"""
+        now = time.monotonic()
+        return {
+            'client': self.client_name,
+            'address': f"{self.address[0]}:{self.address[1]}",
+            'age_s': round(now - self.started_at),
+            'idle_s': round(now - self.last_request),
+            'requests': self.requests,
+        }
+    
+    def send_results(self, data):
+        """
+        Store the full response and send only the summary list
+        The client asks for one item's details later with DETAIL
+        
+        If the client sent the etag of the list it has cached and the
+        list did not change, only a "not_modified" header is sent
+        """
+        self.lists_sent += 1
+        result_id = self.result_cache.put(data)
+        etag = None
+        if self.etags and data.get('status') == 'ok':
+            etag = self.result_cache.etag(result_id)
+        
+        if etag and etag == self.if_none_match:
+            log.debug("not_modified", client=self.client_name, etag=etag, sample=LOG_SAMPLE_RATE)
+            self.last_page = (result_id, 0)
+            header = dict(project_header(data, result_id, 0), status='not_modified', etag=etag)
+            if self.metrics is not None:
+                self.metrics.not_modified.inc()
+            if self.streaming:
+                return self.send_stream(header, ())
+            message = json.dumps(header)
+            self.mark('serialize')
+            return self.send(message)
+        
+        return self.send_page(data, result_id, 0, etag)
+    
+    def send_page(self, data, result_id, start, etag=None):
+        """
+        Send one page of summaries starting at index start
+        The response carries a cursor when more items follow,
+        and the etag of the list if given
+        """
+        self.last_page = (result_id, start) if result_id is not None else None
+        if self.streaming:
+            header = project_header(data, result_id, start)
+            if etag:
+                header = dict(header, etag=etag)
+            return self.send_stream(header, iter_summaries(data, result_id, start))
+        
+        response = project_response(data, result_id, start)
+        if etag:
+            response['etag'] = etag
+        message = json.dumps(response)
+        self.mark('serialize')
+        return self.send(message)
+    
+    def handle_next_request(self):
+        """
+        NEXT request: send the page a cursor points at
+        Served from the ResultCache, NewsAPI is not called again
+        """
+        self.send("READY")
+        cursor = self.receive()
+        if not cursor:
+            return False
+        
+        log.info("next_page", client=self.client_name, sample=LOG_SAMPLE_RATE)
+        
+        self.lists_sent += 1
+        page = lookup_page(self.result_cache, cursor)
+        if isinstance(page, dict):
+            self.send_page(page, None, 0)  # Error response
+        else:
+            self.send_page(*page)
+        return True
+    
+    def handle_replay_request(self, count):
+        """
+        REPLAY <n>: after a reconnect the client asks again for the list
+        it was waiting for, n (count) = lists it has requested in this session
+        
+        If the server sent n lists, the request had arrived: the last
+        list is sent again from the ResultCache ("REPLAYING" + the list).
+        Otherwise the request was lost with the old connection and the
+        client has to send it again ("RESEND").
+        """
+        data = self.result_cache.get(self.last_page[0]) if self.last_page else None
+        if data is None or count != str(self.lists_sent):
+            return self.send("RESEND")
+        
+        log.info("replay", client=self.client_name)
+        self.send("REPLAYING")
+        return self.send_page(data, *self.last_page)
+    
+    def handle_detail_request(self):
+        """
+        DETAIL request: send the full article/source for one item ID
+        """
+        self.send("READY")
+        item_id = self.receive()
+        if not item_id:
+            return False
+        
+        log.info("detail", client=self.client_name, item_id=item_id, sample=LOG_SAMPLE_RATE)
+        
+        self.send(json.dumps(lookup_item(self.result_cache, item_id)))
+        return True
+    
+    def handle_batch_request(self):
+        """
+        BATCH request: run many (endpoint, filter) queries in one request
+        
+        The client sends a JSON list like:
+            [{"endpoint": "headlines", "filter": {"country": "ae"}}, ...]
+        The queries are fetched concurrently (from the cache or NewsAPI)
+        and one combined response is sent with a status for each item
+        """
+        self.send("READY")
+        message = self.receive()
+        if not message:
+            return False
+        
+        try:
+            items = json.loads(message)
+            if not isinstance(items, list):
+                raise ValueError("batch must be a list")
+            queries = [(item['endpoint'], dict(item.get('filter') or {})) for item in items]
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            self.send(json.dumps({"status": "error", "message": f"Invalid batch: {e}"}))
+            return True
+        
+        if len(queries) > MAX_BATCH_SIZE:
+            self.send(json.dumps({
+                "status": "error",
+                "message": f"Batch too large ({len(queries)} > {MAX_BATCH_SIZE})"
+            }))
+            return True
+        
+        log.info("batch", client=self.client_name, queries=len(queries), sample=LOG_SAMPLE_RATE)
+        
+        results = self.news_handler.run_batch(queries, BATCH_CONCURRENCY)
+        
+        filename = f"{self.client_name}_batch_{self.group_id}.json"
+        self.save_results(results, filename)
+        
+        response = {"status": "ok", "results": []}
+        for (endpoint, filters), data in zip(queries, results):
+            result_id = self.result_cache.put(data)
+            item = {"endpoint": endpoint, "filter": filters}
+            item.update(project_response(data, result_id))
+            response["results"].append(item)
+        
+        message = json.dumps(response)
+        self.mark('serialize')
+        self.send(message)
+        return True
+    
+    def handle_subscribe_request(self, command):
+        """
+        SUBSCRIBE / UNSUBSCRIBE: the client sends the query as JSON,
+        e.g. {"country": "us"} or {"q": "football"}
+        New articles for it are then pushed as {"type": "push", ...}
+        
+        Returns:
+            False if the connection was closed, True otherwise
+        """
+        self.send("READY")
+        message = self.receive()
+        if not message:
+            return False
+        
+        if self.subscriptions is None:
+            self.send(json.dumps({"status": "error", "message": "Subscriptions are not available"}))
+            return True
+        
+        try:
+            filters = json.loads(message)
+        except ValueError:
+            filters = None
+        
+        log.info(command.lower(), client=self.client_name, filters=filters)
+        if command == 'SUBSCRIBE':
+            response = self.subscriptions.subscribe(self, filters)
+        else:
+            response = self.subscriptions.unsubscribe(self, filters)
+        self.send(json.dumps(response))
+        return True
     
     # ============================================================
     # Headlines Menu Handler
@@ -56,15 +498,22 @@ class ClientHandler:
         3. Search by country
         4. All headlines
         5. Return to main menu
+        6. Combined headlines from several countries/categories
         """
         while True:  # Loop to keep receiving requests
             # Receive client choice
+            self.finish_request()
             choice = self.receive()
             if not choice:  # If connection is closed
                 break
             
-            # Print request on server screen
-            print(f"[{self.client_name}] Headlines request: {choice}")
+            # "<option> <etag>": the client has this list cached
+            choice, _, argument = choice.partition(' ')
+            self.if_none_match = argument
+            self.begin_request('headlines', choice)
+            
+            log.debug("menu_choice", client=self.client_name, menu="headlines", choice=choice,
+                     sample=LOG_SAMPLE_RATE)
             
             # ============================================================
             # Option 1: Search by keyword
@@ -75,17 +524,18 @@ class ClientHandler:
                 if not keyword:
                     break
                 
-                print(f"[{self.client_name}] Searching headlines for keyword: {keyword}")
+                log.info("search", client=self.client_name, menu="headlines", filter="keyword",
+                         value=keyword, sample=LOG_SAMPLE_RATE)
                 
                 # Fetch data from NewsAPI
-                data = self.news_handler.search_headlines_by_keyword(keyword)
+                data = self.news_handler.search_headlines_by_keyword(keyword, deep=self.deep_fetch)
                 
                 # Save data to JSON file
                 filename = f"{self.client_name}_keyword_{self.group_id}.json"
-                self.news_handler.save_to_json(data, filename)
+                self.save_results(data, filename)
                 
                 # Send data to client
-                self.send(json.dumps(data))
+                self.send_results(data)
             
             # ============================================================
             # Option 2: Search by category
@@ -96,13 +546,14 @@ class ClientHandler:
                 if not category:
                     break
                 
-                print(f"[{self.client_name}] Searching headlines by category: {category}")
+                log.info("search", client=self.client_name, menu="headlines", filter="category",
+                         value=category, sample=LOG_SAMPLE_RATE)
                 
-                data = self.news_handler.get_headlines_by_category(category)
+                data = self.news_handler.get_headlines_by_category(category, deep=self.deep_fetch)
                 filename = f"{self.client_name}_category_{self.group_id}.json"
-                self.news_handler.save_to_json(data, filename)
+                self.save_results(data, filename)
                 
-                self.send(json.dumps(data))
+                self.send_results(data)
             
             # ============================================================
             # Option 3: Search by country
@@ -113,32 +564,83 @@ class ClientHandler:
                 if not country:
                     break
                 
-                print(f"[{self.client_name}] Searching headlines by country: {country}")
+                log.info("search", client=self.client_name, menu="headlines", filter="country",
+                         value=country, sample=LOG_SAMPLE_RATE)
                 
-                data = self.news_handler.get_headlines_by_country(country)
+                data = self.news_handler.get_headlines_by_country(country, deep=self.deep_fetch)
                 filename = f"{self.client_name}_country_{self.group_id}.json"
-                self.news_handler.save_to_json(data, filename)
+                self.save_results(data, filename)
                 
-                self.send(json.dumps(data))
+                self.send_results(data)
             
             # ============================================================
             # Option 4: All headlines
             # ============================================================
             elif choice == '4':
-                print(f"[{self.client_name}] Fetching all headlines")
+                log.info("search", client=self.client_name, menu="headlines", filter="all",
+                         sample=LOG_SAMPLE_RATE)
                 
-                data = self.news_handler.get_all_headlines()
+                data = self.news_handler.get_all_headlines(deep=self.deep_fetch)
                 filename = f"{self.client_name}_all_headlines_{self.group_id}.json"
-                self.news_handler.save_to_json(data, filename)
+                self.save_results(data, filename)
                 
-                self.send(json.dumps(data))
+                self.send_results(data)
             
             # ============================================================
             # Option 5: Return to main menu
             # ============================================================
             elif choice == '5':
+                self.menu = 'main'
                 break  # Exit loop and return to main menu
             
+            # ============================================================
+            # Option 6: Combined headlines from several countries/categories
+            # ============================================================
+            elif choice == '6':
+                self.send("READY")
+                message = self.receive()  # {"countries": [...], "categories": [...]}
+                if not message:
+                    break
+                
+                try:
+                    selection = json.loads(message)
+                    countries = selection.get('countries', [])
+                    categories = selection.get('categories', [])
+                except (ValueError, AttributeError):
+                    self.send(json.dumps({"status": "error", "message": "Invalid selection"}))
+                    continue
+                
+                log.info("search", client=self.client_name, menu="headlines", countries=countries,
+                         categories=categories, sample=LOG_SAMPLE_RATE)
+                
+                data = self.news_handler.get_aggregated_headlines(countries, categories)
+                filename = f"{self.client_name}_combined_{self.group_id}.json"
+                self.save_results(data, filename)
+                
+                self.send_results(data)
+            
+            # ============================================================
+            # Details of one article from the last list
+            # ============================================================
+            elif choice == 'DETAIL':
+                if not self.handle_detail_request():
+                    break
+            
+            # Next page of the last list
+            elif choice == 'NEXT':
+                if not self.handle_next_request():
+                    break
+            
+            # The list lost with a dropped connection (REPLAY <n>)
+            elif choice == 'REPLAY':
+                if not self.handle_replay_request(argument):
+                    break
+            
+            # Pushed updates for a keyword/category/country
+            elif choice in ('SUBSCRIBE', 'UNSUBSCRIBE'):
+                if not self.handle_subscribe_request(choice):
+                    break
+            
             else:
                 self.send("ERROR")
     
@@ -157,11 +659,17 @@ class ClientHandler:
         5. Return to main menu
         """
         while True:
+            self.finish_request()
             choice = self.receive()
             if not choice:
                 break
             
-            print(f"[{self.client_name}] Sources request: {choice}")
+            choice, _, argument = choice.partition(' ')
+            self.if_none_match = argument
+            self.begin_request('sources', choice)
+            
+            log.debug("menu_choice", client=self.client_name, menu="sources", choice=choice,
+                     sample=LOG_SAMPLE_RATE)
             
             # Option 1: Search by category
             if choice == '1':
@@ -170,13 +678,14 @@ class ClientHandler:
                 if not category:
                     break
                 
-                print(f"[{self.client_name}] Searching sources by category: {category}")
+                log.info("search", client=self.client_name, menu="sources", filter="category",
+                         value=category, sample=LOG_SAMPLE_RATE)
                 
                 data = self.news_handler.get_sources_by_category(category)
                 filename = f"{self.client_name}_sources_category_{self.group_id}.json"
-                self.news_handler.save_to_json(data, filename)
+                self.save_results(data, filename)
                 
-                self.send(json.dumps(data))
+                self.send_results(data)
             
             # Option 2: Search by country
             elif choice == '2':
@@ -185,13 +694,14 @@ class ClientHandler:
                 if not country:
                     break
                 
-                print(f"[{self.client_name}] Searching sources by country: {country}")
+                log.info("search", client=self.client_name, menu="sources", filter="country",
+                         value=country, sample=LOG_SAMPLE_RATE)
                 
                 data = self.news_handler.get_sources_by_country(country)
                 filename = f"{self.client_name}_sources_country_{self.group_id}.json"
-                self.news_handler.save_to_json(data, filename)
+                self.save_results(data, filename)
                 
-                self.send(json.dumps(data))
+                self.send_results(data)
             
             # Option 3: Search by language
             elif choice == '3':
@@ -200,28 +710,46 @@ class ClientHandler:
                 if not language:
                     break
                 
-                print(f"[{self.client_name}] Searching sources by language: {language}")
+                log.info("search", client=self.client_name, menu="sources", filter="language",
+                         value=language, sample=LOG_SAMPLE_RATE)
                 
                 data = self.news_handler.get_sources_by_language(language)
                 filename = f"{self.client_name}_sources_language_{self.group_id}.json"
-                self.news_handler.save_to_json(data, filename)
+                self.save_results(data, filename)
                 
-                self.send(json.dumps(data))
+                self.send_results(data)
             
             # Option 4: All sources
             elif choice == '4':
-                print(f"[{self.client_name}] Fetching all sources")
+                log.info("search", client=self.client_name, menu="sources", filter="all",
+                         sample=LOG_SAMPLE_RATE)
                 
                 data = self.news_handler.get_all_sources()
                 filename = f"{self.client_name}_all_sources_{self.group_id}.json"
-                self.news_handler.save_to_json(data, filename)
+                self.save_results(data, filename)
                 
-                self.send(json.dumps(data))
+                self.send_results(data)
             
             # Option 5: Return to main menu
             elif choice == '5':
+                self.menu = 'main'
                 break
             
+            # Details of one source from the last list
+            elif choice == 'DETAIL':
+                if not self.handle_detail_request():
+                    break
+            
+            # Next page of the last list
+            elif choice == 'NEXT':
+                if not self.handle_next_request():
+                    break
+            
+            # The list lost with a dropped connection (REPLAY <n>)
+            elif choice == 'REPLAY':
+                if not self.handle_replay_request(argument):
+                    break
+            
             else:
                 self.send("ERROR")
     
@@ -229,59 +757,175 @@ class ClientHandler:
     # Main Client Handler
     # ============================================================
     
+    def handshake(self):
+        """
+        Receive the client name and answer "CONNECTED <token>"
+        
+        A client whose connection dropped sends "RESUME <token>" instead.
+        If the session is still parked, its name, menu, options and last
+        list are restored and the answer is "RESUMED <token> <menu>";
+        otherwise "EXPIRED" and the client sends its name.
+        
+        Returns:
+            False if the connection was closed, True otherwise
+        """
+        message = self.receive()
+        if message and message.startswith("RESUME ") and self.session_store is not None:
+            state = self.session_store.take(message[len("RESUME "):].strip())
+            if state is not None:
+                self.restore(state)
+                self.news_handler = self.news_handler.for_client(self.client_name)
+                self.token = self.session_store.issue(self)
+                log.info("session_resumed", client=self.client_name, address=self.address,
+                         menu=self.menu)
+                if self.recorder is not None:
+                    self.recording = self.recorder.start(self.client_name, self.menu)
+                self.send(f"RESUMED {self.token} {self.menu}")
+                return True
+            self.send("EXPIRED")
+            message = self.receive()
+        
+        self.client_name = message
+        if not self.client_name:
+            return False
+        
+        log.info("session_started", client=self.client_name, address=self.address)
+        # Upstream calls of this client are queued under its name
+        self.news_handler = self.news_handler.for_client(self.client_name)
+        if self.recorder is not None:
+            self.recording = self.recorder.start(self.client_name)
+        if self.session_store is not None:
+            self.token = self.session_store.issue(self)
+            self.send(f"CONNECTED {self.token}")  # Connection confirmation + session token
+        else:
+            self.send("CONNECTED")
+        return True
+    
+    # Attributes kept while a dropped session waits to be resumed
+    RESUMABLE = ('client_name', 'menu', 'streaming', 'deep_fetch', 'etags', 'tracing',
+                 'last_page', 'lists_sent')
+    
+    def snapshot(self):
+        return {name: getattr(self, name) for name in self.RESUMABLE}
+    
+    def restore(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+        if self.tracing:
+            self.enable_tracing()  # The new socket needs TCP_NODELAY too
+    
     def handle(self):
         """
         Main function that handles the client
         Runs in a separate thread for each client
         """
-        print(f"[NEW CONNECTION] {self.address} connected")
+        log.info("connection", address=self.address)
         
         try:
             # ============================================================
-            # Step 1: Receive client name
+            # Step 1: Receive client name (or RESUME <token>)
             # ============================================================
-            self.client_name = self.receive()
-            if not self.client_name:
+            if not self.handshake():
                 return
             
-            print(f"[CLIENT NAME] {self.client_name} from {self.address}")
-            self.send("CONNECTED")  # Connection confirmation
+            # A resumed session continues in the menu it was in
+            if self.menu == 'headlines':
+                self.handle_headlines_menu()
+            elif self.menu == 'sources':
+                self.handle_sources_menu()
             
             # ============================================================
             # Step 2: Main Menu Loop
             # ============================================================
             while True:
+                self.finish_request()
                 choice = self.receive()  # Receive choice
                 if not choice:
                     break
+                self.begin_request('main', choice.partition(' ')[0])
                 
-                print(f"[{self.client_name}] Main menu choice: {choice}")
+                log.debug("menu_choice", client=self.client_name, menu="main", choice=choice,
+                         sample=LOG_SAMPLE_RATE)
                 
                 # Option 1: Headlines menu
                 if choice == '1':
                     self.send("HEADLINES")
+                    self.menu = 'headlines'
                     self.handle_headlines_menu()
                 
                 # Option 2: Sources menu
                 elif choice == '2':
                     self.send("SOURCES")
+                    self.menu = 'sources'
                     self.handle_sources_menu()
                 
                 # Option 3: Disconnect
                 elif choice == '3':
-                    print(f"[DISCONNECTED] {self.client_name} disconnected")
+                    log.info("bye", client=self.client_name)
+                    self.said_bye = True
                     self.send("BYE")
                     break
                 
+                # Switch to streaming responses
+                elif choice == 'STREAM':
+                    self.streaming = True
+                    self.send("STREAMING")
+                
+                # Fetch all pages of headline queries
+                elif choice == 'DEEP':
+                    self.deep_fetch = True
+                    self.send("DEEP")
+                
+                # Lists carry an etag the client can revalidate its cache with
+                elif choice == 'ETAGS':
+                    self.etags = True
+                    self.send("ETAGS")
+                
+                # A trace frame after every response (timing breakdown)
+                elif choice == 'TRACE':
+                    self.enable_tracing()
+                    self.send("TRACING")
+                
+                # Many queries in one request
+                elif choice == 'BATCH':
+                    if not self.handle_batch_request():
+                        break
+                
+                # Details and next pages of batch results
+                elif choice == 'DETAIL':
+                    if not self.handle_detail_request():
+                        break
+                
+                elif choice == 'NEXT':
+                    if not self.handle_next_request():
+                        break
+                
+                elif choice.startswith('REPLAY'):
+                    if not self.handle_replay_request(choice.partition(' ')[2]):
+                        break
+                
+                elif choice in ('SUBSCRIBE', 'UNSUBSCRIBE'):
+                    if not self.handle_subscribe_request(choice):
+                        break
+                
                 else:
                     self.send("ERROR")
         
         except Exception as e:
-            print(f"[ERROR] {self.client_name if self.client_name else 'Unknown'}: {e}")
+            log.error("session_error", client=self.client_name, address=self.address, error=repr(e))
         
         finally:
+            self.finish_request()
+            self.stop_pushes()
+            if self.session_store is not None and self.token is not None:
+                if self.said_bye:
+                    self.session_store.forget(self.token)
+                else:
+                    self.session_store.park(self.token, self.snapshot())
+            if self.recording is not None:
+                self.recorder.finish(self.recording)
             self.socket.close()
-            print(f"[CLOSED] Connection with {self.client_name} closed")
+            log.info("session_closed", client=self.client_name)
 
 
 # ============================================================
@@ -294,7 +938,11 @@ class NewsServer:
     Responsible for accepting connections and creating threads for clients
     """
     
-    def __init__(self, host='127.0.0.1', port=5000, group_id="GB5"):
+    def __init__(self, host='127.0.0.1', port=5000, group_id="GB5", reuse_port=False,
+                 shared_cache_path=None, max_sessions=MAX_SESSIONS, backlog=LISTEN_BACKLOG,
+                 admission_policy=ADMISSION_POLICY, fair_queuing=FAIR_QUEUING,
+                 record_path=None, record_key=None, admin_port=ADMIN_PORT,
+                 trace_path=TRACE_PATH, trace_slow_ms=TRACE_SLOW_MS):
         """
         Constructor
         
@@ -302,12 +950,61 @@ class NewsServer:
             host: IP address (localhost = 127.0.0.1)
             port: port number (5000)
             group_id: group ID (GB5)
+            reuse_port: bind with SO_REUSEPORT so several worker
+                        processes can listen on the same port
+            shared_cache_path: SharedQueryCache file used by all workers
+            max_sessions: clients served at the same time
+            backlog: listen() backlog
+            admission_policy: 'reject' or 'queue' when all sessions are taken
+            fair_queuing: share the upstream pool fairly between clients
+                          (False = first come, first served)
+            record_path: append every session to this file for replay
+            record_key: key of the client name hash in the recording
+            admin_port: local port of the admin HTTP server (/metrics);
+                        None = no admin server
+            trace_path: append the traces of slow requests to this file
+            trace_slow_ms: requests slower than this are slow
         """
         self.host = host
         self.port = port
         self.group_id = group_id
+        self.reuse_port = reuse_port
+        self.backlog = backlog
         self.server_socket = None
         self.is_running = False
+        self.result_cache = ResultCache()  # Shared by all client threads
+        # Shared query cache and upstream rate limit
+        self.metrics = ServerMetrics()
+        self.admin_port = admin_port
+        query_cache = QueryCache()
+        if shared_cache_path:
+            from shared_cache import SharedQueryCache
+            query_cache = TieredCache(query_cache, SharedQueryCache(shared_cache_path))
+            self.metrics.shared_caches.append(query_cache.shared)
+        # All NewsAPI calls run on a bounded pool, not on the client threads
+        self.upstream_pool = UpstreamPool(fair=fair_queuing)
+        self.news_handler = NewsHandler(cache=query_cache, rate_limiter=RateLimiter(),
+                                        pool=self.upstream_pool, metrics=self.metrics)
+        self.admission = AdmissionController(max_sessions, admission_policy,
+                                             pool=self.upstream_pool)
+        self.sessions = {}  # id -> ClientHandler, watched by the reaper
+        self.sessions_lock = threading.Lock()
+        self.subscriptions = SubscriptionManager(self.news_handler, self.result_cache)
+        self.session_store = SessionStore()
+        self.recorder = TrafficRecorder(record_path, record_key) if record_path else None
+        self.slow_traces = StructuredLogger(path=trace_path) if trace_path else None
+        self.trace_slow_ms = trace_slow_ms
+        
+        # Gauges read when /metrics is scraped
+        self.metrics.gauge('news_sessions', "Client sessions connected",
+                           function=lambda: self.admission.sessions)
+        self.metrics.gauge('news_parked_sessions', "Dropped sessions waiting to be resumed",
+                           function=self.session_store.count)
+        self.metrics.gauge('news_upstream_calls', "NewsAPI calls in the upstream pool", ('state',),
+                           function=lambda: {('running',): self.upstream_pool.active,
+                                             ('queued',): self.upstream_pool.queued})
+        self.metrics.gauge('news_threads', "Threads of the process", function=threading.active_count)
+        self.metrics.gauge('news_rss_bytes', "Resident memory of the process", function=process_rss)
     
     def start(self):
         """
@@ -315,35 +1012,160 @@ class NewsServer:
         """
         self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if self.reuse_port:
+            # The kernel spreads new connections over all worker processes
+            self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
         self.server_socket.bind((self.host, self.port))
-        self.server_socket.listen(3)
+        self.server_socket.listen(self.backlog)
         self.is_running = True
         
         self.print_banner()
+        if self.admin_port is not None:
+            admin = start_admin_server(self, self.admin_port)
+            print(f"Admin port: http://127.0.0.1:{admin.server_address[1]}/metrics")
+        threading.Thread(target=self.report_stats, daemon=True).start()
+        threading.Thread(target=self.reap_sessions, daemon=True).start()
+        threading.Thread(target=self.subscriptions.run, daemon=True).start()
         
         try:
             while self.is_running:
                 client_socket, client_address = self.server_socket.accept()
                 
-                client_handler = ClientHandler(
-                    client_socket,
-                    client_address,
-                    self.group_id
+                # Admission runs on the client's thread, so a client
+                # waiting for a session never blocks accept()
+                thread = threading.Thread(
+                    target=self.serve_client,
+                    args=(client_socket, client_address)
                 )
-                
-                thread = threading.Thread(target=client_handler.handle)
                 thread.start()
-                
-                print(f"[ACTIVE CONNECTIONS] {threading.active_count() - 1}")
         
         except KeyboardInterrupt:
             print("\n[SHUTTING DOWN] Server closing...")
             self.stop()
         
         except Exception as e:
-            print(f"[SERVER ERROR] {e}")
+            log.error("server_error", error=repr(e))
             self.stop()
     
+    def serve_client(self, client_socket, client_address):
+        """
+        Admit the client and run its ClientHandler, or refuse it
+        """
+        reason = self.admission.admit()
+        if reason is not None:
+            self.refuse_client(client_socket, client_address, reason)
+            return
+        
+        log.debug("sessions_active", sessions=self.admission.sessions,
+                  max_sessions=self.admission.max_sessions)
+        client_handler = ClientHandler(
+            client_socket,
+            client_address,
+            self.group_id,
+            self.result_cache,
+            self.news_handler,
+            self.subscriptions,
+            self.session_store,
+            self.recorder,
+            self.metrics,
+            self.slow_traces,
+            self.trace_slow_ms
+        )
+        with self.sessions_lock:
+            self.sessions[id(client_handler)] = client_handler
+        try:
+            client_handler.handle()
+        finally:
+            self.subscriptions.unsubscribe_all(client_handler)
+            with self.sessions_lock:
+                del self.sessions[id(client_handler)]
+            self.admission.release()
+    
+    def refuse_client(self, client_socket, client_address, reason):
+        """
+        Answer the client's name with a "busy" response instead of
+        CONNECTED, then close the connection
+        """
+        log.warning("connection_refused", address=client_address, reason=reason)
+        try:
+            client_socket.settimeout(2)
+            if Protocol.receive_message(client_socket):
+                retry_after = self.upstream_pool.retry_after()
+                Protocol.send_message(client_socket, json.dumps({
+                    "status": "busy",
+                    "retry_after": retry_after,
+                    "message": f"Server busy ({reason}), please retry after {retry_after}s"
+                }))
+        except OSError:
+            pass
+        finally:
+            client_socket.close()
+    
+    def reap_sessions(self):
+        """
+        Reaper: every REAPER_INTERVAL seconds look at the sessions
+        that are waiting for their client
+        - silent for PING_INTERVAL: send PING
+        - PING not answered within PONG_TIMEOUT: close (client is gone)
+        - no request for SESSION_IDLE_TIMEOUT: close (abandoned)
+        A session that is working on a request is never touched
+        """
+        while self.is_running:
+            time.sleep(REAPER_INTERVAL)
+            now = time.monotonic()
+            with self.sessions_lock:
+                sessions = list(self.sessions.values())
+            
+            for session in sessions:
+                if not session.waiting:
+                    continue
+                if now - session.last_request > SESSION_IDLE_TIMEOUT:
+                    session.close_session(f"idle for {now - session.last_request:.0f}s")
+                elif session.ping_sent_at is not None:
+                    if now - session.ping_sent_at > PONG_TIMEOUT:
+                        session.close_session("no answer to PING")
+                elif now - session.last_seen > PING_INTERVAL:
+                    if not session.ping():
+                        session.close_session("PING failed")
+    
+    def session_stats(self):
+        """
+        Sessions, threads and memory, to check that they stay flat
+        
+        Returns:
+            dictionary with the session and thread counts, the dropped
+            sessions waiting to be resumed, the process RSS, the RSS per
+            session and the numbers of each session
+        """
+        with self.sessions_lock:
+            sessions = [session.stats() for session in self.sessions.values()]
+        rss = process_rss()
+        return {
+            'sessions': len(sessions),
+            'parked': self.session_store.count(),
+            'threads': threading.active_count(),
+            'rss_bytes': rss,
+            'rss_per_session': rss // len(sessions) if sessions and rss else None,
+            'per_session': sessions,
+        }
+    
+    def report_stats(self):
+        """
+        Log the upstream pool statistics every POOL_STATS_INTERVAL
+        seconds (only when there was work): queue wait and run time
+        are reported separately. Then the session/thread/memory line.
+        """
+        while self.is_running:
+            time.sleep(POOL_STATS_INTERVAL)
+            sessions = self.session_stats()
+            log.info("session_stats", sessions=sessions['sessions'], parked=sessions['parked'],
+                     threads=sessions['threads'], rss_bytes=sessions['rss_bytes'],
+                     rss_per_session=sessions['rss_per_session'])
+            
+            stats = self.upstream_pool.stats()
+            if stats['submitted'] or stats['rejected'] or stats['active']:
+                log.info("upstream_pool", **stats)
+    
     def stop(self):
         """
         Stop the server
@@ -351,7 +1173,8 @@ class NewsServer:
         self.is_running = False
         if self.server_socket:
             self.server_socket.close()
-        print("[SERVER] Stopped")
+        log.info("server_stopped")
+        log.flush()
     
     def print_banner(self):
         """
@@ -372,8 +1195,62 @@ class NewsServer:
 def main():
     """
     Main function - program entry point
+    
+    python server_oop.py               -> one server process
+    python server_oop.py --workers 4   -> supervisor with 4 worker processes
     """
-    server = NewsServer(host='127.0.0.1', port=5000, group_id="GB5")
+    parser = argparse.ArgumentParser(description="News Service Server (OOP)")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=1,
+                        help="number of worker processes (uses SO_REUSEPORT)")
+    parser.add_argument('--cache-bytes', type=int, default=SHARED_CACHE_BYTES,
+                        help="size of the cache shared by the workers")
+    parser.add_argument('--max-sessions', type=int, default=MAX_SESSIONS,
+                        help="clients served at the same time")
+    parser.add_argument('--backlog', type=int, default=LISTEN_BACKLOG,
+                        help="listen() backlog")
+    parser.add_argument('--admission', choices=['reject', 'queue'], default=ADMISSION_POLICY,
+                        help="what to do with new clients when all sessions are taken")
+    parser.add_argument('--fifo', action='store_true',
+                        help="serve upstream calls first come, first served (no fair queuing)")
+    parser.add_argument('--admin-port', type=int, default=ADMIN_PORT,
+                        help="local port of /metrics (with --workers, worker N uses this + N)")
+    parser.add_argument('--record', metavar='FILE',
+                        help="append every session to FILE (replay with benchmark.py --replay)")
+    parser.add_argument('--log-level', choices=list(LEVELS), default=LOG_LEVEL,
+                        help="lowest level of the JSON log lines")
+    parser.add_argument('--log-file', metavar='FILE', default=LOG_PATH,
+                        help="append the log lines to FILE instead of stdout")
+    parser.add_argument('--trace-file', metavar='FILE', default=TRACE_PATH,
+                        help="append the traces of slow requests to FILE")
+    parser.add_argument('--trace-slow-ms', type=float, default=TRACE_SLOW_MS,
+                        help="requests slower than this go to the trace file")
+    args = parser.parse_args()
+    log.configure(level=args.log_level, path=args.log_file)  # Workers inherit it
+    
+    # Limits apply to each process (with --workers, to each worker)
+    server_options = {
+        'max_sessions': args.max_sessions,
+        'backlog': args.backlog,
+        'admission_policy': args.admission,
+        'fair_queuing': not args.fifo,
+        'admin_port': args.admin_port,
+        'trace_path': os.path.abspath(args.trace_file) if args.trace_file else None,
+        'trace_slow_ms': args.trace_slow_ms,
+    }
+    if args.record:
+        # One key for all workers: a client gets the same anonymous name everywhere
+        server_options['record_path'] = os.path.abspath(args.record)
+        server_options['record_key'] = secrets.token_hex(16)
+    
+    if args.workers > 1:
+        from supervisor import ServerSupervisor
+        ServerSupervisor(args.host, args.port, "GB5", args.workers, args.cache_bytes,
+                         server_options).run()
+        return
+    
+    server = NewsServer(host=args.host, port=args.port, group_id="GB5", **server_options)
     server.start()
 
 
@@ -0,0 +1,398 @@
+# ============================================================
+# Server Script - Event Loop (selectors)
+# ============================================================
+# Same protocol and menus as server.py, but one thread serves every
+# client. The sockets are non-blocking and the selectors module
+# (epoll on Linux) tells us which ones are ready. Each connection
+# keeps its own state (which menu it is in, what it is waiting for)
+# and its own input/output buffers, so partial frames are kept until
+# the rest arrives. NewsAPI calls are slow, so they run on a small
+# thread pool; the loop is woken up through a socket pair when a
+# result is ready.
+#
+# An idle connection costs one small Connection object and its
+# socket, so one process can hold 10k+ idle clients.
+
+import socket     # For network communication
+import selectors  # epoll/kqueue/select, whichever the OS has
+import struct     # For the length prefix
+import json       # For handling JSON
+import queue      # Finished work from the worker threads
+from concurrent.futures import ThreadPoolExecutor
+from news_handler import NewsHandler
+from cache import ResultCache, QueryCache
+from rate_limiter import RateLimiter
+from projection import project_response, project_header, iter_summaries
+from projection import lookup_item, lookup_page
+from structured_log import log  # The loop thread never waits for stdout
+from config import SELECTOR_WORKERS, MAX_FRAME_SIZE, LOG_SAMPLE_RATE
+
+try:
+    import resource  # Unix only: raise the open files limit
+except ImportError:
+    resource = None
+
+# ============================================================
+# Settings
+# ============================================================
+HOST = '127.0.0.1'  # IP address (localhost)
+PORT = 5000         # Port number
+GROUP_ID = "GB5"    # Group ID
+
+news_handler = NewsHandler(cache=QueryCache(), rate_limiter=RateLimiter())
+result_cache = ResultCache()
+
+selector = selectors.DefaultSelector()
+workers = ThreadPoolExecutor(max_workers=SELECTOR_WORKERS)
+finished = queue.Queue()          # (connection, frames) from the workers
+wakeup_reader, wakeup_writer = socket.socketpair()
+
+# Menu option -> (NewsHandler method, file name part)
+# Option '4' takes no parameter, the others wait for one after READY
+HEADLINE_OPTIONS = {
+    '1': ('search_headlines_by_keyword', 'keyword'),
+    '2': ('get_headlines_by_category', 'category'),
+    '3': ('get_headlines_by_country', 'country'),
+    '4': ('get_all_headlines', 'all_headlines'),
+}
+SOURCE_OPTIONS = {
+    '1': ('get_sources_by_category', 'sources_category'),
+    '2': ('get_sources_by_country', 'sources_country'),
+    '3': ('get_sources_by_language', 'sources_language'),
+    '4': ('get_all_sources', 'all_sources'),
+}
+MENUS = {'HEADLINES': HEADLINE_OPTIONS, 'SOURCES': SOURCE_OPTIONS}
+
+# ============================================================
+# Connection State
+# ============================================================
+
+class Connection:
+    """
+    State of one client connection
+
+    state is what the connection waits for:
+        'NAME'   - the client name (handshake)
+        'MAIN'   - a main menu choice
+        'HEADLINES' / 'SOURCES' - a submenu choice
+        'PARAM'  - the parameter of option `option`
+        'DETAIL' / 'NEXT' - an item ID / cursor
+        'BUSY'   - a worker is fetching; new frames stay buffered
+    """
+    __slots__ = ('sock', 'address', 'name', 'state', 'menu', 'option',
+                 'stream', 'inbuf', 'outbuf', 'closing', 'events')
+
+    def __init__(self, sock, address):
+        self.sock = sock
+        self.address = address
+        self.name = None
+        self.state = 'NAME'
+        self.menu = None       # 'HEADLINES' / 'SOURCES' while in a submenu
+        self.option = None     # option waiting for its parameter
+        self.stream = False
+        self.inbuf = bytearray()
+        self.outbuf = bytearray()
+        self.closing = False   # close once outbuf is sent
+        self.events = selectors.EVENT_READ
+
+# ============================================================
+# Frames and Buffers
+# ============================================================
+
+def encode_frame(message):
+    """Length prefix (4 bytes) + UTF-8 data, as in server.send_message"""
+    data = message.encode('utf-8')
+    return struct.pack('!I', len(data)) + data
+
+def set_events(conn, events):
+    if conn.events != events:
+        conn.events = events
+        selector.modify(conn.sock, events, conn)
+
+def queue_frames(conn, messages):
+    """
+    Add frames to the output buffer and send as much as the socket
+    takes now; the rest is sent when the socket becomes writable
+    """
+    for message in messages:
+        conn.outbuf += encode_frame(message)
+    flush(conn)
+
+def flush(conn):
+    try:
+        sent = conn.sock.send(conn.outbuf)
+        del conn.outbuf[:sent]
+    except (BlockingIOError, InterruptedError):
+        pass
+    except OSError:
+        close_connection(conn)
+        return
+
+    if conn.outbuf:
+        set_events(conn, selectors.EVENT_READ | selectors.EVENT_WRITE)
+    elif conn.closing:
+        close_connection(conn)
+    else:
+        set_events(conn, selectors.EVENT_READ)
+
+def next_frame(conn):
+    """
+    Take one complete frame from the input buffer
+
+    Returns:
+        message (string), or None if the frame is not complete yet
+    """
+    if len(conn.inbuf) < 4:
+        return None
+    length = struct.unpack_from('!I', conn.inbuf)[0]
+    if length > MAX_FRAME_SIZE:
+        raise ValueError(f"frame of {length} bytes")
+    if len(conn.inbuf) < 4 + length:
+        return None
+
+    message = bytes(conn.inbuf[4:4 + length]).decode('utf-8')
+    del conn.inbuf[:4 + length]
+    return message
+
+def close_connection(conn):
+    if conn.sock.fileno() == -1:
+        return  # Already closed
+    selector.unregister(conn.sock)
+    conn.sock.close()
+    log.info("session_closed", client=conn.name, address=conn.address)
+
+# ============================================================
+# Result Frames
+# ============================================================
+
+def page_frames(conn, data, result_id, start):
+    """
+    Frames for one page of summaries: one JSON frame, or header +
+    one frame per item + end when the client asked for streaming
+    """
+    if not conn.stream:
+        return [json.dumps(project_response(data, result_id, start))]
+
+    frames = [json.dumps(dict(project_header(data, result_id, start), type='header'))]
+    for item in iter_summaries(data, result_id, start):
+        frames.append(json.dumps({'type': 'item', 'item': item}))
+    frames.append(json.dumps({'type': 'end', 'count': len(frames) - 1}))
+    return frames
+
+def fetch_results(conn, method, file_part, parameter):
+    """
+    Runs on a worker thread: call NewsAPI, save the JSON file and
+    build the response frames. The loop sends them.
+    """
+    try:
+        fetch = getattr(news_handler, method)
+        data = fetch(parameter) if parameter is not None else fetch()
+        news_handler.save_to_json(data, f"{conn.name}_{file_part}_{GROUP_ID}.json")
+        frames = page_frames(conn, data, result_cache.put(data), 0)
+    except Exception as e:
+        log.error("fetch_error", client=conn.name, error=repr(e))
+        frames = [json.dumps({"status": "error", "message": str(e)})]
+
+    finished.put((conn, frames))
+    wakeup_writer.send(b'x')
+
+def start_fetch(conn, option, parameter):
+    method, file_part = MENUS[conn.menu][option]
+    log.info("search", client=conn.name, menu=conn.menu.lower(), option=option,
+             value=parameter, sample=LOG_SAMPLE_RATE)
+    conn.state = 'BUSY'
+    workers.submit(fetch_results, conn, method, file_part, parameter)
+
+# ============================================================
+# State Machine
+# ============================================================
+
+def handle_frame(conn, message):
+    """
+    Move a connection one step through the menu flow
+    Mirrors handle_client / handle_headlines_menu in server.py
+    """
+    state = conn.state
+
+    if state == 'NAME':
+        conn.name = message
+        conn.state = 'MAIN'
+        log.info("session_started", client=message, address=conn.address)
+        queue_frames(conn, ["CONNECTED"])
+
+    elif state == 'MAIN':
+        if message == '1':
+            conn.state = conn.menu = 'HEADLINES'
+            queue_frames(conn, ["HEADLINES"])
+        elif message == '2':
+            conn.state = conn.menu = 'SOURCES'
+            queue_frames(conn, ["SOURCES"])
+        elif message == '3':
+            log.info("bye", client=conn.name)
+            conn.closing = True
+            queue_frames(conn, ["BYE"])
+        elif message == 'STREAM':
+            conn.stream = True
+            queue_frames(conn, ["STREAMING"])
+        else:
+            queue_frames(conn, ["ERROR"])
+
+    elif state in MENUS:
+        if message == '5':
+            conn.state = 'MAIN'
+            conn.menu = None
+        elif message in ('DETAIL', 'NEXT'):
+            conn.state = message
+            queue_frames(conn, ["READY"])
+        elif message == '4':
+            start_fetch(conn, message, None)
+        elif message in MENUS[state]:
+            conn.state = 'PARAM'
+            conn.option = message
+            queue_frames(conn, ["READY"])
+        else:
+            queue_frames(conn, ["ERROR"])
+
+    elif state == 'PARAM':
+        start_fetch(conn, conn.option, message)
+
+    elif state == 'DETAIL':
+        # Served from the result cache, fast enough for the loop thread
+        conn.state = conn.menu
+        queue_frames(conn, [json.dumps(lookup_item(result_cache, message))])
+
+    elif state == 'NEXT':
+        conn.state = conn.menu
+        page = lookup_page(result_cache, message)
+        if isinstance(page, dict):
+            queue_frames(conn, page_frames(conn, page, None, 0))  # Error response
+        else:
+            queue_frames(conn, page_frames(conn, *page))
+
+def process_input(conn):
+    """Handle every complete buffered frame, unless a fetch is running"""
+    try:
+        while conn.state != 'BUSY' and not conn.closing and conn.sock.fileno() != -1:
+            message = next_frame(conn)
+            if message is None:
+                break
+            if not message:
+                close_connection(conn)  # Empty message = client gone
+                break
+            handle_frame(conn, message)
+    except ValueError as e:
+        log.warning("bad_frame", client=conn.name, address=conn.address, error=str(e))
+        close_connection(conn)
+
+# ============================================================
+# Event Handlers
+# ============================================================
+
+def accept_connections(server_socket):
+    """Accept every waiting connection"""
+    while True:
+        try:
+            client_socket, client_address = server_socket.accept()
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError as e:
+            log.error("accept_error", error=repr(e))  # e.g. out of file descriptors
+            return
+        client_socket.setblocking(False)
+        selector.register(client_socket, selectors.EVENT_READ, Connection(client_socket, client_address))
+
+def read_ready(conn):
+    try:
+        chunk = conn.sock.recv(65536)
+    except (BlockingIOError, InterruptedError):
+        return
+    except OSError:
+        chunk = b''
+
+    if not chunk:
+        close_connection(conn)
+        return
+
+    conn.inbuf += chunk
+    process_input(conn)
+
+def deliver_finished():
+    """Send the results the workers finished and resume those connections"""
+    try:
+        wakeup_reader.recv(4096)
+    except BlockingIOError:
+        pass
+
+    while True:
+        try:
+            conn, frames = finished.get_nowait()
+        except queue.Empty:
+            return
+        if conn.sock.fileno() == -1:
+            continue  # Client left while we were fetching
+        conn.state = conn.menu
+        queue_frames(conn, frames)
+        if conn.sock.fileno() != -1:
+            process_input(conn)
+
+# ============================================================
+# Start Server Function
+# ============================================================
+
+def raise_file_limit():
+    """Allow as many open sockets as the hard limit permits"""
+    if resource is None:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+def start_server():
+    raise_file_limit()
+
+    server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server_socket.bind((HOST, PORT))
+    server_socket.listen(1024)
+    server_socket.setblocking(False)
+
+    wakeup_reader.setblocking(False)
+    selector.register(server_socket, selectors.EVENT_READ, None)
+    selector.register(wakeup_reader, selectors.EVENT_READ, 'wakeup')
+
+    print("=" * 60)
+    print(f"NEWS SERVICE SERVER (Event loop) - Group {GROUP_ID}")
+    print("=" * 60)
+    print(f"Server listening on {HOST}:{PORT}")
+    print("Waiting for connections...")
+    print("=" * 60)
+
+    try:
+        while True:
+            for key, events in selector.select():
+                if key.data is None:
+                    accept_connections(key.fileobj)
+                elif key.data == 'wakeup':
+                    deliver_finished()
+                else:
+                    conn = key.data
+                    if events & selectors.EVENT_WRITE:
+                        flush(conn)
+                    if events & selectors.EVENT_READ and conn.sock.fileno() != -1:
+                        read_ready(conn)
+
+    except KeyboardInterrupt:
+        print("\n[SHUTTING DOWN] Server closing...")
+
+    finally:
+        workers.shutdown(wait=False)
+        server_socket.close()
+        log.info("server_stopped")
+        log.flush()
+
+# ============================================================
+# Entry Point
+# ============================================================
+
+if __name__ == "__main__":
+    start_server()
@@ -0,0 +1,93 @@
+# ============================================================
+# SessionStore Class - Resumable Sessions
+# ============================================================
+# Every session gets a token at the handshake ("CONNECTED <token>").
+# When its connection drops without BYE, the session's state (client
+# name, menu position, options and the last list sent) is parked here
+# for a while. A client that reconnects and sends "RESUME <token>"
+# gets that state back instead of starting from the main menu.
+
+import secrets    # For the session tokens
+import threading  # Shared by all client threads
+import time       # For expiry times
+from collections import OrderedDict
+from config import SESSION_RESUME_TTL, MAX_PARKED_SESSIONS
+
+
+class SessionStore:
+    """
+    Tokens of the connected sessions and the parked state of dropped ones
+    """
+
+    def __init__(self, ttl=SESSION_RESUME_TTL, max_parked=MAX_PARKED_SESSIONS):
+        """
+        Constructor
+
+        Parameters:
+            ttl: seconds a dropped session can be resumed
+            max_parked: dropped sessions kept (the oldest are forgotten)
+        """
+        self.ttl = ttl
+        self.max_parked = max_parked
+        self.active = {}              # token -> ClientHandler still connected
+        self.parked = OrderedDict()   # token -> (expires_at, state)
+        self.condition = threading.Condition()
+
+    def issue(self, handler):
+        """
+        New token for a connected session
+
+        Returns:
+            token string
+        """
+        token = secrets.token_urlsafe(12)
+        with self.condition:
+            self.active[token] = handler
+        return token
+
+    def park(self, token, state):
+        """The connection of a session dropped: keep its state for ttl seconds"""
+        with self.condition:
+            self.active.pop(token, None)
+            now = time.monotonic()
+            self.parked[token] = (now + self.ttl, state)
+            # Oldest first: drop the expired ones and any over the limit
+            while self.parked and (len(self.parked) > self.max_parked or
+                                   next(iter(self.parked.values()))[0] < now):
+                self.parked.popitem(last=False)
+            self.condition.notify_all()
+
+    def forget(self, token):
+        """The session ended with BYE: it cannot be resumed"""
+        with self.condition:
+            self.active.pop(token, None)
+            self.parked.pop(token, None)
+
+    def take(self, token, wait=2.0):
+        """
+        Hand the state of a session to the connection resuming it
+
+        If the old connection is still open on the server (the client saw
+        the drop first), it is closed and parked before it is resumed
+
+        Parameters:
+            token: token sent with RESUME
+            wait: seconds to wait for the old connection to park
+
+        Returns:
+            state dictionary, or None if the token is unknown or expired
+        """
+        with self.condition:
+            old = self.active.get(token)
+            if old is not None:
+                old.close_session("resumed by a new connection")
+                self.condition.wait_for(lambda: token not in self.active, wait)
+
+            entry = self.parked.pop(token, None)
+            if entry is None or entry[0] < time.monotonic():
+                return None
+            return entry[1]
+
+    def count(self):
+        with self.condition:
+            return len(self.parked)
@@ -0,0 +1,248 @@
+# ============================================================
+# SharedQueryCache Class - Cross-process Response Cache
+# ============================================================
+# When the server runs as several worker processes, each one would
+# have its own QueryCache and fetch the same queries again. This
+# cache lives in one memory-mapped file (in /dev/shm when available)
+# that all workers on the host open, so a fetch by one worker is
+# visible to all of them.
+#
+# File layout:
+#   header  (64 bytes)   magic, slot count, data size, write position
+#   index   (32 bytes per slot)
+#   data    ring buffer of entries: key length, value length, CRC,
+#           key bytes, JSON bytes
+#
+# Reads take no lock: every index slot has a sequence number that is
+# odd while a writer changes it, and every entry has a CRC. A read
+# that races with a writer is treated as a cache miss. Writers are
+# serialized with a file lock (between processes) and a thread lock
+# (inside a process).
+
+import fcntl      # File lock shared by all processes
+import hashlib    # Stable key hash (same in every process)
+import json       # Values are stored as JSON
+import mmap       # Shared memory mapping
+import os         # For file handling
+import struct     # For the binary layout
+import threading  # Threads of one process share the file descriptor
+import time       # For expiry times
+import zlib       # CRC of each entry
+from config import SHARED_CACHE_BYTES, SHARED_CACHE_SLOTS, QUERY_CACHE_TTL
+
+MAGIC = b'GB5C'
+HEADER = struct.Struct('<4sIQQ')   # magic, slot count, data size, write position
+HEADER_SIZE = 64
+WRITE_POS_OFFSET = 16              # offset of the write position in the header
+SLOT = struct.Struct('<IQQId')     # sequence, key hash, position, length, expires at
+ENTRY = struct.Struct('<III')      # key length, value length, CRC
+PROBE = 4                          # slots checked for each key
+
+
+def key_hash(key):
+    """64-bit hash of a query key (Python's hash() differs between processes)"""
+    return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def default_cache_path(port):
+    """Shared memory file for the server on this port"""
+    folder = '/dev/shm' if os.path.isdir('/dev/shm') else '/tmp'
+    return os.path.join(folder, f'news_cache_{port}.bin')
+
+
+class SharedQueryCache:
+    """
+    QueryCache with the same get()/put() methods, stored in a file
+    that several processes map into memory
+    """
+
+    @staticmethod
+    def create(path, capacity=SHARED_CACHE_BYTES, slots=SHARED_CACHE_SLOTS):
+        """
+        Create (or reset) the cache file before the workers start
+
+        Parameters:
+            path: file to create
+            capacity: bytes available for cached responses
+            slots: number of index entries
+        """
+        with open(path, 'wb') as f:
+            f.truncate(HEADER_SIZE + slots * SLOT.size + capacity)
+            f.write(HEADER.pack(MAGIC, slots, capacity, 0))
+
+    def __init__(self, path, ttl=QUERY_CACHE_TTL):
+        """
+        Open a cache file created with SharedQueryCache.create()
+
+        Parameters:
+            path: the cache file
+            ttl: seconds before a stored response expires
+        """
+        self.path = path
+        self.ttl = ttl
+        self.file = open(path, 'r+b')
+        self.map = mmap.mmap(self.file.fileno(), 0)
+        self.thread_lock = threading.Lock()
+
+        magic, self.slots, self.data_size, _ = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a shared cache file")
+
+        self.index_start = HEADER_SIZE
+        self.data_start = HEADER_SIZE + self.slots * SLOT.size
+        self.hits = 0
+        self.misses = 0
+
+    # ============================================================
+    # Reading (no lock)
+    # ============================================================
+
+    def write_position(self):
+        return struct.unpack_from('<Q', self.map, WRITE_POS_OFFSET)[0]
+
+    def read_slot(self, index):
+        """
+        Read one index slot consistently
+
+        Returns:
+            (key hash, position, length, expires at) or None if a
+            writer kept changing the slot
+        """
+        offset = self.index_start + index * SLOT.size
+        for _ in range(3):
+            seq, hashed, position, length, expires_at = SLOT.unpack_from(self.map, offset)
+            if seq & 1:
+                continue  # A writer is changing this slot
+            if struct.unpack_from('<I', self.map, offset)[0] == seq:
+                return hashed, position, length, expires_at
+        return None
+
+    def get(self, key):
+        """
+        Look up a cached response
+
+        Returns:
+            the cached dictionary, or None if missing, expired or
+            overwritten while reading
+        """
+        return self.get_entry(key)[0]
+
+    def get_entry(self, key):
+        """
+        Look up a cached response and when it expires
+
+        Returns:
+            (the cached dictionary, expiry time as time.time()), or
+            (None, None) if missing, expired or overwritten while reading
+        """
+        hashed = key_hash(key)
+        for i in range(PROBE):
+            slot = self.read_slot((hashed + i) % self.slots)
+            if slot is None or slot[0] != hashed or slot[2] == 0:
+                continue
+
+            data = self.read_entry(key, *slot[1:])
+            if data is not None:
+                self.hits += 1
+                return data, slot[3]
+
+        self.misses += 1
+        return None, None
+
+    def read_entry(self, key, position, length, expires_at):
+        """Copy one entry out of the ring buffer and check it is intact"""
+        if expires_at < time.time():
+            return None
+
+        # The entry is intact until the writer has moved a full lap past it
+        if self.write_position() > position + self.data_size:
+            return None
+
+        start = self.data_start + position % self.data_size
+        raw = self.map[start:start + length]
+
+        if self.write_position() > position + self.data_size:
+            return None  # Overwritten while we were copying
+
+        key_length, value_length, crc = ENTRY.unpack_from(raw, 0)
+        body = raw[ENTRY.size:ENTRY.size + key_length + value_length]
+        if len(body) != key_length + value_length or zlib.crc32(body) != crc:
+            return None
+        if body[:key_length] != key.encode('utf-8'):
+            return None  # Different key with the same hash
+
+        return json.loads(body[key_length:])
+
+    # ============================================================
+    # Writing (file lock + thread lock)
+    # ============================================================
+
+    def put(self, key, data):
+        """Store a response so every process can read it"""
+        key_bytes = key.encode('utf-8')
+        value = json.dumps(data).encode('utf-8')
+        body = key_bytes + value
+        entry = ENTRY.pack(len(key_bytes), len(value), zlib.crc32(body)) + body
+
+        if len(entry) > self.data_size // 4:
+            return  # Too big for the ring buffer
+
+        hashed = key_hash(key)
+        with self.thread_lock:
+            fcntl.flock(self.file.fileno(), fcntl.LOCK_EX)
+            try:
+                index = self.choose_slot(hashed)
+                position = self.reserve(len(entry))
+
+                start = self.data_start + position % self.data_size
+                self.map[start:start + len(entry)] = entry
+
+                self.write_slot(index, hashed, position, len(entry), time.time() + self.ttl)
+            finally:
+                fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+
+    def choose_slot(self, hashed):
+        """
+        Pick the index slot for a key: the slot it already uses,
+        else an empty or expired one, else the one expiring first
+        """
+        candidates = []
+        now = time.time()
+        for i in range(PROBE):
+            index = (hashed + i) % self.slots
+            _, slot_hash, _, length, expires_at = SLOT.unpack_from(
+                self.map, self.index_start + index * SLOT.size)
+            if slot_hash == hashed and length:
+                return index
+            if length == 0 or expires_at < now:
+                return index
+            candidates.append((expires_at, index))
+        return min(candidates)[1]
+
+    def reserve(self, length):
+        """
+        Reserve space in the ring buffer (entries never wrap around)
+        The write position moves before the data is written, so readers
+        of the old data there notice it is being overwritten
+
+        Returns:
+            the position of the entry
+        """
+        position = self.write_position()
+        offset = position % self.data_size
+        if offset + length > self.data_size:
+            position += self.data_size - offset  # Skip to the start
+        struct.pack_into('<Q', self.map, WRITE_POS_OFFSET, position + length)
+        return position
+
+    def write_slot(self, index, hashed, position, length, expires_at):
+        """Update one index slot (sequence is odd while it changes)"""
+        offset = self.index_start + index * SLOT.size
+        seq = struct.unpack_from('<I', self.map, offset)[0]
+        struct.pack_into('<I', self.map, offset, (seq + 1) & 0xFFFFFFFF)
+        SLOT.pack_into(self.map, offset, (seq + 1) & 0xFFFFFFFF, hashed, position, length, expires_at)
+        struct.pack_into('<I', self.map, offset, (seq + 2) & 0xFFFFFFFF)
+
+    def close(self):
+        self.map.close()
+        self.file.close()
@@ -0,0 +1,164 @@
+# ============================================================
+# StructuredLogger Class - Non-Blocking JSON Line Logging
+# ============================================================
+# The client threads used to print() several lines per request. Every
+# print() takes stdout's lock and waits for the terminal or pipe, so
+# a slow reader of the log slowed down every request.
+#
+# Now a request thread only puts a tuple on a bounded queue (never
+# waits: if the queue is full the line is dropped and counted). One
+# background thread formats the lines as JSON and writes them:
+#
+#   {"ts": "2026-10-19T12:00:00.125Z", "level": "info", "event": "search",
+#    "thread": "client-7", "client": "alice", "menu": "headlines",
+#    "filter": "country", "value": "us"}
+#
+# Levels: debug < info < warning < error. High-volume lines can be
+# sampled: log.info(..., sample=0.1) keeps about one line in ten.
+# Warnings and errors are never sampled.
+
+import json       # One JSON object per line
+import os         # Appending from several worker processes
+import queue      # Hand-off to the writer thread
+import random     # Sampling
+import sys        # Default output
+import threading  # The writer thread
+import time       # Timestamps
+from config import LOG_LEVEL, LOG_QUEUE_SIZE, LOG_PATH
+
+LEVELS = {'debug': 10, 'info': 20, 'warning': 30, 'error': 40}
+
+
+class StructuredLogger:
+    """
+    Queues log records and writes them as JSON lines in the background
+    """
+
+    def __init__(self, level=LOG_LEVEL, queue_size=LOG_QUEUE_SIZE, path=LOG_PATH):
+        """
+        Constructor
+
+        Parameters:
+            level: lowest level written ('debug', 'info', 'warning', 'error')
+            queue_size: records waiting for the writer; more are dropped
+            path: file the lines are appended to (None = stdout)
+        """
+        self.level = LEVELS[level]
+        self.path = path
+        self.records = queue.Queue(queue_size)
+        self.dropped = 0   # Records lost because the queue was full
+        self.written = 0
+        self.writer = None
+        self.lock = threading.Lock()  # Only for starting the writer
+
+    def configure(self, level=None, path=None):
+        """Change the level or the output (before the first record is written)"""
+        if level is not None:
+            self.level = LEVELS[level]
+        if path is not None:
+            self.path = path
+
+    def enabled(self, level):
+        return LEVELS[level] >= self.level
+
+    def log(self, level, event, sample=1.0, **fields):
+        """
+        Queue one record (never blocks)
+
+        Parameters:
+            level: 'debug', 'info', 'warning' or 'error'
+            event: short name of what happened, e.g. 'search'
+            sample: fraction of these records kept (1.0 = all)
+            fields: values of the record (anything json can write, or str())
+        """
+        number = LEVELS[level]
+        if number < self.level:
+            return
+        if sample < 1.0 and number < LEVELS['warning'] and random.random() >= sample:
+            return
+        if self.writer is None:
+            self.start()
+
+        # Only the cheap parts here; the writer formats the line
+        record = (time.time(), level, event, threading.current_thread().name, fields)
+        try:
+            self.records.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1  # Not exact under races, good enough for a counter
+
+    def debug(self, event, sample=1.0, **fields):
+        self.log('debug', event, sample, **fields)
+
+    def info(self, event, sample=1.0, **fields):
+        self.log('info', event, sample, **fields)
+
+    def warning(self, event, sample=1.0, **fields):
+        self.log('warning', event, sample, **fields)
+
+    def error(self, event, sample=1.0, **fields):
+        self.log('error', event, sample, **fields)
+
+    # ============================================================
+    # Writer Thread
+    # ============================================================
+
+    def start(self):
+        with self.lock:
+            if self.writer is None:
+                self.writer = threading.Thread(target=self.write_loop, name="log-writer",
+                                               daemon=True)
+                self.writer.start()
+
+    def format(self, record):
+        timestamp, level, event, thread, fields = record
+        seconds = int(timestamp)
+        line = {
+            'ts': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(seconds))
+                  + f".{int((timestamp - seconds) * 1000):03d}Z",
+            'level': level,
+            'event': event,
+            'thread': thread,
+        }
+        line.update(fields)
+        return json.dumps(line, ensure_ascii=False, default=str)
+
+    def write_loop(self):
+        # O_APPEND + one write() per batch: lines of different workers do not mix
+        fd = None
+        if self.path:
+            fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        while True:
+            lines = [self.format(self.records.get())]
+            # Write everything that is waiting in one go
+            while len(lines) < 256:
+                try:
+                    lines.append(self.format(self.records.get_nowait()))
+                except queue.Empty:
+                    break
+
+            dropped, self.dropped = self.dropped, 0
+            if dropped:
+                lines.append(self.format((time.time(), 'warning', 'log_dropped',
+                                          threading.current_thread().name,
+                                          {'records': dropped})))
+            text = '\n'.join(lines) + '\n'
+            try:
+                if fd is not None:
+                    os.write(fd, text.encode('utf-8'))
+                else:
+                    sys.stdout.write(text)
+                    sys.stdout.flush()
+            except (OSError, ValueError):
+                pass  # Nowhere to report it; the request threads are not affected
+            self.written += len(lines)
+
+    def flush(self, timeout=1.0):
+        """Wait (up to timeout seconds) until the queued records are written"""
+        deadline = time.monotonic() + timeout
+        while not self.records.empty() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        time.sleep(0.01)  # The last batch may still be in write()
+
+
+# One logger per process, shared by all modules
+log = StructuredLogger()
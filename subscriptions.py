@@ -0,0 +1,204 @@
+# ============================================================
+# SubscriptionManager Class - Push Subscriptions
+# ============================================================
+# Clients subscribe to a headlines query (keyword, category and/or
+# country) instead of asking for it again and again. A refresh loop
+# fetches every subscribed query once per interval - one upstream
+# call however many clients subscribed to it - and pushes only the
+# articles it has not seen before to each subscriber:
+#
+#   {"type": "push", "subscription": "...", "result_id": "...",
+#    "articles": [summaries]}
+#
+# The articles are kept in the result cache, so DETAIL works on them.
+# The refresh thread never sends itself: handler.push() only queues the
+# frame in the session's outbox, so one client that stops reading does
+# not hold up the pushes to everybody else (its session is closed when
+# the outbox is full).
+
+import json       # For the push frames
+import threading  # Refresh loop + shared by all client threads
+import time       # For the refresh interval
+from news_handler import make_query_key, BATCH_FILTERS
+from projection import iter_summaries
+from structured_log import log
+from config import SUBSCRIPTION_REFRESH_INTERVAL, MAX_SUBSCRIPTIONS, SUBSCRIPTION_SEEN_LIMIT
+from config import LOG_SAMPLE_RATE
+
+
+class SubscriptionManager:
+    """
+    Keeps the subscribers of each query and pushes new articles to them
+    """
+
+    def __init__(self, news_handler, result_cache, interval=SUBSCRIPTION_REFRESH_INTERVAL):
+        """
+        Constructor
+
+        Parameters:
+            news_handler: NewsHandler used for the refreshes
+            result_cache: ResultCache for the pushed articles (DETAIL)
+            interval: seconds between refreshes
+        """
+        # Refreshes are charged to their own client in the upstream pool
+        self.news_handler = news_handler.for_client("__subscriptions__")
+        self.result_cache = result_cache
+        self.interval = interval
+        self.subscribers = {}  # key -> set of ClientHandler
+        self.filters = {}      # key -> filters of the query
+        self.seen = {}         # key -> {url: None}, oldest first
+        self.lock = threading.Lock()
+        self.is_running = False
+
+    # ============================================================
+    # Subscribe / Unsubscribe
+    # ============================================================
+
+    @staticmethod
+    def subscription_key(filters):
+        return make_query_key('headlines', filters)
+
+    def subscribe(self, handler, filters):
+        """
+        Subscribe a client to a headlines query
+
+        Parameters:
+            handler: ClientHandler of the client (pushes go to handler.push)
+            filters: dictionary with q, category and/or country
+
+        Returns:
+            response dictionary for the client
+        """
+        allowed = BATCH_FILTERS['headlines']
+        if not isinstance(filters, dict) or not filters:
+            return {"status": "error", "message": "Subscription needs a keyword, category or country"}
+        unknown = [name for name in filters if name not in allowed]
+        if unknown:
+            return {"status": "error", "message": f"Unknown filter: {', '.join(unknown)}"}
+
+        key = self.subscription_key(filters)
+        with self.lock:
+            mine = [k for k, handlers in self.subscribers.items() if handler in handlers]
+            if key not in mine and len(mine) >= MAX_SUBSCRIPTIONS:
+                return {"status": "error", "message": f"At most {MAX_SUBSCRIPTIONS} subscriptions"}
+            is_new = key not in self.subscribers
+
+        if is_new:
+            # What the client can already see is not news: remember it
+            data = self.news_handler.get_headlines(**dict(filters))
+            if data.get('status') != 'ok':
+                return data
+
+        with self.lock:
+            if key not in self.subscribers:
+                self.subscribers[key] = set()
+                self.filters[key] = dict(filters)
+                self.seen[key] = {}
+                if is_new:
+                    self.remember(key, data.get('articles') or [])
+            self.subscribers[key].add(handler)
+            count = len(self.subscribers[key])
+
+        log.info("subscription_added", client=handler.client_name, subscription=key,
+                 subscribers=count, sample=LOG_SAMPLE_RATE)
+        return {"status": "ok", "subscription": key}
+
+    def unsubscribe(self, handler, filters):
+        """
+        Remove one subscription of a client
+
+        Returns:
+            response dictionary for the client
+        """
+        key = self.subscription_key(filters) if isinstance(filters, dict) else None
+        with self.lock:
+            if key not in self.subscribers or handler not in self.subscribers[key]:
+                return {"status": "error", "message": "Not subscribed"}
+            self.drop(handler, key)
+        return {"status": "ok", "subscription": key}
+
+    def unsubscribe_all(self, handler):
+        """Remove every subscription of a client (it disconnected)"""
+        with self.lock:
+            for key in [k for k, handlers in self.subscribers.items() if handler in handlers]:
+                self.drop(handler, key)
+
+    def drop(self, handler, key):
+        """Remove one subscriber (the caller holds the lock)"""
+        self.subscribers[key].discard(handler)
+        if not self.subscribers[key]:
+            # Nobody listens any more: stop refreshing this query
+            del self.subscribers[key]
+            del self.filters[key]
+            del self.seen[key]
+
+    # ============================================================
+    # Refresh Loop
+    # ============================================================
+
+    def remember(self, key, articles):
+        """
+        Note the URLs of the articles and return the ones not seen before
+        (the caller holds the lock)
+        """
+        seen = self.seen[key]
+        new = []
+        for article in articles:
+            url = article.get('url')
+            if not url or url in seen:
+                continue
+            seen[url] = None
+            new.append(article)
+
+        while len(seen) > SUBSCRIPTION_SEEN_LIMIT:
+            del seen[next(iter(seen))]  # Forget the oldest URL
+        return new
+
+    def refresh(self):
+        """
+        One round: fetch every subscribed query once and push its new
+        articles to all of its subscribers
+        """
+        with self.lock:
+            queries = dict(self.filters)
+
+        for key, filters in queries.items():
+            data = self.news_handler.get_headlines(fresh=True, **dict(filters))
+            if data.get('status') != 'ok':
+                log.warning("subscription_refresh_failed", subscription=key,
+                            message=data.get('message'))
+                continue
+
+            with self.lock:
+                if key not in self.subscribers:
+                    continue  # Everybody left meanwhile
+                new = self.remember(key, data.get('articles') or [])
+                handlers = list(self.subscribers[key])
+
+            if not new:
+                continue
+
+            pushed = {"status": "ok", "totalResults": len(new), "articles": new}
+            result_id = self.result_cache.put(pushed)
+            frame = json.dumps({
+                "type": "push",
+                "subscription": key,
+                "result_id": result_id,
+                "articles": list(iter_summaries(pushed, result_id, 0, len(new))),
+            })
+            queued = sum(1 for handler in handlers if handler.push(frame))
+            log.info("subscription_push", subscription=key, articles=len(new),
+                     subscribers=len(handlers), skipped=len(handlers) - queued)
+
+    def run(self):
+        """Refresh loop (runs in its own thread)"""
+        self.is_running = True
+        while self.is_running:
+            time.sleep(self.interval)
+            try:
+                self.refresh()
+            except Exception as e:
+                log.error("subscriptions_error", error=repr(e))
+
+    def stop(self):
+        self.is_running = False
@@ -0,0 +1,144 @@
+# ============================================================
+# ServerSupervisor Class - Multi-process Server
+# ============================================================
+# Runs several NewsServer worker processes on the same port.
+# Each worker binds with SO_REUSEPORT and runs the normal accept
+# loop, so JSON encoding and file saving are spread over all CPU
+# cores instead of sharing one process (and one GIL).
+# All workers share one SharedQueryCache, so a query fetched by one
+# worker is answered from the cache by the others.
+#
+# Usage:
+#   python server_oop.py --workers 4
+
+import multiprocessing  # For the worker processes
+import os               # For removing the shared cache file
+import signal           # For stopping cleanly on SIGTERM
+import socket           # For checking SO_REUSEPORT support
+import time             # For the monitor loop
+from server_oop import NewsServer
+from shared_cache import SharedQueryCache, default_cache_path
+from config import WORKER_RESTART_DELAY, SHARED_CACHE_BYTES
+
+
+def run_worker(host, port, group_id, shared_cache_path, server_options):
+    """
+    Entry point of one worker process
+    Runs a normal NewsServer bound with SO_REUSEPORT
+    """
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)  # Not the supervisor's handler
+    server = NewsServer(host=host, port=port, group_id=group_id, reuse_port=True,
+                        shared_cache_path=shared_cache_path, **server_options)
+    server.start()
+
+
+class ServerSupervisor:
+    """
+    Starts the worker processes and restarts any worker that exits
+    """
+
+    def __init__(self, host='127.0.0.1', port=5000, group_id="GB5", workers=2,
+                 cache_bytes=SHARED_CACHE_BYTES, server_options=None):
+        """
+        Constructor
+
+        Parameters:
+            host: IP address shared by all workers
+            port: port shared by all workers
+            group_id: group ID (GB5)
+            workers: number of worker processes
+            cache_bytes: capacity of the shared cache in bytes
+            server_options: extra NewsServer arguments for every worker
+                            (max_sessions, backlog, admission_policy, ...)
+        """
+        if not hasattr(socket, 'SO_REUSEPORT'):
+            raise RuntimeError("SO_REUSEPORT is not supported on this platform")
+
+        self.host = host
+        self.port = port
+        self.group_id = group_id
+        self.worker_count = workers
+        self.workers = [None] * workers      # one Process per slot
+        self.restart_at = [0.0] * workers    # when a failed slot may restart
+        self.cache_bytes = cache_bytes
+        self.server_options = server_options or {}
+        self.cache_path = default_cache_path(port)
+        self.is_running = False
+
+    def start_worker(self, slot):
+        """Start (or restart) the worker in one slot"""
+        options = dict(self.server_options)
+        if options.get('admin_port'):
+            options['admin_port'] += slot  # Every worker serves its own metrics
+        process = multiprocessing.Process(
+            target=run_worker,
+            args=(self.host, self.port, self.group_id, self.cache_path, options),
+            daemon=True
+        )
+        process.start()
+        self.workers[slot] = process
+        print(f"[SUPERVISOR] Worker {slot} started (pid {process.pid})")
+
+    def check_workers(self):
+        """Restart every worker that has exited"""
+        now = time.monotonic()
+        for slot, process in enumerate(self.workers):
+            if process is not None and process.is_alive():
+                continue
+
+            if process is not None:
+                print(f"[SUPERVISOR] Worker {slot} (pid {process.pid}) exited "
+                      f"with code {process.exitcode}, restarting")
+                self.workers[slot] = None
+                self.restart_at[slot] = now + WORKER_RESTART_DELAY
+
+            # Wait a little so a worker that fails at startup does not spin
+            if now >= self.restart_at[slot]:
+                self.start_worker(slot)
+
+    def run(self):
+        """
+        Start all workers and watch them until Ctrl+C
+        """
+        self.is_running = True
+        print(f"[SUPERVISOR] Starting {self.worker_count} workers on {self.host}:{self.port}")
+
+        SharedQueryCache.create(self.cache_path, self.cache_bytes)
+        print(f"[SUPERVISOR] Shared cache: {self.cache_path} ({self.cache_bytes} bytes)")
+
+        for slot in range(self.worker_count):
+            self.start_worker(slot)
+
+        # `kill` stops the loop like Ctrl+C, so the workers and the cache file are cleaned up
+        signal.signal(signal.SIGTERM, lambda signum, frame: self.request_stop())
+
+        try:
+            while self.is_running:
+                time.sleep(0.5)
+                self.check_workers()
+
+        except KeyboardInterrupt:
+            print("\n[SUPERVISOR] Shutting down workers...")
+
+        finally:
+            self.stop()
+
+    def request_stop(self):
+        """Ask the monitor loop to stop (used by the SIGTERM handler)"""
+        self.is_running = False
+
+    def stop(self):
+        """
+        Stop all workers
+        """
+        self.is_running = False
+        for process in self.workers:
+            if process is not None and process.is_alive():
+                process.terminate()
+        for process in self.workers:
+            if process is not None:
+                process.join(timeout=5)
+
+        if os.path.exists(self.cache_path):
+            os.remove(self.cache_path)
+        print("[SUPERVISOR] Stopped")
@@ -0,0 +1,110 @@
+# ============================================================
+# TrafficRecorder Class - Session Recording for Replay
+# ============================================================
+# With `server_oop.py --record FILE` every session is written to FILE
+# when it ends, one JSON line per session:
+#
+#   {"t": 1760860800.125, "f": [[0, "u-3f9a1c02de", 1], [840, "1", 1],
+#                               [2310, "3", 1], [2950, "sa", 1, "r17"], ...]}
+#
+#   t: wall clock time the session started
+#   m: menu a resumed session started in (only if not 'main')
+#   f: the frames the client sent, each [ms since the start, frame,
+#      responses sent back, result IDs of the first list response].
+#      The first frame is the anonymized client name.
+#
+# Client names are replaced by a keyed hash: the same client gets the
+# same name within a recording (fair queuing sees the same clients),
+# but the real name cannot be read back. PING/PONG and pushed updates
+# are not recorded. benchmark.py --replay plays the file back.
+
+import hashlib    # For anonymizing client names
+import hmac       # Keyed hash, so names cannot be guessed back
+import json       # One JSON line per session
+import os         # Appending from several worker processes
+import re         # Result IDs of list responses
+import secrets    # Key of the name hash
+import time       # Frame times
+
+RESULT_ID = re.compile(r'"result_id": "([^"]+)"')
+
+
+class TrafficRecorder:
+    """
+    Writes the recorded sessions to one file (shared by all workers)
+    """
+
+    def __init__(self, path, key=None):
+        """
+        Constructor
+
+        Parameters:
+            path: file the sessions are appended to
+            key: key of the name hash (the supervisor gives all workers
+                 the same one); random if not given
+        """
+        self.path = path
+        self.key = (key or secrets.token_hex(16)).encode('utf-8')
+        # O_APPEND + one write() per session: lines of different
+        # workers do not mix
+        self.fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+
+    def anonymize(self, client_name):
+        digest = hmac.new(self.key, client_name.encode('utf-8'), hashlib.sha256).hexdigest()
+        return f"u-{digest[:10]}"
+
+    def start(self, client_name, menu='main'):
+        """
+        Start recording a session after its handshake
+
+        Returns:
+            SessionRecording of the session
+        """
+        return SessionRecording(self.anonymize(client_name), menu)
+
+    def finish(self, recording):
+        """The session ended: append it to the file"""
+        line = json.dumps(recording.to_dict(), ensure_ascii=False, separators=(',', ':')) + '\n'
+        try:
+            os.write(self.fd, line.encode('utf-8'))
+        except OSError as e:
+            print(f"[RECORD] Could not write session: {e}")
+
+
+class SessionRecording:
+    """
+    Frames of one session
+    """
+
+    def __init__(self, client, menu='main'):
+        self.started_at = time.time()
+        self.started = time.monotonic()
+        self.menu = menu
+        self.frames = [[0, client, 0]]  # The handshake
+
+    def request(self, message):
+        """A frame from the client"""
+        self.frames.append([round(1000 * (time.monotonic() - self.started)), message, 0])
+
+    def response(self, message):
+        """
+        A response to the last frame (a string, or the header of a
+        streamed list): counted, and the result IDs of a list are kept
+        so the replayer can map DETAIL IDs and NEXT cursors
+        """
+        frame = self.frames[-1]
+        frame[2] += 1
+        if len(frame) > 3:
+            return
+        if isinstance(message, dict):
+            result_ids = [message['result_id']] if message.get('result_id') else []
+        else:
+            result_ids = RESULT_ID.findall(message) if message.startswith('{') else []
+        if result_ids:
+            frame.append(' '.join(result_ids))  # Several for a BATCH
+
+    def to_dict(self):
+        session = {'t': round(self.started_at, 3), 'f': self.frames}
+        if self.menu != 'main':
+            session['m'] = self.menu
+        return session
@@ -0,0 +1,329 @@
+# ============================================================
+# UpstreamPool Class - Bounded Pool for NewsAPI Calls
+# ============================================================
+# Client threads do not call NewsAPI themselves; they hand the call
+# to this pool and wait for the result. At most `workers` calls run
+# at the same time and at most `max_queue` wait for a worker. When
+# the queue is full the call is refused at once, so the server can
+# answer "busy, retry after N seconds" instead of piling up work.
+#
+# Fair queuing: every client (client name) has its own queue. Each
+# call gets a finish tag = max(virtual time, client's last tag) +
+# 1 / weight, and the workers always start the call with the lowest
+# tag. A client that sends a lot of calls only pushes its own tags
+# forward, so the calls of other clients still start quickly. On top
+# of that each client has caps on running calls, waiting calls and
+# calls per second.
+#
+# The pool measures the time a call waits in the queue separately
+# from the time it runs, plus how busy the workers are and how
+# evenly they were shared between clients.
+
+import math       # For rounding the retry delay up
+import threading  # Worker threads
+import time       # For measuring
+from collections import deque
+from concurrent.futures import Future
+from rate_limiter import RateLimiter
+from profiler import profiler
+from config import UPSTREAM_WORKERS, UPSTREAM_QUEUE_SIZE, FAIR_QUEUING
+from config import CLIENT_MAX_CONCURRENT, CLIENT_MAX_QUEUED, CLIENT_RATE_LIMIT
+from config import CLIENT_BURST, CLIENT_WEIGHTS
+
+
+class UpstreamPool:
+    """
+    Fixed number of worker threads with bounded per-client queues
+    """
+
+    def __init__(self, workers=UPSTREAM_WORKERS, max_queue=UPSTREAM_QUEUE_SIZE,
+                 fair=FAIR_QUEUING, weights=None):
+        """
+        Constructor
+
+        Parameters:
+            workers: calls that can run at the same time
+            max_queue: calls that can wait for a worker (all clients)
+            fair: fair queuing between clients; False = one FIFO queue
+                  and no per-client caps
+            weights: client name -> weight (bigger = bigger share)
+        """
+        self.workers = workers
+        self.max_queue = max_queue
+        self.fair = fair
+        self.weights = CLIENT_WEIGHTS if weights is None else weights
+        self.queues = {}        # client -> deque of (tag, function, args, future, time queued)
+        self.queued = 0         # calls waiting (all clients)
+        self.running = {}       # client -> calls running now
+        self.last_tag = {}      # client -> finish tag of its last queued call
+        self.limiters = {}      # client -> RateLimiter
+        self.virtual_time = 0.0 # tag of the last call started
+        self.active = 0         # calls running now (all clients)
+        self.recent_wait = 0.0  # moving average of the queue wait (seconds)
+        self.condition = threading.Condition()
+        self.reset_stats()
+
+        for i in range(workers):
+            threading.Thread(target=self.worker_loop, name=f"upstream-{i}", daemon=True).start()
+
+    def submit(self, function, *args, client=None):
+        """
+        Queue a call
+
+        Parameters:
+            function, args: the call
+            client: client name the call is made for
+
+        Returns:
+            Future with the call's result, or None if the queue (or the
+            client's share of it) is full - the caller answers "busy"
+        """
+        if not self.fair:
+            client = None  # Everybody shares one queue
+
+        with self.condition:
+            queue = self.queues.get(client)
+            waiting = len(queue) if queue else 0
+            if self.queued >= self.max_queue or (self.fair and waiting >= CLIENT_MAX_QUEUED):
+                self.rejected += 1
+                self.client_stats(client)['rejected'] += 1
+                return None
+
+            weight = self.weights.get(client, 1)
+            tag = max(self.virtual_time, self.last_tag.get(client, 0.0)) + 1.0 / weight
+            self.last_tag[client] = tag
+
+            future = Future()
+            if queue is None:
+                queue = self.queues[client] = deque()
+            queue.append((tag, function, args, future, time.monotonic()))
+            self.queued += 1
+            self.submitted += 1
+            self.client_stats(client)['submitted'] += 1
+            self.condition.notify()
+            return future
+
+    # ============================================================
+    # Scheduling
+    # ============================================================
+
+    def limiter_for(self, client):
+        if not self.fair or CLIENT_RATE_LIMIT is None:
+            return None
+        limiter = self.limiters.get(client)
+        if limiter is None:
+            limiter = self.limiters[client] = RateLimiter(CLIENT_RATE_LIMIT, CLIENT_BURST)
+        return limiter
+
+    def next_task(self):
+        """
+        Choose the call to start (the caller holds the lock): the lowest
+        finish tag among clients under their concurrency and rate caps
+
+        Returns:
+            (client, task, None) if a call can start now,
+            or (None, None, seconds) to wait (None = until notified)
+        """
+        skipped = set()
+        wait = None
+        while True:
+            best = None
+            for client, queue in self.queues.items():
+                if client in skipped:
+                    continue
+                if self.fair and self.running.get(client, 0) >= CLIENT_MAX_CONCURRENT:
+                    continue
+                if best is None or queue[0][0] < best[1]:
+                    best = (client, queue[0][0])
+
+            if best is None:
+                return None, None, wait
+
+            client = best[0]
+            limiter = self.limiter_for(client)
+            delay = limiter.try_acquire() if limiter is not None else 0
+            if delay > 0:
+                skipped.add(client)  # Over its rate, try the next client
+                wait = delay if wait is None else min(wait, delay)
+                continue
+
+            queue = self.queues[client]
+            task = queue.popleft()
+            if not queue:
+                del self.queues[client]
+            return client, task, None
+
+    def worker_loop(self):
+        while True:
+            with self.condition:
+                while True:
+                    client, task, wait = self.next_task()
+                    if task is not None:
+                        break
+                    self.condition.wait(wait)
+
+                tag, function, args, future, queued_at = task
+                started = time.monotonic()
+                self.virtual_time = max(self.virtual_time, tag)
+                self.queued -= 1
+                self.active += 1
+                self.running[client] = self.running.get(client, 0) + 1
+                self.record(self.wait_times, started - queued_at)
+                self.record(self.client_stats(client)['wait'], started - queued_at)
+                self.recent_wait = 0.8 * self.recent_wait + 0.2 * (started - queued_at)
+
+            profiler.enter()
+            try:
+                future.set_result(function(*args))
+            except Exception as e:
+                future.set_exception(e)
+            profiler.leave()
+
+            with self.condition:
+                run_time = time.monotonic() - started
+                self.active -= 1
+                self.running[client] -= 1
+                if not self.running[client]:
+                    del self.running[client]
+                    if client not in self.queues:
+                        self.last_tag.pop(client, None)  # Idle clients keep no credit
+                self.completed += 1
+                self.busy_time += run_time
+                self.record(self.run_times, run_time)
+                self.client_stats(client)['completed'] += 1
+                self.condition.notify()  # A capped client may start its next call
+
+    # ============================================================
+    # Statistics
+    # ============================================================
+
+    @staticmethod
+    def record(summary, value):
+        """summary = [count, total, max]"""
+        summary[0] += 1
+        summary[1] += value
+        summary[2] = max(summary[2], value)
+
+    def client_stats(self, client):
+        stats = self.per_client.get(client)
+        if stats is None:
+            stats = self.per_client[client] = {
+                'submitted': 0, 'completed': 0, 'rejected': 0, 'wait': [0, 0.0, 0.0]
+            }
+        return stats
+
+    def reset_stats(self):
+        self.submitted = 0
+        self.rejected = 0
+        self.completed = 0
+        self.busy_time = 0.0
+        self.wait_times = [0, 0.0, 0.0]
+        self.run_times = [0, 0.0, 0.0]
+        self.per_client = {}
+        self.window_start = time.monotonic()
+
+        # Rate limiters of clients that are idle and back to a full bucket
+        for client in list(getattr(self, 'limiters', {})):
+            limiter = self.limiters[client]
+            if client not in self.queues and client not in self.running and \
+                    limiter.tokens + (time.monotonic() - limiter.last_update) * limiter.rate >= limiter.burst:
+                del self.limiters[client]
+
+    def in_flight(self):
+        """Calls running or waiting"""
+        with self.condition:
+            return self.active + self.queued
+
+    def queue_delay(self):
+        """
+        Current queue delay in seconds: the recent average wait, or the
+        age of the oldest waiting call if that is longer (the average
+        only moves when a call leaves the queue)
+        """
+        with self.condition:
+            now = time.monotonic()
+            oldest = max((now - queue[0][4] for queue in self.queues.values()), default=0.0)
+            return max(self.recent_wait, oldest)
+
+    def retry_after(self):
+        """
+        Seconds a refused client should wait: the time the workers need
+        to drain the queue at the current average run time (at least 1)
+        """
+        with self.condition:
+            count, total, _ = self.run_times
+            average = total / count if count else 1.0
+            return max(1, math.ceil(self.queued * average / self.workers))
+
+    def fairness(self):
+        """
+        Jain's fairness index (1.0 = every client got its fair share,
+        1/n = one client got everything)
+
+        A client's fair share is its max-min share of the calls completed
+        in this window: clients that asked for less than an equal
+        (weighted) share get all they asked for, and the rest is split
+        between the others. Each client's completed calls are divided by
+        its share before the index is computed.
+        """
+        demands = {client: c['submitted'] + c['rejected'] for client, c in self.per_client.items()}
+        capacity = float(sum(c['completed'] for c in self.per_client.values()))
+        shares = {}
+        remaining = {client: d for client, d in demands.items() if d > 0}
+        while remaining and capacity > 0:
+            unit = capacity / sum(self.weights.get(client, 1) for client in remaining)
+            satisfied = {client: d for client, d in remaining.items()
+                         if d <= unit * self.weights.get(client, 1)}
+            if not satisfied:
+                for client in remaining:
+                    shares[client] = unit * self.weights.get(client, 1)
+                break
+            for client, d in satisfied.items():
+                shares[client] = d
+                capacity -= d
+                del remaining[client]
+
+        ratios = [self.per_client[client]['completed'] / share
+                  for client, share in shares.items() if share > 0]
+        if not ratios or not any(ratios):
+            return 1.0
+        return round(sum(ratios) ** 2 / (len(ratios) * sum(r * r for r in ratios)), 3)
+
+    def stats(self, reset=True):
+        """
+        Statistics since the last reset
+
+        Returns:
+            dictionary with the queue wait and run times (ms), the
+            worker utilization (0-1), the current queue/active counts,
+            the fairness index and the same numbers per client
+        """
+        with self.condition:
+            elapsed = max(time.monotonic() - self.window_start, 1e-9)
+            wait_count, wait_total, wait_max = self.wait_times
+            run_count, run_total, run_max = self.run_times
+            stats = {
+                'submitted': self.submitted,
+                'rejected': self.rejected,
+                'completed': self.completed,
+                'queued': self.queued,
+                'active': self.active,
+                'avg_wait_ms': round(1000 * wait_total / wait_count, 1) if wait_count else 0.0,
+                'max_wait_ms': round(1000 * wait_max, 1),
+                'avg_run_ms': round(1000 * run_total / run_count, 1) if run_count else 0.0,
+                'max_run_ms': round(1000 * run_max, 1),
+                'utilization': round(min(1.0, self.busy_time / (self.workers * elapsed)), 3),
+                'fairness': self.fairness(),
+                'clients': {
+                    str(client): {
+                        'completed': c['completed'],
+                        'rejected': c['rejected'],
+                        'avg_wait_ms': round(1000 * c['wait'][1] / c['wait'][0], 1) if c['wait'][0] else 0.0,
+                        'max_wait_ms': round(1000 * c['wait'][2], 1),
+                    }
+                    for client, c in self.per_client.items()
+                },
+            }
+            if reset:
+                self.reset_stats()
+            return stats